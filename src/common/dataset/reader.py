@@ -1,5 +1,13 @@
 import csv
 import json
+from itertools import islice
+from multiprocessing import Pool
+
+try:
+    # faster drop-in replacement of json.loads, used if installed
+    from ujson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 
 class Reader:
@@ -24,10 +32,122 @@ class JSONReader(Reader):
         return json.load(fp)
 
 
+def _parse_line(line, fields=None):
+    obj = json_loads(line)
+    if fields is not None:
+        obj = {field: obj[field] for field in fields if field in obj}
+    return obj
+
+
+def _parse_lines(lines_and_fields):
+    lines, fields = lines_and_fields
+    return [_parse_line(line, fields) for line in lines]
+
+
 class JSONLineReader(Reader):
+    """
+    Reader of JSON lines files. read/process return all objects as a list, iterate/iterate_batches stream them, so a
+    pass over a file only holds one batch in memory.
+    """
+
     def process(self,fp):
-        data = []
-        for line in fp.readlines():
-            data.append(json.loads(line.strip()))
-        return data
+        return list(self.iterate_fp(fp))
+
+    def iterate_fp(self, fp, fields=None):
+        """
+        Parse the lines of an open file one by one
+        :param fp: file object
+        :param fields: keys of the objects to keep, None to keep all of them
+        :return: generator of the objects
+        """
+        for line in fp:
+            if line.strip():
+                yield _parse_line(line, fields)
+
+    def iterate(self, file, fields=None):
+        """
+        Parse the lines of a file one by one
+        :param file: /path/to/file.jsonl
+        :param fields: keys of the objects to keep, e.g. ['claim', 'predicted_evidence', 'label'], None to keep all
+        :return: generator of the objects
+        """
+        with open(file, "r", encoding=self.enc) as f:
+            yield from self.iterate_fp(f, fields)
+
+    def iterate_batches(self, file, batch_size=1000, fields=None, num_workers=1):
+        """
+        Parse a file in batches of lines, with num_workers > 1 the batches are parsed by a pool of processes
+        :param file: /path/to/file.jsonl
+        :param batch_size: number of lines per batch
+        :param fields: keys of the objects to keep, None to keep all of them
+        :param num_workers: number of processes parsing the batches
+        :return: generator of the lists of objects, in the order of the file
+        """
+        with open(file, "r", encoding=self.enc) as f:
+            lines = (line for line in f if line.strip())
+            batches = iter(lambda: list(islice(lines, batch_size)), [])
+            if num_workers <= 1:
+                for batch in batches:
+                    yield _parse_lines((batch, fields))
+                return
+            with Pool(num_workers) as pool:
+                # imap keeps at most a few batches per worker in flight
+                yield from pool.imap(_parse_lines, ((batch, fields) for batch in batches))
+
+    def collect(self, file, extractors, fields=None):
+        """
+        Derive several lists from a file in a single pass
+        :param file: /path/to/file.jsonl
+        :param extractors: dict name -> function object -> value
+        :param fields: keys of the objects the extractors need, None to keep all of them
+        :return: dict name -> list of the values, in the order of the file
+        """
+        results = {name: [] for name in extractors}
+        for obj in self.iterate(file, fields):
+            for name, extractor in extractors.items():
+                results[name].append(extractor(obj))
+        return results
+
+
+class JSONLineWriter:
+    """
+    Buffered writer of JSON lines files, appends to the file by default. To be used as a context manager:
+        with JSONLineWriter(path) as writer:
+            writer.write(obj)
+    """
+
+    def __init__(self, file, append=True, buffer_size=1000, encoding="utf-8"):
+        """
+        :param file: /path/to/file.jsonl
+        :param append: append to an existing file instead of overwriting it
+        :param buffer_size: number of objects written to the file at once
+        """
+        self.file = file
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.fp = open(file, "a" if append else "w", encoding=encoding)
+
+    def write(self, obj):
+        self.buffer.append(json.dumps(obj))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_all(self, objs):
+        for obj in objs:
+            self.write(obj)
+
+    def flush(self):
+        if self.buffer:
+            self.fp.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+        self.fp.flush()
+
+    def close(self):
+        self.flush()
+        self.fp.close()
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
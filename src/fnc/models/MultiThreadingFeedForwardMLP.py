@@ -187,10 +187,10 @@ class MultiThreadingFeedForwardMLP(BaseEstimator):
         def save_graph(self, sess):
 
             if not os.path.exists(self.save_folder):
-                os.makedirs(self.save_folder)
+                os.makedirs(self.save_folder, exist_ok=True)
 
             if not os.path.exists(self.save_folder + str(self.random_file_ext_) + "/"):
-                os.makedirs(self.save_folder + str(self.random_file_ext_) + "/")
+                os.makedirs(self.save_folder + str(self.random_file_ext_) + "/", exist_ok=True)
             permanent_saver = tf.train.Saver()
             permanent_saver.save(sess, self.save_folder + str(self.random_file_ext_) + "/" + "model")
 
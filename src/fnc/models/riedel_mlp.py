@@ -67,10 +67,10 @@ class riedel_mlp(BaseEstimator):
     def fit(self, X_train, y_train, sample_weight=None):
         def save_session(self, sess):
             if not os.path.exists(self.save_folder):
-                os.makedirs(self.save_folder)
+                os.makedirs(self.save_folder, exist_ok=True)
 
             if not os.path.exists(self.save_folder):
-                os.makedirs(self.save_folder)
+                os.makedirs(self.save_folder, exist_ok=True)
 
             permanent_saver = tf.train.Saver()
             permanent_saver.save(sess, self.save_folder+"model")
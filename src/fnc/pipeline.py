@@ -3,7 +3,10 @@ import datetime
 import argparse
 import os
 import csv
+import shutil
+import tempfile
 import numpy as np
+from multiprocessing import Pool
 import os.path as path
 from builtins import isinstance
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
@@ -13,6 +16,8 @@ import fnc.utils.estimator_definitions as esitmator_definitions
 from fnc.refs.utils.score import LABELS, score_submission
 from fnc.settings import myConstants
 from fnc.utils import printout_manager
+from fnc.utils.feature_scheduler import gen_or_load_all_feats
+from fnc.utils.feature_store import load_feats, save_feats, hstack_feats, vstack_feats
 from fnc.models.MultiThreadingFeedForwardMLP import MultiThreadingFeedForwardMLP
 from fnc.src.models import Model
 from fnc.refs.utils.generate_test_splits import kfold_split, get_stances_for_folds
@@ -23,7 +28,7 @@ from fnc.refs.feature_engineering import NMF_fit_all_incl_holdout_and_test, \
     latent_dirichlet_allocation, latent_semantic_indexing_gensim_test, NMF_fit_all_concat_300, word_ngrams_concat_tf5000_l2_w_holdout
 #FNC challenge features from baseline implementation and from Benjamin Schiller
 from fnc.refs.feature_engineering import refuting_features, polarity_features, hand_features, word_overlap_features, \
-    gen_non_bleeding_feats, gen_or_load_feats, \
+    gen_non_bleeding_feats, preprocessed, \
     word_unigrams_5000_concat_tf_l2_holdout_unlbled_test, NMF_cos_300_holdout_unlbled_test, \
     NMF_concat_300_holdout_unlbled_test, latent_dirichlet_allocation_25_holdout_unlbled_test, \
     latent_semantic_indexing_gensim_300_concat_holdout_unlbled_test, \
@@ -143,12 +148,15 @@ def generate_features(stances, dataset, name, feature_list, features_dir):
     X_feat = []
     feat_list = []
     last_index = 0
-    for feature in feature_list:
-        feat = gen_or_load_feats(feature_dict[feature], h, b, features_dir+"/"+feature+"."+name+'.npy', bodyId, feature, headId, fold=name)
-        feat_list.append((last_index, last_index+len(feat[0]), str(feature)))
-        last_index += len(feat[0])
+    feature_files = [features_dir+"/"+feature+"."+name+'.npy' for feature in feature_list]
+    feats = gen_or_load_all_feats(feature_dict, feature_list, h, b, feature_files, bodyId, headId, fold=name,
+                                  num_workers=myConstants.feature_workers, shard_size=myConstants.feature_shard_size)
+    for feature, feat in zip(feature_list, feats):
+        feat_list.append((last_index, last_index+feat.shape[1], str(feature)))
+        last_index += feat.shape[1]
         X_feat.append(feat)
-    X = np.concatenate(X_feat, axis=1)
+    X = hstack_feats(X_feat)
+    preprocessed.save()
 
     return X, y, feat_list
 
@@ -235,12 +243,15 @@ def generate_features_test(stances, dataset, name, feature_list, features_dir):
         stanceCounter += 1
 
     X_feat = []
-    for feature in feature_list:
-        print("calculate feature: " + str(feature))
-        feat = gen_or_load_feats(feature_dict[feature], h, b, features_dir+"/"+feature+"_test."+name+'.npy', bodyId, feature, headId, fold=name)
+    print("calculate features: " + str(feature_list))
+    feature_files = [features_dir+"/"+feature+"_test."+name+'.npy' for feature in feature_list]
+    feats = gen_or_load_all_feats(feature_dict, feature_list, h, b, feature_files, bodyId, headId, fold=name,
+                                  num_workers=myConstants.feature_workers, shard_size=myConstants.feature_shard_size)
+    for feat in feats:
         X_feat.append(feat)
-        print(len(feat))
-    X = np.concatenate(X_feat, axis=1)
+        print(feat.shape[0])
+    X = hstack_feats(X_feat)
+    preprocessed.save()
     return X
 
 def generate_non_bleeding_features(fold_stances, hold_out_stances, no_folds, BOW_feature_list, features_dir, d):
@@ -319,13 +330,19 @@ def concat_non_bleeding_features(X_train, X_test, BOW_feature_list, features_dir
     specified in the non_bleeding_feature_list.
     """
     feat_list = []
+    X_train_parts = [X_train]
+    X_test_parts = [X_test]
+    last_index = X_train.shape[1]
     for feature in BOW_feature_list:
-        X_train_part = np.load("%s/%s.%s.npy" % (features_dir, feature, fold))
-        last_index = len(X_train[0])
-        X_train = np.concatenate([X_train, X_train_part], axis=1)
-        feat_list.append((last_index, last_index+len(X_train_part[0]), str(feature)))
-        X_test_part = np.load("%s/%s.%s.test.npy" % (features_dir, feature, fold))
-        X_test = np.concatenate([X_test, X_test_part], axis=1)
+        X_train_part = load_feats("%s/%s.%s.npy" % (features_dir, feature, fold))
+        feat_list.append((last_index, last_index+X_train_part.shape[1], str(feature)))
+        last_index += X_train_part.shape[1]
+        X_train_parts.append(X_train_part)
+        X_test_parts.append(load_feats("%s/%s.%s.test.npy" % (features_dir, feature, fold)))
+    # concatenate all parts at once, so the (mostly sparse) BOW features are copied only once
+    if BOW_feature_list:
+        X_train = hstack_feats(X_train_parts)
+        X_test = hstack_feats(X_test_parts)
     return X_train, X_test, feat_list
 
 def print_score_from_restored_model(clf, X_test, y_test):
@@ -382,37 +399,97 @@ def get_save_folder(parent_folder, scorer_type):
     os.makedirs(save_folder)
     return save_folder
 
-def cross_validation(fold_stances, folds, Xs, ys, non_bleeding_features, features_dir,
-                     scorer_type, all_accuracies_related, all_accuracies_stance,
-                     all_f1_related, all_f1_stance, all_scores, result_string, learning_rate_string):
-    best_score = 0
+# scorers which are trained on the GPU or need more memory than fits several times, their folds always run one by one
+SERIAL_CV_SCORERS = {'single_f_ext_LSTM_att_no_cw', 'single_f_ext_LSTM_no_cw', 'stackLSTM', 'esim', 'voting_esim_hard',
+                     'voting_esim_soft'}
+# scorers with tensorflow MLPs (MultiThreadingFeedForwardMLP, riedel_mlp), at most myConstants.cv_tf_workers of their
+# folds run at once, since all of them open a session on the same GPU
+TF_CV_SCORERS = {'featMLP', 'voting_mlps_hard', 'MLP_base', 'MLP_base_1', 'MLP_base_2', 'riedel', 'voting_hard_riedel',
+                 'voting_hard_mlp_riedel', 'voting_hard_mlps_svm_gradboost'}
+
+def fit_predict_fold(fold, fold_files, ys, non_bleeding_features, features_dir, scorer_type):
+    """
+    Trains a new estimator on all folds except the given one and predicts the labels of the given fold
+    :param fold: index of the test fold
+    :param fold_files: files of the feature vectors of the folds, loaded memory-mapped
+    :return: the predicted labels and the learning rates of the MLP (None for other estimators)
+    """
+    ids = list(range(len(fold_files)))
+    del ids[fold]
 
-    for fold in fold_stances:
-        ids = list(range(len(folds)))
-        del ids[fold]
+    X_train = vstack_feats([load_feats(fold_files[i]) for i in ids])
+    y_train = np.hstack(tuple([ys[i] for i in ids]))
 
-        X_train = np.vstack(tuple([Xs[i] for i in ids]))
-        y_train = np.hstack(tuple([ys[i] for i in ids]))
+    X_test = load_feats(fold_files[fold])
 
-        X_test = Xs[fold]
-        y_test = ys[fold]
+    # Add BOW features to current feature vectors
+    # The features are specified in BOW_feature_list
+    X_train, X_test, _ = concat_non_bleeding_features(
+        X_train, X_test,
+        non_bleeding_features, features_dir, fold)
 
-        # Add BOW features to current feature vectors
-        # The features are specified in BOW_feature_list
-        X_train, X_test, _ = concat_non_bleeding_features(
-            X_train, X_test,
-            non_bleeding_features, features_dir, fold)
+    # get the estimator for this loop
+    clf = esitmator_definitions.get_estimator(scorer_type)
 
-        # get the estimator for this loop
-        clf = esitmator_definitions.get_estimator(scorer_type)
+    print("Begin fitting at: " + str(datetime.datetime.now()).split('.')[0] + "\n")
 
-        print("Begin fitting at: " + str(datetime.datetime.now()).split('.')[0] + "\n")
+    # start fitting the estimator
+    clf.fit(esitmator_definitions.estimator_input(clf, X_train), y_train)
 
-        # start fitting the estimator
-        clf.fit(X_train, y_train)
+    # predict the labes for fitted classifier with the test data
+    predicted_int = clf.predict(esitmator_definitions.estimator_input(clf, X_test))
 
-        # predict the labes for fitted classifier with the test data
-        predicted_int = clf.predict(X_test)
+    learning_rates = None
+    if isinstance(clf, MultiThreadingFeedForwardMLP):
+        learning_rates = clf.get_learning_rates(fold)
+    return predicted_int, learning_rates
+
+def fit_predict_folds(fold_stances, Xs, ys, non_bleeding_features, features_dir, scorer_type):
+    """
+    Runs fit_predict_fold for all folds in fold_stances, myConstants.cv_workers folds at once. The feature vectors of
+    the folds are written to the disk once and memory-mapped by the workers, instead of being copied into every one
+    of them.
+    :return: list of the results of fit_predict_fold, in the order of fold_stances
+    """
+    fold_dir = tempfile.mkdtemp(prefix="cv_folds_", dir=features_dir)
+    try:
+        fold_files = []
+        for i, X in enumerate(Xs):
+            fold_files.append("%s/fold_%d.npy" % (fold_dir, i))
+            # sparse folds go to fold_N.npz, which load_feats looks for
+            save_feats(fold_files[-1], X)
+
+        num_workers = min(myConstants.cv_workers or os.cpu_count() or 1, len(fold_stances))
+        if scorer_type in TF_CV_SCORERS:
+            num_workers = min(num_workers, myConstants.cv_tf_workers)
+        if num_workers <= 1 or scorer_type in SERIAL_CV_SCORERS:
+            return [fit_predict_fold(fold, fold_files, ys, non_bleeding_features, features_dir, scorer_type)
+                    for fold in fold_stances]
+
+        # every fold gets a fresh process, so the memory of its estimator (e.g. a tensorflow graph) is freed after it
+        pool = Pool(num_workers, maxtasksperchild=1)
+        try:
+            results = [pool.apply_async(fit_predict_fold,
+                                        (fold, fold_files, ys, non_bleeding_features, features_dir, scorer_type))
+                       for fold in fold_stances]
+            return [result.get() for result in results]
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        shutil.rmtree(fold_dir, ignore_errors=True)
+
+def cross_validation(fold_stances, folds, Xs, ys, non_bleeding_features, features_dir,
+                     scorer_type, all_accuracies_related, all_accuracies_stance,
+                     all_f1_related, all_f1_stance, all_scores, result_string, learning_rate_string):
+    best_score = 0
+
+    # the folds are fitted in parallel, the results are evaluated in the order of the folds
+    fold_results = fit_predict_folds(fold_stances, [Xs[i] for i in range(len(folds))], ys, non_bleeding_features,
+                                     features_dir, scorer_type)
+
+    for fold, (predicted_int, learning_rates) in zip(fold_stances, fold_results):
+        y_test = ys[fold]
 
         #Baseline "hack" - uncomment to calculate the baseline
         #predicted_int = np.empty(len(y_test))
@@ -450,8 +527,8 @@ def cross_validation(fold_stances, folds, Xs, ys, non_bleeding_features, feature
         result_string += printout  # add results to final result file
 
         # add to special file that shows learning rate and loss of optimizer
-        if isinstance(clf, MultiThreadingFeedForwardMLP):
-            learning_rate_string += clf.get_learning_rates(fold) + "\n"
+        if learning_rates is not None:
+            learning_rate_string += learning_rates + "\n"
 
     # Prepare printout for final result
     printout = printout_manager.get_cross_validation_printout(
@@ -493,13 +570,15 @@ def validate_holdout(Xs, ys, X_holdout, y_holdout, non_bleeding_features, featur
     best_clf = esitmator_definitions.get_estimator(scorer_type, save_folder=save_folder)
 
     # stack all the feature vectors of all the folds
-    X_train = np.vstack(tuple([Xs[i] for i in range(10)]))
+    X_train = vstack_feats([Xs[i] for i in range(10)])
     y_train = np.hstack(tuple([ys[i] for i in range(10)]))
 
     # concat non-bleeding features
     X_train, X_holdout, feat_indices_holdout = concat_non_bleeding_features(
         X_train, X_holdout,
         non_bleeding_features, features_dir, 'holdout')
+    X_train = esitmator_definitions.estimator_input(best_clf, X_train)
+    X_holdout = esitmator_definitions.estimator_input(best_clf, X_holdout)
 
     # test for oversampling: fits the current classifier, oversampled with a given
     # method and checks the score on the holdout set
@@ -603,11 +682,11 @@ def final_clf_training(Xs, ys, X_holdout, y_holdout, scorer_type, sanity_check=F
     """
 
     # stack all the feature vectors of all the folds
-    X_train = np.vstack(tuple([Xs[i] for i in range(10)]))
+    X_train = vstack_feats([Xs[i] for i in range(10)])
     y_train = np.hstack(tuple([ys[i] for i in range(10)]))
 
     # stack the holdout feature vectors on the feature vectors of all folds
-    X_all = np.concatenate([X_train, X_holdout], axis=0)
+    X_all = vstack_feats([X_train, X_holdout])
     y_all = np.concatenate([y_train, y_holdout], axis=0)
 
     # define and create parent folder to save all trained classifiers into
@@ -619,6 +698,9 @@ def final_clf_training(Xs, ys, X_holdout, y_holdout, scorer_type, sanity_check=F
 
     # get classifier and only pass a save folder if the classifier should be saved
     clf = esitmator_definitions.get_estimator(scorer_type, save_folder=save_folder)
+    X_train = esitmator_definitions.estimator_input(clf, X_train)
+    X_holdout = esitmator_definitions.estimator_input(clf, X_holdout)
+    X_all = esitmator_definitions.estimator_input(clf, X_all)
 
     #perform oversampling if selected
     if oversampling == True:
@@ -752,6 +834,7 @@ def final_clf_prediction(data_path, features, features_dir, scorer_type, run_fin
     print("Load model for final prediction of test set: " + parent_folder + scorer_type + myConstants.model_name + filename)
 
     # predict classes and turn into labels
+    X_final_test = esitmator_definitions.estimator_input(load_clf, X_final_test)
     y_predicted = load_clf.predict(X_final_test)
     predicted = [LABELS[int(a)] for a in y_predicted]
 
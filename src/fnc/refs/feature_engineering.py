@@ -14,6 +14,7 @@ import collections
 from time import time
 from nltk.corpus import reuters, stopwords
 from collections import defaultdict, Counter
+from functools import lru_cache
 from sklearn import feature_extraction
 from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 from sklearn.metrics.pairwise import cosine_distances
@@ -23,13 +24,15 @@ from tqdm import tqdm
 from itertools import zip_longest
 from fnc.refs.feature_engineering_helper import word_ngrams
 from fnc.refs.feature_engineering_helper import topic_models
-from fnc.utils.doc2vec import avg_embedding_similarity
+from fnc.utils.doc2vec import avg_embedding_similarity, EmbeddingLookup
 from fnc.utils.loadEmbeddings import LoadEmbeddings
 from fnc.utils.stanford_parser import StanfordMethods
 from fnc.utils.tf_idf_helpers import tf_idf_helpers
 from fnc.utils.hungarian_alignment import hungarian_alignment_calculator
-from fnc.utils.data_helpers import sent2stokens_wostop, text2sent, get_tokenized_lemmas
-from fnc.utils.word_mover_distance import computeAverageWMD
+from fnc.utils.data_helpers import sent2stokens_wostop, get_tokenized_lemmas
+from fnc.utils.word_mover_distance import WMDEngine
+from fnc.utils.feature_store import save_feats, load_feats, feats_exist
+from fnc.utils.text_cache import TextCache
 from fnc.settings import myConstants
 from fnc.refs.utils.generate_test_splits import kfold_split
 import fnc.refs.feature_engineering_helper.readability_indices as fe_util
@@ -41,6 +44,7 @@ This file is based on the fnc-1-baseline implementation https://github.com/FakeN
 """
 
 
+@lru_cache(maxsize=None)
 def normalize_word(w):
     return _wnl.lemmatize(w).lower()
 
@@ -60,8 +64,27 @@ def clear_unwanted_chars(mystring):
     return str(mystring.encode('latin', errors='ignore').decode('latin'))
 
 
+def clean_lemmas(s):
+    # Lemmas of the cleaned string
+    return get_tokenized_lemmas(preprocessed.get('clean', s))
+
+
+def universal_pos_tags(s):
+    # Universal POS tags of the tokens of every sentence
+    return nltk.pos_tag_sents([nltk.word_tokenize(sent) for sent in nltk.sent_tokenize(s)], tagset='universal')
+
+
+# preprocessing shared by all features of a run, see settings.py for the on-disk store
+preprocessed = TextCache({'clean': clean,
+                          'clean_lemmas': clean_lemmas,
+                          'tokens': nltk.word_tokenize,
+                          'lemmas_wostop': sent2stokens_wostop,
+                          'pos_tags': universal_pos_tags},
+                         cache_dir=myConstants.preprocessing_cache_dir)
+
+
 def gen_or_load_feats(feat_fn, headlines, bodies, feature_file, bodyId, feature, headId="", fold=""):
-    if not os.path.isfile(feature_file):
+    if not feats_exist(feature_file):
         if 'stanford' in feature:
             feats = feat_fn(headlines, bodies, bodyId, headId)
         elif 'single_flat_LSTM_50d_100' in feature:
@@ -69,9 +92,9 @@ def gen_or_load_feats(feat_fn, headlines, bodies, feature_file, bodyId, feature,
 
         else:
             feats = feat_fn(headlines, bodies)
-        np.save(feature_file, feats)
+        save_feats(feature_file, feats)
 
-    return np.load(feature_file)
+    return load_feats(feature_file)
 
 
 def gen_non_bleeding_feats(feat_fn, headlines, bodies, headlines_test, bodies_test, features_dir, feature, fold):
@@ -79,26 +102,24 @@ def gen_non_bleeding_feats(feat_fn, headlines, bodies, headlines_test, bodies_te
     Similar to gen_or_load_feats() it generates the non bleeding features and save them on the disk
     """
     feature_file = "%s/%s.%s.npy" % (features_dir, feature, fold)
-    if not os.path.isfile(feature_file):
+    if not feats_exist(feature_file):
         print(str(datetime.now()) + ": Generating features for: " + feature + ", fold/holdout: " + str(fold))
 
         X_train, X_test = feat_fn(headlines, bodies, headlines_test, bodies_test)
 
         if str(fold) != 'holdout':
-            np.save("%s/%s.%s.npy" % (features_dir, feature, fold), X_train)
-            np.save("%s/%s.%s.test.npy" % (features_dir, feature, fold), X_test)
+            save_feats("%s/%s.%s.test.npy" % (features_dir, feature, fold), X_test)
+            save_feats("%s/%s.%s.npy" % (features_dir, feature, fold), X_train)
         else:
-            np.save("%s/%s.%s.npy" % (features_dir, feature, 'holdout'), X_train)
-            np.save("%s/%s.%s.test.npy" % (features_dir, feature, 'holdout'), X_test)
+            save_feats("%s/%s.%s.test.npy" % (features_dir, feature, 'holdout'), X_test)
+            save_feats("%s/%s.%s.npy" % (features_dir, feature, 'holdout'), X_train)
 
 
 def word_overlap_features(headlines, bodies):
     X = []
     for i, (headline, body) in tqdm(enumerate(zip(headlines, bodies))):
-        clean_headline = clean(headline)
-        clean_body = clean(body)
-        clean_headline = get_tokenized_lemmas(clean_headline)
-        clean_body = get_tokenized_lemmas(clean_body)
+        clean_headline = preprocessed.get('clean_lemmas', headline)
+        clean_body = preprocessed.get('clean_lemmas', body)
         features = [
             len(set(clean_headline).intersection(clean_body)) / float(len(set(clean_headline).union(clean_body)))]
         X.append(features)
@@ -124,8 +145,7 @@ def refuting_features(headlines, bodies):
     ]
     X = []
     for i, (headline, body) in tqdm(enumerate(zip(headlines, bodies))):
-        clean_headline = clean(headline)
-        clean_headline = get_tokenized_lemmas(clean_headline)
+        clean_headline = preprocessed.get('clean_lemmas', headline)
         features = [1 if word in clean_headline else 0 for word in _refuting_words]
         X.append(features)
     return X
@@ -149,14 +169,12 @@ def polarity_features(headlines, bodies):
     ]
 
     def calculate_polarity(text):
-        tokens = get_tokenized_lemmas(text)
+        tokens = preprocessed.get('clean_lemmas', text)
         return sum([t in _refuting_words for t in tokens]) % 2
 
     X = []
     for i, (headline, body) in tqdm(enumerate(zip(headlines, bodies))):
-        clean_headline = clean(headline)
-        clean_body = clean(body)
-        features = [calculate_polarity(clean_headline), calculate_polarity(clean_body)]
+        features = [calculate_polarity(headline), calculate_polarity(body)]
         X.append(features)
     return np.array(X)
 
@@ -214,10 +232,11 @@ def hand_features(headlines, bodies):
         # appears in the body text.
         bin_count = 0
         bin_count_early = 0
-        for headline_token in clean(headline).split(" "):
-            if headline_token in clean(body):
+        clean_body = preprocessed.get('clean', body)
+        for headline_token in preprocessed.get('clean', headline).split(" "):
+            if headline_token in clean_body:
                 bin_count += 1
-            if headline_token in clean(body)[:255]:
+            if headline_token in clean_body[:255]:
                 bin_count_early += 1
         return [bin_count, bin_count_early]
 
@@ -227,8 +246,9 @@ def hand_features(headlines, bodies):
         # are ignored.
         bin_count = 0
         bin_count_early = 0
-        for headline_token in remove_stopwords(clean(headline).split(" ")):
-            if headline_token in clean(body):
+        clean_body = preprocessed.get('clean', body)
+        for headline_token in remove_stopwords(preprocessed.get('clean', headline).split(" ")):
+            if headline_token in clean_body:
                 bin_count += 1
                 bin_count_early += 1
         return [bin_count, bin_count_early]
@@ -237,8 +257,8 @@ def hand_features(headlines, bodies):
         # Count how many times an n-gram of the title
         # appears in the entire body, and intro paragraph
 
-        clean_body = clean(body)
-        clean_headline = clean(headline)
+        clean_body = preprocessed.get('clean', body)
+        clean_headline = preprocessed.get('clean', headline)
         features = []
         features = append_chargrams(features, clean_headline, clean_body, 2)
         features = append_chargrams(features, clean_headline, clean_body, 8)
@@ -671,20 +691,18 @@ def hedging_features(headlines, bodies):
         ]
 
     def calculate_hedging_polarity(text):
-        tokens = get_tokenized_lemmas(text)
+        tokens = preprocessed.get('clean_lemmas', text)
         return sum([t in _hedging_seed_words for t in tokens]) % 2
 
     def contains_hedging_seeed(text):
-        tokens = get_tokenized_lemmas(text)
+        tokens = preprocessed.get('clean_lemmas', text)
         return min(1, sum([t in _hedging_seed_words for t in tokens]))
 
     X = []
     for i, (headline, body) in tqdm(enumerate(zip(headlines, bodies))):
-        clean_headline = clean(headline)
-        clean_body = clean(body)
-        features = [contains_hedging_seeed(clean_headline), contains_hedging_seeed(clean_body)]
-        # features.append(calculate_hedging_polarity(clean_headline))
-        # features.append(calculate_hedging_polarity(clean_body))
+        features = [contains_hedging_seeed(headline), contains_hedging_seeed(body)]
+        # features.append(calculate_hedging_polarity(headline))
+        # features.append(calculate_hedging_polarity(body))
         X.append(features)
     return np.array(X)
 
@@ -709,8 +727,8 @@ def load_embeddings(headlines, bodies):
 # same like avg_embed in model.py
 def sen2Doc_headline_wholebody(headlines, bodies):
     def headline_wholebody(embeddings, headline, body):
-        headline_w = sent2stokens_wostop(headline)
-        body_w = sent2stokens_wostop(body)
+        headline_w = preprocessed.get('lemmas_wostop', headline)
+        body_w = preprocessed.get('lemmas_wostop', body)
         sim = avg_embedding_similarity(embeddings, embedding_size, ' '.join(headline_w), ' '.join(body_w))
         features = [sim]
         return features
@@ -724,63 +742,28 @@ def sen2Doc_headline_wholebody(headlines, bodies):
 
 # calculate average sentence vector and compare headline with each sentence, use highest similarity
 def sen2sen_similarity_max(headlines, bodies):
-    def similarity(embeddings, headline, body):
-        sentence_list = []
-        score = 0
-        sentence_list = text2sent(body)
-        for sentence in sentence_list:
-            # compare both sentences - vectors not necessary, since this procedure works with text
-            # note: avg_embeddings_similarity tokenizes and lemmatizes the sentences prior to calculation, so no pre-assessment is necessary (Sentence to tokens without stopwords)
-            temp_score = avg_embedding_similarity(embeddings, embedding_size, headline, sentence)
-            # store the highest similarity score
-            score = max(score, temp_score)
-
-        features = [score]
-        return features
-
     x = []
     embedding_size, embeddings = load_embeddings(headlines, bodies)
+    # note: the sentences are tokenized without stopwords prior to averaging, so no pre-assessment is necessary
+    lookup = EmbeddingLookup(embeddings, embedding_size)
     for i, (headline, body) in tqdm(enumerate(zip(headlines, bodies))):
-        x.append(similarity(embeddings, headline, body))
+        x.append([lookup.max_sentence_similarity(headline, body)])
     return x
 
 
 # calculate word_mover_distance from headline to each sentence, use lowest distance
+# Note: Distance is not normallized!!
 def word_mover_distance_similarity_sentence_min(headlines, bodies):
-    def similarity(embeddings, headline, body):
-        distance = 99999
-        sentence_list = []
-        sentence_list = text2sent(body)
-        embedding_size, embeddings = load_embeddings(headline, body)
-        for sentence in sentence_list:
-            temp_distance = abs(computeAverageWMD(embeddings, headline, sentence))
-            # store the lowest distance
-            # Note: Distance is not normallized!!
-            distance = min(distance, temp_distance)
-
-        features = [distance]
-        return features
-
-    x = []
     embedding_size, embeddings = load_embeddings(headlines, bodies)
-    for i, (headline, body) in tqdm(enumerate(zip(headlines, bodies))):
-        x.append(similarity(embeddings, headline, body))
-    return x
+    distances = WMDEngine(embeddings).sentence_min(list(headlines), list(bodies))
+    return [[distance] for distance in distances]
 
 
 # calculate word_mover_distance from headline to whole body text
 def word_mover_distance_wholebody(headlines, bodies):
-    def similarity(embeddings, headline, body):
-        embedding_size, embeddings = load_embeddings(headline, body)
-        distance = abs(computeAverageWMD(embeddings, headline, body))
-        features = [distance]
-        return features
-
-    x = []
     embedding_size, embeddings = load_embeddings(headlines, bodies)
-    for i, (headline, body) in tqdm(enumerate(zip(headlines, bodies))):
-        x.append(similarity(embeddings, headline, body))
-    return x
+    distances = WMDEngine(embeddings).wholebody(list(headlines), list(bodies))
+    return [[distance] for distance in distances]
 
 
 # compare sdm of the headline with the sdm of the whole body
@@ -815,6 +798,7 @@ def sdm_sim(headlines, bodies):
 
 def stanford_based_verb_noun_sim(headlines, bodies, bodyIds, headIds, order_sentences=False, num_sents=99):
     myStanfordmethods = StanfordMethods()
+    stanford_helper_prefetch(headlines, bodies, order_sentences, num_sents, myStanfordmethods)
     mytf_tf_idf_helpers = tf_idf_helpers()
 
     def calculate_word_sim(embeddings, headline, body, body_id, head_id):
@@ -882,6 +866,7 @@ def stanford_based_verb_noun_sim_3sent(headlines, bodies, bodyIds, headIds, orde
 
 def stanford_ppdb_score(headlines, bodies, bodyIds, headIds, order_sentences=False, num_sents=99):
     myStanfordmethods = StanfordMethods()
+    stanford_helper_prefetch(headlines, bodies, order_sentences, num_sents, myStanfordmethods)
     myHungarian_calculator = hungarian_alignment_calculator()
     mytf_tf_idf_helpers = tf_idf_helpers()
 
@@ -941,6 +926,7 @@ def stanford_ppdb_score_3sent(headlines, bodies, bodyIds, headIds, order_sentenc
 
 def stanford_sentiment(headlines, bodies, bodyIds, headIds, order_sentences=False, num_sents=99):
     myStanfordmethods = StanfordMethods()
+    stanford_helper_prefetch(headlines, bodies, order_sentences, num_sents, myStanfordmethods)
     mytf_tf_idf_helpers = tf_idf_helpers()
 
     def calculate_sentiment(headline, body, body_id, head_id):
@@ -987,6 +973,7 @@ def stanford_sentiment_3sent(headlines, bodies, bodyIds, headIds, order_sentence
 
 def stanford_negation_features(headlines, bodies, bodyIds, headIds, order_sentences=False, num_sents=99):
     myStanfordmethods = StanfordMethods()
+    stanford_helper_prefetch(headlines, bodies, order_sentences, num_sents, myStanfordmethods)
     mytf_tf_idf_helpers = tf_idf_helpers()
 
     def calculate_negation(headline, body, body_id, head_id):
@@ -1037,6 +1024,7 @@ def stanford_negation_features_3sent(headlines, bodies, bodyIds, headIds, order_
 
 def stanford_avg_words_per_sent(headlines, bodies, bodyIds, headIds, order_sentences=False, num_sents=99):
     myStanfordmethods = StanfordMethods()
+    stanford_helper_prefetch(headlines, bodies, order_sentences, num_sents, myStanfordmethods)
     mytf_tf_idf_helpers = tf_idf_helpers()
 
     def calculate_words_per_sent(headline, body, body_id, head_id):
@@ -1080,6 +1068,14 @@ def stanford_avg_words_per_sent_3sent(headlines, bodies, bodyIds, headIds, order
 'This is not a feature, but used by any stanford feature calculation to order the sentences based on their tf idf score'
 
 
+def stanford_helper_prefetch(headlines, bodies, order_sentences, num_of_sents, myStanfordmethods):
+    'Parse the headlines, and the bodies unless their sentences get ranked for every headline, in one go'
+    texts = [clear_unwanted_chars(headline) for headline in headlines]
+    if not order_sentences:
+        texts += [clear_unwanted_chars(body) for body in bodies]
+    myStanfordmethods.prefetch(texts, num_of_sents)
+
+
 def stanford_helper_order_sents(order_sentences, num_of_sents, body_id, clean_headline, clean_body, myStanfordmethods,
                                 mytf_tf_idf_helpers):
     # Order sentences by tf-idf-score:
@@ -1117,18 +1113,16 @@ def discuss_features(headlines, bodies):
     ]
 
     def calculate_discuss_feature(text):
-        tokens = get_tokenized_lemmas(text)
+        tokens = preprocessed.get('clean_lemmas', text)
         # result = [1 if word in tokens else 0 for word in _discuss_words]
         result = min(1, sum([t in _discuss_words for t in tokens]))
         return result
 
     X = []
     for i, (headline, body) in tqdm(enumerate(zip(headlines, bodies))):
-        clean_headline = clean(headline)
-        clean_body = clean(body)
         features = []
-        features.append(calculate_discuss_feature(clean_headline))
-        features.append(calculate_discuss_feature(clean_body))
+        features.append(calculate_discuss_feature(headline))
+        features.append(calculate_discuss_feature(body))
         X.append(features)
     print(str(len(X)))
     return np.array(X)
@@ -1367,7 +1361,7 @@ def get_unigram_features_of_lexicon(headlines, bodies, lexicon_path, no_hash=Fal
 
     def all_feats_dict(string, tokenizer):
 
-        tokenized = tokenizer.word_tokenize(string)
+        tokenized = preprocessed.get('tokens', string) if tokenizer is nltk else tokenizer.word_tokenize(string)
 
         ct = count_tokens_with_polarity(tokenized)
         pol = polarity_sum(tokenized)
@@ -1618,7 +1612,7 @@ def max_diff_twitter_uni_bigrams(headlines, bodies):
         return pol_dict
 
     def get_function_parameters(string, tokenizer):
-        tokenized = tokenizer.word_tokenize(string)
+        tokenized = preprocessed.get('tokens', string) if tokenizer is nltk else tokenizer.word_tokenize(string)
         ngrams_list = [' '.join(i) for i in nltk.ngrams(tokenized, 2)]
         all_grams = tokenized + ngrams_list
 
@@ -1796,7 +1790,7 @@ def nrc_emo_lex(headlines, bodies):
 
     def generate_emotion_count(string):
         emo_count = Counter()
-        for token in nltk.word_tokenize(string):
+        for token in preprocessed.get('tokens', string):
             token = token.lower()
             emo_count += Counter(word_list[token])
 
@@ -1866,9 +1860,7 @@ def nrc_hashtag_sentiment_unigram_POS(headlines, bodies):
         pos_dict_head['PRON'].append(head_text_PRON)
 
     def get_features_body(body):
-        sent_list_body = nltk.sent_tokenize(body)
-        tokenized_sents_body = [nltk.word_tokenize(sent) for sent in sent_list_body]
-        pos_tags = nltk.pos_tag_sents(tokenized_sents_body, tagset='universal')
+        pos_tags = preprocessed.get('pos_tags', body)
 
         text_VERB = ""
         text_ADJ = ""
@@ -28,6 +28,19 @@ class myConstants():
     perform_oversampling = False
     # define the oversampling or undersampling method in pipeline.py line 623ff
 
+    feature_workers = None
+    # number of processes generating the features, None = number of cores, 1 = no extra processes
+    feature_shard_size = 1000
+    # number of rows per shard of the features which are generated in parallel (see utils/feature_scheduler.py)
+    cv_workers = None
+    # number of cross-validation folds trained at once, None = number of cores, 1 = one fold after the other
+    cv_tf_workers = 1
+    # at most this many folds at once for the scorers with tensorflow MLPs, which share the GPU (see pipeline.py)
+
+    preprocessing_cache_dir = None
+    # folder to store the preprocessed texts (tokens, lemmas, POS tags) between runs, None = keep them in memory only,
+    # e.g. BASE_DIR + "/data/fnc-1/features/preprocessing" (see utils/text_cache.py)
+
     model_name = "_final_new_0/"
     # note that the full model name is a concatenation of the model selected in the following "feature_list" and the suffix above.
     # each time a model is trained, the number is increased
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_separator = '\n\n'
+
+
+def _utf16_len(text):
+    # CoreNLP (Java) counts character offsets in UTF-16 code units
+    return len(text.encode('utf-16-le')) // 2
+
+
+class CoreNLPClient():
+    """
+    Client of a CoreNLP server which annotates sentences in batches. Every batch is sent as one document, in which the
+    sentences are separated by blank lines, and the sentences CoreNLP returns are mapped back to the sentence they come
+    from by their character offsets. Several batches are in flight at once over a pool of keep-alive connections.
+    The annotations are stored in a sqlite database keyed by the SHA-1 of the properties and the text of the sentence,
+    so they are reused by any feature, corpus and run which needs the same sentence.
+    To use this client, a CoreNLP server has to run, e.g.:
+    java -mx4g -cp "*" edu.stanford.nlp.pipeline.StanfordCoreNLPServer -port 9020
+    """
+
+    def __init__(self, url='http://localhost:9020', properties=None, cache_file=None, num_workers=8, batch_size=32):
+        """
+        :param url: url of the CoreNLP server
+        :param properties: properties of the annotation, e.g. the annotators
+        :param cache_file: /path/to/cache.sqlite, None to keep the annotations in memory only
+        :param num_workers: number of requests in flight at once
+        :param batch_size: number of sentences per request
+        """
+        self.url = url
+        self.properties = dict(properties or {})
+        self.properties['outputFormat'] = 'json'
+        # blank lines always end a sentence, single line breaks do not
+        self.properties['ssplit.newlineIsSentenceBreak'] = 'two'
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=num_workers))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=num_workers))
+        if cache_file is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        self.db = sqlite3.connect(cache_file if cache_file is not None else ':memory:')
+        self.db.execute('CREATE TABLE IF NOT EXISTS annotations (key TEXT PRIMARY KEY, value TEXT)')
+        self.key_prefix = json.dumps(self.properties, sort_keys=True) + '\n'
+
+    def annotate(self, text):
+        """
+        Annotate a text in one request, without the cache
+        :return: json output of CoreNLP
+        """
+        response = self.session.post(self.url, params={'properties': json.dumps(self.properties)},
+                                     data=text.encode('utf-8'))
+        response.raise_for_status()
+        return response.json()
+
+    def _key(self, sentence):
+        return hashlib.sha1((self.key_prefix + sentence).encode('utf-8')).hexdigest()
+
+    def _annotate_batch(self, sentences):
+        """
+        Annotate sentences in one request, falls back to one request per sentence if the batch fails
+        :return: list of the CoreNLP sentences of every sentence, None for the sentences which failed
+        """
+        if len(sentences) > 1:
+            try:
+                output = self.annotate(_separator.join(sentences))
+                ends = []
+                end = 0
+                for sentence in sentences:
+                    end += _utf16_len(sentence)
+                    ends.append(end)
+                    end += len(_separator)
+                results = [[] for _ in sentences]
+                i = 0
+                for corenlp_sentence in output['sentences']:
+                    begin = corenlp_sentence['tokens'][0]['characterOffsetBegin']
+                    while begin >= ends[i]:
+                        i += 1
+                    results[i].append(corenlp_sentence)
+                return results
+            except Exception as e:
+                print('Batch of ' + str(len(sentences)) + ' sentences failed, annotating them one by one')
+                print(e)
+        results = []
+        for sentence in sentences:
+            try:
+                results.append(self.annotate(sentence)['sentences'])
+            except Exception as e:
+                print('Error parsing sentence: ' + sentence)
+                print(e)
+                results.append(None)
+        return results
+
+    def annotate_sentences(self, sentences):
+        """
+        Annotate sentences, from the cache if possible
+        :param sentences: list of sentences
+        :return: list of the CoreNLP sentences (a sentence may be split further) of every sentence, None for the
+        sentences which could not be annotated
+        """
+        keys = [self._key(sentence) for sentence in sentences]
+        results = {}
+        for key in set(keys):
+            row = self.db.execute('SELECT value FROM annotations WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                results[key] = json.loads(row[0])
+        missing = []
+        for key, sentence in zip(keys, sentences):
+            if key not in results:
+                results[key] = None
+                missing.append((key, sentence))
+        if missing:
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                outputs = executor.map(lambda batch: self._annotate_batch([s for _, s in batch]), batches)
+                for batch, output in zip(batches, outputs):
+                    for (key, _), result in zip(batch, output):
+                        results[key] = result
+                        if result is not None:
+                            self.db.execute('INSERT OR REPLACE INTO annotations VALUES (?, ?)',
+                                            (key, json.dumps(result)))
+            self.db.commit()
+        return [results[key] for key in keys]
@@ -1,4 +1,5 @@
 import re, string
+from functools import lru_cache
 from nltk.tokenize import word_tokenize
 from nltk import ngrams
 from nltk.tokenize import sent_tokenize
@@ -113,7 +114,9 @@ def text2sent(text, language='english'):
     '''
     return [sentence for sentence in sent_tokenize(text.lower(), language)]
 
+@lru_cache(maxsize=None)
 def normalize_word(w):
+    # WordNet lemmatization is slow and the same words come up over and over
     return lemmatizer.lemmatize(w).lower()
 
 def get_tokenized_lemmas(s):
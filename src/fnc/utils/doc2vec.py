@@ -4,7 +4,7 @@ import sys, os, os.path as path
 
 from nltk.corpus import stopwords
 from fnc.utils.loadEmbeddings import LoadEmbeddings
-from fnc.utils.data_helpers import sent2tokens_wostop
+from fnc.utils.data_helpers import sent2tokens_wostop, text2sent
 from fnc.settings import myConstants
 from scipy import spatial
 import numpy as np
@@ -16,18 +16,68 @@ def avg_feature_vector(sent, model, num_features):
         featureVec = np.zeros((num_features,), dtype="float32")
         nwords = len(words)
 
-        for word in words:
-            if word.isdigit():
-                continue
-            if model.isKnown(word):
-                featureVec = np.add(featureVec, model.word2embedd(word))
-            else:
-                featureVec = np.add(featureVec, model.word2embedd(u"unknown"))
+        # digits are skipped but still counted in nwords
+        indices = token_indices(words, model)
+        if len(indices) > 0:
+            featureVec = featureVec + model.W[indices].sum(axis=0)
 
         if(nwords>0):
             featureVec = np.divide(featureVec, nwords)
         return featureVec
 
+def token_indices(words, model):
+    '''
+    Rows of the embeddings of the tokens in one pass over the vocabulary, unknown tokens map to "unknown"
+    :param words: list of tokens
+    :param model: LoadEmbeddings
+    :return: array of row indices, without the digits
+    '''
+    unknown = model.vocab_dict[u"unknown"]
+    return np.array([model.vocab_dict.get(word.lower(), unknown) for word in words if not word.isdigit()],
+                    dtype=np.int64)
+
+class EmbeddingLookup():
+    '''
+    Average embeddings of headlines and body sentences, computed with one fancy index on the memmap per text.
+    Headline vectors are memoized by text and the sentence vectors of a body by body id, or by text if there is none,
+    since every body and many headlines come up again and again in FNC/Snopes.
+    '''
+    def __init__(self, embeddings, embedding_size):
+        self.embeddings = embeddings
+        self.embedding_size = embedding_size
+        self.headline_cache = {}
+        self.body_cache = {}
+
+    def avg_vector(self, sent):
+        return avg_feature_vector(sent, model=self.embeddings, num_features=self.embedding_size)
+
+    def headline_vector(self, headline):
+        if headline not in self.headline_cache:
+            self.headline_cache[headline] = self.avg_vector(headline)
+        return self.headline_cache[headline]
+
+    def sentence_vectors(self, body, body_id=None):
+        '''
+        Average embeddings of the sentences of a body, sentences * embedding_size
+        '''
+        key = body if body_id is None else body_id
+        if key not in self.body_cache:
+            vectors = [self.avg_vector(sentence) for sentence in text2sent(body)]
+            self.body_cache[key] = np.array(vectors).reshape(len(vectors), self.embedding_size)
+        return self.body_cache[key]
+
+    def max_sentence_similarity(self, headline, body, body_id=None):
+        '''
+        Highest cosine similarity of the headline to a sentence of the body, as one matrix product, 0 at least
+        '''
+        sentence_vectors = self.sentence_vectors(body, body_id)
+        headline_vector = self.headline_vector(headline)
+        norms = np.linalg.norm(sentence_vectors, axis=1) * np.linalg.norm(headline_vector)
+        dots = sentence_vectors.dot(headline_vector)
+        # like max(score, nan), sentences or headlines with a zero vector are ignored
+        similarities = dots[norms > 0] / norms[norms > 0]
+        return max(0, float(similarities.max())) if len(similarities) > 0 else 0
+
 def avg_embedding_similarity(embeddings, embedding_size, sent1, sent2):
     #print("Calculating similarity for: " + sent1 + "\n and\n" + sent2)
     v1 = avg_feature_vector(sent1, model=embeddings, num_features=embedding_size)
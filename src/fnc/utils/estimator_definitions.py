@@ -300,3 +300,22 @@ def get_estimator(scorer_type, save_folder=None):
             ], n_jobs=5, voting='soft')
     return clf
 
+
+
+def accepts_sparse(clf):
+    """
+    Whether the estimator can be fitted on and predict CSR feature matrices directly
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    if isinstance(clf, VotingClassifier):
+        return all(accepts_sparse(estimator) for _, estimator in clf.estimators)
+    return isinstance(clf, (svm.SVC, logistic.LogisticRegression, GradientBoostingClassifier, RandomForestClassifier))
+
+
+def estimator_input(clf, X):
+    """
+    The feature matrix X in a format the estimator accepts, i.e. sparse matrices are only densified for estimators
+    which need dense input
+    """
+    from fnc.utils.feature_store import to_dense
+    return X if accepts_sparse(clf) else to_dense(X)
@@ -0,0 +1,100 @@
+import os
+import shutil
+from datetime import datetime
+from multiprocessing import Pool
+
+from fnc.utils.feature_store import save_feats_atomic, save_feats, load_feats, feats_exist, vstack_feats
+
+# features computed independently for every (headline, body) pair, without fitting anything on all rows, so their
+# rows can be split into shards. The lexicon features built with pandas are not in here, since the order of their
+# columns depends on the rows they see.
+ROW_PARALLEL_FEATURES = {'overlap', 'refuting', 'polarity', 'hand', 'hedging', 'discuss', 'lexical_features',
+                         'readability_features', 'structural_features'}
+
+
+def _shard_folder(feature_file):
+    return feature_file + '.shards'
+
+
+def _gen_shard(feat_fn, headlines, bodies, shard_file):
+    """
+    :return: shard_file and the preprocessing results computed by this worker, which the parent merges into its cache,
+    since the copy of the cache in a worker is lost with the worker
+    """
+    from fnc.refs.feature_engineering import preprocessed
+
+    save_feats_atomic(shard_file, feat_fn(headlines, bodies))
+    return shard_file, preprocessed.pop_new_results()
+
+
+def _queue_shards(pool, feat_fn, headlines, bodies, feature_file, shard_size):
+    """
+    Queue the shards of a feature which are not on the disk yet, the ones finished before a crash are reused
+    :return: list of shard files or AsyncResults of _gen_shard
+    """
+    os.makedirs(_shard_folder(feature_file), exist_ok=True)
+    shards = []
+    for start in range(0, len(headlines), shard_size):
+        end = min(start + shard_size, len(headlines))
+        shard_file = "%s/%d-%d.npy" % (_shard_folder(feature_file), start, end)
+        if os.path.isfile(shard_file):
+            shards.append(shard_file)
+        else:
+            shards.append(pool.apply_async(_gen_shard, (feat_fn, headlines[start:end], bodies[start:end], shard_file)))
+    return shards
+
+
+def gen_or_load_all_feats(feature_dict, feature_list, headlines, bodies, feature_files, bodyId, headId="", fold="",
+                          num_workers=None, shard_size=1000):
+    """
+    Same as gen_or_load_feats for all features of feature_list. The rows of the features in ROW_PARALLEL_FEATURES are
+    split into shards of shard_size rows, which a pool of processes computes while the other features are computed in
+    this process. Every shard is saved on its own, so a crashed run only recomputes the missing shards, and the shards
+    are merged into feature_file once all of them are done.
+    :param feature_dict: dict feature name -> feature function
+    :param feature_list: list of feature names
+    :param feature_files: list of the feature files, aligned with feature_list
+    :param num_workers: number of processes, number of cores by default, 1 computes everything in this process
+    :param shard_size: number of rows per shard
+    :return: list of feature matrices, aligned with feature_list
+    """
+    from fnc.refs.feature_engineering import gen_or_load_feats, preprocessed
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    # the pool is forked before anything big like the embeddings gets loaded
+    pool = Pool(num_workers) if num_workers > 1 else None
+    try:
+        shards = {}
+        if pool is not None:
+            for feature, feature_file in zip(feature_list, feature_files):
+                if feature not in ROW_PARALLEL_FEATURES or feature_file in shards or feats_exist(feature_file) \
+                        or len(headlines) <= shard_size:
+                    continue
+                print(str(datetime.now()) + ": Generating features in shards for: " + feature + ", fold: " + str(fold))
+                shards[feature_file] = _queue_shards(pool, feature_dict[feature], headlines, bodies, feature_file,
+                                                     shard_size)
+
+        feats = [None] * len(feature_list)
+        for i, (feature, feature_file) in enumerate(zip(feature_list, feature_files)):
+            if feature_file not in shards:
+                feats[i] = gen_or_load_feats(feature_dict[feature], headlines, bodies, feature_file, bodyId, feature,
+                                             headId, fold=fold)
+
+        for i, (feature, feature_file) in enumerate(zip(feature_list, feature_files)):
+            if feature_file in shards:
+                if not feats_exist(feature_file):
+                    shard_files = []
+                    for shard in shards[feature_file]:
+                        if not isinstance(shard, str):
+                            shard, new_results = shard.get()
+                            preprocessed.merge(new_results)
+                        shard_files.append(shard)
+                    save_feats(feature_file, vstack_feats([load_feats(s) for s in shard_files]))
+                    shutil.rmtree(_shard_folder(feature_file))
+                feats[i] = load_feats(feature_file)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return feats
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+from scipy import sparse
+
+# features with at least this many columns and at most this share of non-zero values are stored in CSR format, e.g.
+# the 5000-dim tf n-gram, char 3-gram and negated context features
+SPARSE_MIN_COLUMNS = 1000
+SPARSE_MAX_DENSITY = 0.1
+
+
+def sparse_file(feature_file):
+    """
+    File of the CSR version of a feature, i.e. /path/to/feature.npz for /path/to/feature.npy
+    """
+    return os.path.splitext(feature_file)[0] + '.npz'
+
+
+def feats_exist(feature_file):
+    return os.path.isfile(feature_file) or os.path.isfile(sparse_file(feature_file))
+
+
+def save_feats_atomic(feature_file, feats):
+    """
+    Save features such that feature_file is either complete or missing, even if the process gets killed
+    :param feature_file: /path/to/feature.npy
+    :param feats: feature matrix
+    """
+    tmp_file = feature_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        if sparse.issparse(feats):
+            sparse.save_npz(f, feats.tocsr())
+        else:
+            np.save(f, np.asarray(feats))
+    os.replace(tmp_file, feature_file)
+
+
+def save_feats(feature_file, feats):
+    """
+    Save features into the feature cache, as CSR into sparse_file(feature_file) if they are wide and mostly zeros,
+    as is into feature_file otherwise
+    :param feature_file: /path/to/feature.npy
+    :param feats: feature matrix, dense or sparse
+    """
+    if not sparse.issparse(feats):
+        feats = np.asarray(feats)
+        if feats.ndim == 2 and feats.shape[1] >= SPARSE_MIN_COLUMNS and feats.dtype != object \
+                and np.count_nonzero(feats) <= SPARSE_MAX_DENSITY * feats.size:
+            feats = sparse.csr_matrix(feats)
+    if sparse.issparse(feats):
+        save_feats_atomic(sparse_file(feature_file), feats)
+    else:
+        save_feats_atomic(feature_file, feats)
+
+
+def load_feats(feature_file):
+    """
+    Load features saved by save_feats, dense ones are memory-mapped read-only
+    :return: CSR matrix or array
+    """
+    if os.path.isfile(sparse_file(feature_file)):
+        return sparse.load_npz(sparse_file(feature_file)).tocsr()
+    try:
+        feats = np.load(feature_file, mmap_mode='r')
+    except ValueError:
+        # object arrays cannot be memory-mapped
+        feats = np.load(feature_file)
+    if isinstance(feats, np.lib.npyio.NpzFile):
+        # a CSR matrix written with save_feats_atomic to a .npy file
+        feats.close()
+        return sparse.load_npz(feature_file).tocsr()
+    return feats
+
+
+def hstack_feats(feats):
+    """
+    Concatenate feature matrices along the columns, into a CSR matrix if any of them is sparse
+    """
+    if any(sparse.issparse(feat) for feat in feats):
+        return sparse.hstack([sparse.csr_matrix(feat) if not sparse.issparse(feat) else feat for feat in feats],
+                             format='csr')
+    return np.concatenate(feats, axis=1)
+
+
+def vstack_feats(feats):
+    """
+    Concatenate feature matrices along the rows, into a CSR matrix if any of them is sparse
+    """
+    if any(sparse.issparse(feat) for feat in feats):
+        return sparse.vstack([sparse.csr_matrix(feat) if not sparse.issparse(feat) else feat for feat in feats],
+                             format='csr')
+    return np.concatenate(feats, axis=0)
+
+
+def to_dense(feats):
+    return feats.toarray() if sparse.issparse(feats) else feats
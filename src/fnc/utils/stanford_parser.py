@@ -1,29 +1,52 @@
-from pycorenlp import StanfordCoreNLP
 import os
 import pickle
 import nltk
 import networkx as nx
+from fnc.utils.corenlp_client import CoreNLPClient
 #import matplotlib.pyplot as plt
 
 tokenizer = nltk.tokenize.punkt.PunktSentenceTokenizer()
 _data_folder = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
 _pickled_data_folder = os.path.join(_data_folder, 'pickled')
 _stanford_pickle_database_file = 'stanparsed_fnc.pickle'
+# parses of all corpora, keyed by the hash of the sentence, see corenlp_client.py
+_stanford_cache_file = 'stanparsed.sqlite'
 
 class StanfordMethods:
-    def __init__(self):
-        self.webparser = StanfordCoreNLP('http://localhost:9020')
+    def __init__(self, url='http://localhost:9020', num_workers=8, batch_size=32,
+                 cache_file=os.path.join(_pickled_data_folder, _stanford_cache_file)):
+        self.client = CoreNLPClient(url, properties={
+            'timeout': '500000',
+            'annotators': 'tokenize,ssplit,truecase,pos,depparse,parse,sentiment'
+        }, cache_file=cache_file, num_workers=num_workers, batch_size=batch_size)
         self.load_pickle_file()
         #To use this parser an instance has to be started in parallel:
         #Download Stanford CoreNLP from: https://stanfordnlp.github.io/CoreNLP/index.html
         #Extract anywhere and execute following command: java -mx4g -cp "*" edu.stanford.nlp.pipeline.StanfordCoreNLPServer -port 9020
 
     def webparse(self, text):
-        return self.webparser.annotate(text, properties={
-            'timeout': '500000',
-            'annotators': 'tokenize,ssplit,truecase,pos,depparse,parse,sentiment',
-            'outputFormat': 'json'
-        })
+        return self.client.annotate(text)
+
+    def parse_sentences(self, text, max_number_of_sentences=99):
+        '''
+        Split the text into sentences and parse them, max_number_of_sentences sentences per call of the client
+        :return: generator of (raw sentence, list of parsed sentences or None if the sentence could not be parsed)
+        '''
+        raw_sentences = tokenizer.tokenize(text)
+        for start in range(0, len(raw_sentences), max_number_of_sentences):
+            chunk = raw_sentences[start:start + max_number_of_sentences]
+            for raw_sentence, parsed in zip(chunk, self.client.annotate_sentences(chunk)):
+                yield raw_sentence, parsed
+
+    def prefetch(self, texts, max_number_of_sentences=99):
+        '''
+        Parse the first sentences of many texts at once, so the server gets enough requests to keep all of its threads
+        busy. getStanfordInfo then finds them in the cache.
+        '''
+        raw_sentences = []
+        for text in set(texts):
+            raw_sentences.extend(tokenizer.tokenize(text)[:max_number_of_sentences])
+        self.client.annotate_sentences(raw_sentences)
 
     def load_pickle_file(self):
         try:
@@ -105,12 +128,13 @@ class StanfordMethods:
             'retract'
         ]
 
-        for raw_sentence in tokenizer.tokenize(text):
+        for raw_sentence, parsed_sentences in self.parse_sentences(text, max_number_of_sentences):
             try:
-                tagged_text = dict(self.webparse(raw_sentence))
+                if parsed_sentences is None:
+                    raise ValueError('CoreNLP could not parse the sentence')
                 # Normally only one sentence should be in a raw_Sentence
                 #  - but the nltk PunktSentence Tokenizer might have missed a split
-                for sentence in tagged_text['sentences']:
+                for sentence in parsed_sentences:
                     current_sentence += 1
                     # Extract nouns and verbs
                     sentiment_value_list.append(int(sentence['sentimentValue']))
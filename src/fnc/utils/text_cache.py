@@ -0,0 +1,94 @@
+import hashlib
+import os
+import pickle
+
+
+class TextCache():
+    """
+    Results of the preprocessing steps (cleaning, tokenization, lemmatization, ...) of texts, computed once per text and
+    shared by all features. FNC and Snopes pair every body with many headlines, so without the cache the same body is
+    preprocessed again for every headline and every feature.
+    With a cache_dir, the results are also stored on the disk, keyed by the SHA-1 of the text, and reused by the next
+    runs.
+    """
+
+    def __init__(self, steps, cache_dir=None):
+        """
+        :param steps: dict name of the step -> function text -> result
+        :param cache_dir: /path/to/cache or None to keep the results in memory only
+        """
+        self.steps = steps
+        self.cache_dir = cache_dir
+        self.results = {name: {} for name in steps}
+        self.stored = {}
+        self.new_results = {name: {} for name in steps}
+
+    def get(self, step, text):
+        """
+        Result of a step on a text, computed at the first call only
+        """
+        results = self.results[step]
+        if text in results:
+            return results[text]
+        key = None
+        if self.cache_dir is not None:
+            key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+            stored = self._load(step)
+            if key in stored:
+                results[text] = stored[key]
+                return results[text]
+        result = self.steps[step](text)
+        results[text] = result
+        if key is not None:
+            self.new_results[step][key] = result
+        return result
+
+    def _file(self, step):
+        return os.path.join(self.cache_dir, step + '.pkl')
+
+    def _load(self, step):
+        if step not in self.stored:
+            self.stored[step] = {}
+            if os.path.exists(self._file(step)):
+                with open(self._file(step), 'rb') as handle:
+                    self.stored[step] = pickle.load(handle)
+        return self.stored[step]
+
+    def pop_new_results(self):
+        """
+        Take the results computed since the last save or pop, e.g. in a worker process to hand them to the parent
+        :return: dict step -> dict SHA-1 of the text -> result
+        """
+        new_results = self.new_results
+        self.new_results = {name: {} for name in self.steps}
+        return new_results
+
+    def merge(self, new_results):
+        """
+        Add results computed by another process, e.g. a pool worker, so the next save writes them too
+        :param new_results: dict step -> dict SHA-1 of the text -> result, see pop_new_results
+        """
+        for step, results in new_results.items():
+            self.new_results[step].update(results)
+            if step in self.stored:
+                self.stored[step].update(results)
+
+    def save(self):
+        """
+        Write the results computed since the last save into cache_dir, does nothing without a cache_dir
+        """
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for step, new_results in self.new_results.items():
+            if not new_results:
+                continue
+            # reload the file, another process may have saved results of its own in the meantime
+            self.stored.pop(step, None)
+            stored = self._load(step)
+            stored.update(new_results)
+            tmp_file = "%s.%d.tmp" % (self._file(step), os.getpid())
+            with open(tmp_file, 'wb') as handle:
+                pickle.dump(stored, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self._file(step))
+            self.new_results[step] = {}
@@ -1,10 +1,11 @@
 import sys, os, os.path as path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 
+import numpy as np
 from sklearn.metrics import euclidean_distances
 from nltk.corpus import stopwords
 from fnc.utils.loadEmbeddings import LoadEmbeddings
-from fnc.utils.data_helpers import sent2tokens_wostop
+from fnc.utils.data_helpers import sent2tokens_wostop, text2sent
 
 stoplist = set(stopwords.words('english'))
 
@@ -21,17 +22,121 @@ def sent2embedd(sentence, emb):
     return list_emb
 
 def wmdistance(sent1_embs, sent2_embs):
-    wmd = 0.0
-    for _,x in sent1_embs:
-        min_dist = sys.float_info.max
-        for _,y in sent2_embs:
-            x = x.reshape(1, -1)
-            y = y.reshape(1, -1)
-            distance = euclidean_distances(x,y)
-            if distance < min_dist:
-                min_dist = distance
-        wmd += min_dist
-    return - float(wmd) / (len(sent1_embs) + len(sent2_embs))
+    x = np.array([embedding for _, embedding in sent1_embs])
+    y = np.array([embedding for _, embedding in sent2_embs])
+    return - _min_distance_sums(x, y)[0] / (len(sent1_embs) + len(sent2_embs))
+
+def _min_distance_sums(x, y):
+    '''
+    Sums of the distances of each vector of x to its nearest vector of y and of each vector of y to its nearest
+    vector of x, from a single pairwise distance matrix
+    '''
+    if len(x) == 0 or len(y) == 0:
+        # same as the pairwise loop: a token without any counterpart is sys.float_info.max away
+        return float(len(x) * sys.float_info.max), float(len(y) * sys.float_info.max)
+    distances = euclidean_distances(x, y)
+    return float(distances.min(axis=1).sum()), float(distances.min(axis=0).sum())
+
+def relaxed_wmd(matrix1, matrix2):
+    '''
+    Same as computeAverageWMD, but on the token matrices of the two texts
+    :param matrix1: token vectors of the first text, tokens * embedding_size
+    :param matrix2: token vectors of the second text, tokens * embedding_size
+    :return: average of the relaxed WMD in both directions
+    '''
+    sum12, sum21 = _min_distance_sums(matrix1, matrix2)
+    return - (sum12 + sum21) / (2.0 * (len(matrix1) + len(matrix2)))
+
+class WMDEngine():
+    '''
+    Relaxed WMD features of many headline/body pairs. The embeddings are loaded once, each text is gathered into a
+    matrix of token vectors and the matrices of the bodies are cached, since every body comes with many headlines.
+    All headlines of a body are compared with the body in a single pairwise distance matrix.
+    '''
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.unknown_index = embeddings.vocab_dict["unknown"]
+        self.body_cache = {}
+        self.sentences_cache = {}
+
+    def text2matrix(self, text):
+        # same tokens and same vectors as sent2embedd
+        indices = [self.embeddings.vocab_dict.get(token.lower(), self.unknown_index)
+                   for token in sent2tokens_wostop(text, stoplist)]
+        return np.asarray(self.embeddings.W[np.array(indices, dtype=np.int64)])
+
+    def body2matrices(self, body):
+        '''
+        Token matrix of the whole body, cached by body
+        '''
+        if body not in self.body_cache:
+            self.body_cache[body] = self.text2matrix(body)
+        return [self.body_cache[body]]
+
+    def sentences2matrices(self, body):
+        '''
+        Token matrices of the sentences of the body, cached by body
+        '''
+        if body not in self.sentences_cache:
+            self.sentences_cache[body] = [self.text2matrix(sentence) for sentence in text2sent(body)]
+        return self.sentences_cache[body]
+
+    def distances(self, headline_matrices, segment_matrices):
+        '''
+        abs(relaxed_wmd) of every headline to every segment of a body, computed from one distance matrix
+        :param headline_matrices: list of non-empty token matrices of the headlines
+        :param segment_matrices: list of non-empty token matrices of the segments of the body, e.g. its sentences
+        :return: array headlines * segments
+        '''
+        h_sizes = np.array([len(m) for m in headline_matrices])
+        s_sizes = np.array([len(m) for m in segment_matrices])
+        h_offsets = np.concatenate([[0], np.cumsum(h_sizes)[:-1]])
+        s_offsets = np.concatenate([[0], np.cumsum(s_sizes)[:-1]])
+        distances = euclidean_distances(np.concatenate(headline_matrices), np.concatenate(segment_matrices))
+        # headline tokens to their nearest token of each segment, summed per headline
+        sums_hs = np.add.reduceat(np.minimum.reduceat(distances, s_offsets, axis=1), h_offsets, axis=0)
+        # segment tokens to their nearest token of each headline, summed per segment
+        sums_sh = np.add.reduceat(np.minimum.reduceat(distances, h_offsets, axis=0), s_offsets, axis=1)
+        return (sums_hs + sums_sh) / (2.0 * (h_sizes[:, None] + s_sizes[None, :]))
+
+    def min_distances(self, headlines, bodies, body2segments, max_distance=99999):
+        '''
+        Lowest abs(relaxed_wmd) of each headline to the segments of its body, capped at max_distance
+        :param body2segments: body2matrices or sentences2matrices
+        :return: list of distances, aligned with headlines
+        '''
+        pairs_of_body = {}
+        for i, body in enumerate(bodies):
+            pairs_of_body.setdefault(body, []).append(i)
+        results = [max_distance] * len(headlines)
+        for body, pairs in pairs_of_body.items():
+            segments = body2segments(body)
+            headline_matrices = [self.text2matrix(headlines[i]) for i in pairs]
+            non_empty_segments = [m for m in segments if len(m) > 0]
+            batched = [i for i, m in zip(pairs, headline_matrices) if len(m) > 0] if non_empty_segments else []
+            batched_set = set(batched)
+            if batched:
+                distances = self.distances([m for m in headline_matrices if len(m) > 0], non_empty_segments)
+                for i, distance in zip(batched, distances.min(axis=1)):
+                    results[i] = min(max_distance, float(distance))
+            # empty headlines or bodies without any known token keep the semantics of the pairwise loop
+            for i, matrix in zip(pairs, headline_matrices):
+                if i not in batched_set:
+                    for segment in segments:
+                        results[i] = min(results[i], abs(relaxed_wmd(matrix, segment)))
+        return results
+
+    def sentence_min(self, headlines, bodies):
+        '''
+        Lowest relaxed WMD of each headline to a sentence of its body
+        '''
+        return self.min_distances(headlines, bodies, self.sentences2matrices)
+
+    def wholebody(self, headlines, bodies):
+        '''
+        Relaxed WMD of each headline to its whole body
+        '''
+        return self.min_distances(headlines, bodies, self.body2matrices, max_distance=float('inf'))
     
 # Note that this breaks the symmetry and is not a distance anymore:
 # To overcome this, we compute the average of the score in both side: (weigthedWMD(a,b) + weightedWMD(b,a))/2
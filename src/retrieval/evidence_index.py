@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+
+def split_doc_lines(lines):
+    """
+    Texts of the lines of a page as stored in the FEVER db, "0\tsentence\tlink...\n1\tsentence...". Lines with a
+    text of at most one character are empty.
+    :param lines: lines of the page as returned by FeverDocDB.get_doc_lines
+    :return: list of texts, the index in the list is the line number
+    """
+    if not lines:
+        return []
+    texts = []
+    for doc_line in lines.split("\n"):
+        text = doc_line.split("\t")[1]
+        texts.append(text if len(text) > 1 else "")
+    return texts
+
+
+class EvidenceIndex(object):
+    """
+    Texts of the evidence sentences keyed by (page, line). The db can be
+     - a SnopesDocDB, which reads single lines from its page store,
+     - a dict page -> list of lines, e.g. a loaded snopes json,
+     - a FeverDocDB or any db with get_doc_lines, whose pages are split into lines once and kept in an LRU of
+       cache_size pages, so all candidate sentences of a page are looked up without querying the db again.
+    """
+
+    def __init__(self, db, cache_size=10000):
+        """
+        :param db: page db, see above
+        :param cache_size: number of pages kept split into lines
+        """
+        self.db = db
+        self.cache_size = cache_size
+        self.pages = OrderedDict()
+
+    def get_page_lines(self, page):
+        """
+        Texts of all lines of a page, an empty list if the page does not exist
+        """
+        if isinstance(self.db, dict):
+            return self.db.get(page, [])
+        if page in self.pages:
+            self.pages.move_to_end(page)
+            return self.pages[page]
+        if hasattr(self.db, 'get_lines'):
+            lines = self.db.get_lines(page) or []
+        else:
+            lines = split_doc_lines(self.db.get_doc_lines(page))
+        self.pages[page] = lines
+        if len(self.pages) > self.cache_size:
+            self.pages.popitem(last=False)
+        return lines
+
+    def get_line(self, page, line):
+        """
+        Text of one line, None if the page or the line does not exist
+        """
+        if hasattr(self.db, 'get_line'):
+            # the page store reads single lines directly
+            return self.db.get_line(page, line)
+        lines = self.get_page_lines(page)
+        if line is None or line < 0 or line >= len(lines):
+            return None
+        return lines[line]
+
+    def get_lines(self, evidence_refs):
+        """
+        Texts of a list of (page, line) references, None for the ones which do not exist
+        """
+        return [self.get_line(page, line) for page, line in evidence_refs]
+
+    def get_whole_evidence(self, evidence_refs):
+        """
+        Texts of a list of (page, line) references joined by spaces, references which do not exist are left out
+        """
+        return ' '.join(text for text in self.get_lines(evidence_refs) if text is not None)
+
+
+_indexes = {}
+
+
+def evidence_index(db):
+    """
+    EvidenceIndex shared by all users of the db, created at the first call
+    """
+    index = _indexes.get(id(db))
+    if index is None or index.db is not db:
+        index = EvidenceIndex(db)
+        _indexes[id(db)] = index
+    return index
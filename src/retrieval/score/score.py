@@ -195,23 +195,95 @@ def evidence_micro_precision(instance):
     return this_precision, this_precision_hits
 
 
-def fever_score(predictions,actual=None, max_pages=5, max_evidence=5):
+def _hits_prefix(predicted_evidence, evidence_set):
+    # hits[i] is the number of the first i predictions which are in evidence_set
+    hits = [0]
+    for prediction in predicted_evidence:
+        hits.append(hits[-1] + (tuple(prediction) in evidence_set))
+    return hits
+
+
+def _num_evidence_for_group(predicted_evidence, evidence):
+    # smallest max_evidence for which an entire group of actual sentences is in the predicted sentences
+    positions = {}
+    for i, prediction in enumerate(predicted_evidence):
+        positions.setdefault(tuple(prediction), i + 1)
+    needed = float('inf')
+    for evidence_group in evidence:
+        needed = min(needed, max([positions.get((e[0], e[1]), float('inf')) for e in evidence_group], default=0))
+    return needed
+
+
+def evidence_scores(instance, max_evidences):
+    """
+    Strict correctness, macro precision and macro recall of an instance for several max_evidence at once, the same
+    values as is_strictly_correct, evidence_macro_precision_2 and evidence_macro_recall_2 give for every max_evidence.
+    The (page, line) pairs are hashed into sets once, so every max_evidence only costs a lookup.
+    :param instance: instance with label, predicted_label, evidence and predicted_evidence
+    :param max_evidences: list of max_evidence, None for no limit
+    :return: list of (strict, precision, precision_hits, recall, recall_hits), aligned with max_evidences
+    """
+    correct = is_correct_label(instance)
+    if correct:
+        check_predicted_evidence_format(instance)
+
+    if instance["label"].upper() == "NOT ENOUGH INFO":
+        return [(1.0 if correct else 0.0, 0.0, 0.0, 0.0, 0.0) for _ in max_evidences]
+
+    if correct:
+        assert 'predicted_evidence' in instance, "Predicted evidence must be provided for strict scoring"
+    predicted_evidence = instance["predicted_evidence"]
+    num_predicted = len(predicted_evidence)
+
+    needed = _num_evidence_for_group(predicted_evidence, instance["evidence"]) if correct else float('inf')
+
+    precision_evidence = set((e[0], e[1]) for eg in instance["evidence"] for e in eg if e[1] is not None)
+    precision_hits = _hits_prefix(predicted_evidence, precision_evidence)
+
+    no_evidence = len(instance["evidence"]) == 0 or instance["evidence"] == [[]]
+    recall_evidence = set((e[0], e[1]) for eg in instance["evidence"] for e in eg)
+    recall_hits = precision_hits if recall_evidence == precision_evidence else \
+        _hits_prefix(predicted_evidence, recall_evidence)
+
+    scores = []
+    for max_evidence in max_evidences:
+        strict = 1.0 if needed <= (num_predicted if max_evidence is None else max_evidence) else 0.0
+
+        num_evidence = len(precision_evidence) if max_evidence is None or len(precision_evidence) < max_evidence \
+            else max_evidence
+        num_evidence = min(num_evidence, num_predicted)
+        precision = precision_hits[num_evidence] / num_evidence if num_evidence > 0 else 1.0
+
+        if no_evidence:
+            recall = 1.0
+        else:
+            num_evidence = min(len(recall_evidence) if max_evidence is None else max_evidence, num_predicted)
+            recall = recall_hits[num_evidence] / (len(recall_evidence) if max_evidence is None or
+                                                  len(recall_evidence) < max_evidence else max_evidence)
+
+        scores.append((strict, precision, 1.0, recall, 1.0))
+    return scores
+
+
+def fever_scores(predictions, actual=None, max_evidences=(5,)):
+    """
+    fever_score for several max_evidence in a single pass over the predictions, e.g. for sweeps over the number of
+    retrieved sentences. Unlike fever_score, the predicted evidence of the instances is not truncated.
+    :param predictions: list of instances with predicted_label and predicted_evidence
+    :param actual: list of the gold instances in blind evaluation mode
+    :param max_evidences: list of max_evidence, None for no limit
+    :return: dict max_evidence -> (strict_score, acc_score, precision, recall, f1)
+    """
     correct = 0
-    strict = 0
-
-    macro_precision = 0
-    macro_precision_hits = 0
-
-    macro_recall = 0
-    macro_recall_hits = 0
+    strict = [0.0] * len(max_evidences)
 
-    refutes_hits = 0
-    supports_hits = 0
+    macro_precision = [0.0] * len(max_evidences)
+    macro_precision_hits = [0.0] * len(max_evidences)
 
-    doc_recall = 0
-    doc_recall_hits = 0
+    macro_recall = [0.0] * len(max_evidences)
+    macro_recall_hits = [0.0] * len(max_evidences)
 
-    for idx,instance in enumerate(predictions):
+    for idx, instance in enumerate(predictions):
         assert 'predicted_evidence' in instance.keys(), 'evidence must be provided for the prediction'
 
         #If it's a blind test set, we need to copy in the values from the actual data
@@ -227,44 +299,33 @@ def fever_score(predictions,actual=None, max_pages=5, max_evidence=5):
         if is_correct_label(instance):
             correct += 1.0
 
-            if is_strictly_correct(instance, max_evidence):
-                strict+=1.0
-
-        macro_prec_old = evidence_macro_precision(instance, max_evidence)
-        macro_prec = evidence_macro_precision_2(instance, max_evidence)
-        macro_precision += macro_prec[0]
-        macro_precision_hits += macro_prec[1]
-
-
-        macro_rec = evidence_macro_recall_2(instance, max_evidence)
-        macro_rec_old = evidence_macro_recall(instance, max_evidence)
-        ## the distribution of extracted complete evidence set w.r.t. labels
-        # if instance['label'].upper() == "REFUTES":
-        #     refutes_hits += macro_rec[0]
-        # elif instance['label'].upper() == "SUPPORTS":
-        #     supports_hits += macro_rec[0]
-        macro_recall += macro_rec[0]
-        macro_recall_hits += macro_rec[1]
-
-#         doc_rec = doc_macro_recall(instance, max_pages)
-#         doc_recall += doc_rec[0]
-#         doc_recall_hits += doc_rec[1]
-        instance["evidence"]
-        instance["predicted_evidence"]
-    total = len(predictions)
+        for i, scores in enumerate(evidence_scores(instance, max_evidences)):
+            strict[i] += scores[0]
+            macro_precision[i] += scores[1]
+            macro_precision_hits[i] += scores[2]
+            macro_recall[i] += scores[3]
+            macro_recall_hits[i] += scores[4]
 
-    strict_score = strict / total
+    total = len(predictions)
     acc_score = correct / total
 
-    pr = (macro_precision / macro_precision_hits) if macro_precision_hits > 0 else 1.0
-    rec = (macro_recall / macro_recall_hits) if macro_recall_hits > 0 else 0.0
-    # refutes_ratio = (refutes_hits/macro_recall) if macro_recall>0 else 0.0
-    # supports_ratio = (supports_hits/macro_recall) if macro_recall>0 else 0.0
-#     docmuents_recall = (doc_recall/doc_recall_hits) if doc_recall_hits>0 else 0.0
+    results = {}
+    for i, max_evidence in enumerate(max_evidences):
+        pr = (macro_precision[i] / macro_precision_hits[i]) if macro_precision_hits[i] > 0 else 1.0
+        rec = (macro_recall[i] / macro_recall_hits[i]) if macro_recall_hits[i] > 0 else 0.0
+        f1 = 2.0 * pr * rec / (pr + rec)
+        results[max_evidence] = strict[i] / total, acc_score, pr, rec, f1
+    return results
 
 
+def fever_score(predictions, actual=None, max_pages=5, max_evidence=5):
+    # the document recall for max_pages is not part of the score (see doc_macro_recall)
+    strict_score, acc_score, pr, rec, f1 = fever_scores(predictions, actual, [max_evidence])[max_evidence]
 
-    f1 = 2.0 * pr * rec / (pr + rec)
-    # f1 = 0.0
+    # like is_strictly_correct, cut the predicted evidence of the correctly labelled instances to max_evidence
+    if max_evidence is not None:
+        for instance in predictions:
+            if instance["label"].upper() != "NOT ENOUGH INFO" and is_correct_label(instance):
+                instance["predicted_evidence"] = instance["predicted_evidence"][:max_evidence]
 
-    return strict_score, acc_score, pr, rec, f1
\ No newline at end of file
+    return strict_score, acc_score, pr, rec, f1
@@ -6,7 +6,9 @@ import pickle
 import os
 import nltk
 from pyfasttext import FastText
-import json
+
+from retrieval.snopes_doc_db import SnopesDocDB
+from retrieval.evidence_index import evidence_index
 
 
 class Data(object):
@@ -25,8 +27,7 @@ class Data(object):
         self.h_max_length = h_max_length
         self.s_max_length = s_max_length
         self.db_filepath = os.path.join(self.base_path,db_filepath)
-        with open(self.db_filepath) as f: 
-            self.db = json.load(f)
+        self.db = SnopesDocDB(self.db_filepath)
 
         self.data_pipeline()
 
@@ -83,16 +84,7 @@ class Data(object):
         return self
 
     def get_whole_evidence(self,evidence_set, db):
-        pos_sents = []
-        for evidence in evidence_set:
-            page = evidence[0]
-            doc_lines = db[page]['lines']
-            # doc_lines = db[page]
-            for i in range(len(doc_lines)): 
-                if i == evidence[1]: 
-                    pos_sents.append(doc_lines[i])    
-        pos_sent = ' '.join(pos_sents)
-        return pos_sent
+        return evidence_index(db).get_whole_evidence([(evidence[0], evidence[1]) for evidence in evidence_set])
 
     def get_valid_texts(self,lines, page):
         if not lines:
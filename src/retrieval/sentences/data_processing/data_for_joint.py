@@ -9,6 +9,7 @@ from tqdm import tqdm
 
 from common.dataset.reader import JSONLineReader
 from retrieval.fever_doc_db import FeverDocDB
+from retrieval.evidence_index import evidence_index
 
 
 class Data(object):
@@ -84,16 +85,7 @@ class Data(object):
         return self
 
     def get_whole_evidence(self, evidence_set, db):
-        pos_sents = []
-        for evidence in evidence_set:
-            page = evidence[2]
-            doc_lines = db.get_doc_lines(page)
-            doc_lines = self.get_valid_texts(doc_lines, page)
-            for doc_line in doc_lines:
-                if doc_line[2] == evidence[3]:
-                    pos_sents.append(doc_line[0])
-        pos_sent = ' '.join(pos_sents)
-        return pos_sent
+        return evidence_index(db).get_whole_evidence([(evidence[2], evidence[3]) for evidence in evidence_set])
 
     def get_valid_texts(self, lines, page):
         if not lines:
@@ -11,13 +11,24 @@ from common.dataset.reader import JSONLineReader
 from rte.riedel.data import FEVERGoldFormatter, FEVERLabelSchema
 import numpy as np
 
-from drqascripts.retriever.build_tfidf_lines import OnlineTfidfDocRanker
+from functools import lru_cache
+
 from drqa.retriever.tfidf_doc_ranker import TfidfDocRanker
+from retrieval.tfidf_sentence_index import TfidfSentenceIndex, is_tfidf_index
+
+
+@lru_cache(maxsize=None)
+def load_tfidf_index(tfidf_path):
+    # the index is loaded once per path, not at every call of tfidf_transform. Both a TfidfSentenceIndex folder and a
+    # DrQA TfidfDocRanker model file are accepted, they share text2spvec
+    if is_tfidf_index(tfidf_path):
+        return TfidfSentenceIndex.load(tfidf_path)
+    return TfidfDocRanker(tfidf_path)
 
 
 def tfidf_transform(claim,sent,tfidf_path):
 
-    tfidf = TfidfDocRanker(tfidf_path)
+    tfidf = load_tfidf_index(tfidf_path)
     tfidf_claim = tfidf.text2spvec(claim)
     tfidf_sent = tfidf.text2spvec(sent)
 
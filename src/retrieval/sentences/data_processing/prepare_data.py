@@ -1,20 +1,13 @@
 from common.dataset.reader import JSONLineReader
 from retrieval.fever_doc_db import FeverDocDB
+from retrieval.evidence_index import evidence_index
 from tqdm import tqdm
 import random
 import json
 # from drqascripts.retriever.build_tfidf_lines import OnlineTfidfDocRanker
 
 def get_whole_evidence( evidence_set, db):
-    pos_sents = []
-    for evidence in evidence_set:
-        page = evidence[0]
-        doc_lines = db[page]
-        for i in range(len(doc_lines)): 
-            if i == evidence[1]: 
-                pos_sents.append(doc_lines[i])      
-    pos_sent = ' '.join(pos_sents)
-    return pos_sent
+    return evidence_index(db).get_whole_evidence([(evidence[0], evidence[1]) for evidence in evidence_set])
 
 def test_data(db_path, dataset_path, type="ranking"):
     """
@@ -168,7 +168,15 @@ class ESIM:
             h_encodings = self._bidirectional_rnn(embed_h, X_h_length, self.num_units, scope="h_encode_rnn")
             s_encodings = self._bidirectional_rnn(embed_s, X_s_length, self.num_units, scope="s_endode_rnn")
 
-        sent_attends, claim_attends = self._inter_atten(h_encodings, s_encodings, X_h_length, X_s_length)
+        # Every candidate sentence is paired with the claim claim_index points to. During training the claims are
+        # given pair by pair, at inference every distinct claim is encoded once and its encodings are fed back
+        # together with claim_index, which skips the claim encoder (see predict).
+        claim_encodings = h_encodings
+        claim_index = tf.placeholder_with_default(tf.range(tf.shape(X_s)[0]), shape=[None], name="claim_index")
+        h_encodings = tf.gather(claim_encodings, claim_index)
+        h_length = tf.gather(X_h_length, claim_index)
+
+        sent_attends, claim_attends = self._inter_atten(h_encodings, s_encodings, h_length, X_s_length)
 
         claim_diff = tf.subtract(h_encodings, claim_attends)
         claim_mul = tf.multiply(h_encodings, claim_attends)
@@ -181,14 +189,14 @@ class ESIM:
 
         if self.share_rnn:
             with tf.variable_scope("infer_rnn", reuse=tf.AUTO_REUSE):
-                h_infer = self._bidirectional_rnn(m_claim, X_h_length, self.num_units)
+                h_infer = self._bidirectional_rnn(m_claim, h_length, self.num_units)
                 s_infer = self._bidirectional_rnn(m_sent, X_s_length, self.num_units)
         else:
-            h_infer = self._bidirectional_rnn(m_claim, X_h_length, self.num_units, scope="h_infer_rnn")
+            h_infer = self._bidirectional_rnn(m_claim, h_length, self.num_units, scope="h_infer_rnn")
             s_infer = self._bidirectional_rnn(m_sent, X_s_length, self.num_units, scope="s_infer_rnn")
 
         claim_sum = tf.reduce_sum(h_infer, axis=1)
-        claim_mask = tf.cast(tf.sequence_mask(X_h_length), tf.float32)
+        claim_mask = tf.cast(tf.sequence_mask(h_length), tf.float32)
         claim_ave = tf.div(claim_sum, tf.reduce_sum(claim_mask, axis=1, keepdims=True))
         claim_max = tf.reduce_max(h_infer, axis=1)
 
@@ -227,6 +235,7 @@ class ESIM:
         #     self._file_writer = file_writer
 
         self._X_h, self._X_s, self._X_h_length, self._X_s_length = X_h, X_s, X_h_length, X_s_length
+        self._claim_encodings, self._claim_index = claim_encodings, claim_index
         self.h_infer = h_infer
         self.h_encodings = h_encodings
         self.attend = claim_attends
@@ -257,14 +266,18 @@ class ESIM:
         self._session.run(assign_ops, feed_dict=feed_dict)
 
     def padding(self, sents, word_dict, max_length):
+        """
+        Pad the sentences to max_length, the lists of the caller are left unchanged, so a sentence which is padded
+        again (e.g. a claim in several pairs or epochs) keeps its real length
+        :return: padded sentences, real lengths
+        """
         _PAD_ = word_dict['[PAD]']
         lengths = []
         padded_sents = []
         for sent in sents:
             lengths.append(len(sent))
             if len(sent) < max_length:
-                sent.extend([_PAD_] * (max_length - len(sent)))
-                padded_sents.append(sent)
+                padded_sents.append(list(sent) + [_PAD_] * (max_length - len(sent)))
             else:
                 padded_sents.append(sent)
         padded_sents = np.asarray(padded_sents, np.int32)
@@ -373,17 +386,7 @@ class ESIM:
 
             labels = dev_labels[i]
 
-            predictions = []
-            for h_batch, h_lengths_batch, s_batch, s_lengths_batch in self.generate_dev_batch(dev):
-                if len(h_batch) == 0 or len(s_batch) == 0:
-                    continue
-                feed_dict = {self._X_h: h_batch, self._X_s: s_batch, self._X_h_length: h_lengths_batch,
-                             self._X_s_length: s_lengths_batch}
-                predicts = self._session.run(self.scores, feed_dict=feed_dict)
-                predicts = np.reshape(predicts, newshape=(-1,))
-                predicts = predicts.tolist()
-                predictions.extend(predicts)
-            predictions = np.reshape(np.asarray(predictions), newshape=(-1,))
+            predictions = np.reshape(self.predict(dev), newshape=(-1,))
 
             rank_index = np.argsort(predictions).tolist()[::-1][:at]
 
@@ -493,28 +496,51 @@ class ESIM:
 
         return self
 
+    def encode_claims(self, claims):
+        """
+        Run the claim encoder once per claim
+        :param claims: list of claims, as lists of word indexes
+        :return: claim encodings [num_claims, h_max_length, 2 * num_units], claim lengths
+        """
+        encodings = []
+        lengths = []
+        with self._session.as_default() as sess:
+            for start_i in range(0, len(claims), self.batch_size):
+                X_h_batch, X_h_lengths_batch = self.padding(claims[start_i:start_i + self.batch_size], self.word_dict,
+                                                            self.h_max_length)
+                feed_dict = {self._X_h: X_h_batch, self._X_h_length: X_h_lengths_batch}
+                encodings.append(sess.run(self._claim_encodings, feed_dict=feed_dict))
+                lengths.append(X_h_lengths_batch)
+        return np.concatenate(encodings), np.concatenate(lengths)
+
     def predict(self, X):
+        """
+        Score (claim, sentence) pairs in two stages: every distinct claim is encoded once, then only the sentence
+        encoder, the cross attention and the composition run for the pairs
+        :param X: list of (claim, sentence) pairs, as lists of word indexes
+        :return: scores [len(X), 1]
+        """
 
         if not self._session:
             raise NotFittedError("This %s instance is not fitted yet" % self.__class__.__name__)
+        if len(X) == 0:
+            return np.zeros([0, 1], np.float32)
 
+        claim_ids = {}
+        pair_claims = np.asarray([claim_ids.setdefault(tuple(claim), len(claim_ids)) for claim, _ in X], np.int32)
+        claim_encodings, claim_lengths = self.encode_claims(list(claim_ids))
+        sents = [sent for _, sent in X]
         with self._session.as_default() as sess:
             predicts = []
-            claims = [claim for claim, _ in X]
-            sents = [sent for _, sent in X]
-            for i in range(ceil(len(claims) / self.batch_size)):
-                start_i = i * self.batch_size
-                end_i = (i + 1) * self.batch_size
-                if start_i == len(claims):
-                    break
-                if end_i > len(claims):
-                    end_i = len(claims)
-                X_h_batch = claims[start_i:end_i]
-                X_s_batch = sents[start_i:end_i]
-                X_h_batch, X_h_lengths_batch = self.padding(X_h_batch, self.word_dict, self.h_max_length)
-                X_s_batch, X_s_lengths_batch = self.padding(X_s_batch, self.word_dict, self.s_max_length)
-                feed_dict = {self._X_h: X_h_batch, self._X_s: X_s_batch,
-                             self._X_h_length: X_h_lengths_batch,
+            for start_i in range(0, len(sents), self.batch_size):
+                end_i = min(start_i + self.batch_size, len(sents))
+                # only the encodings of the claims of this batch are fed
+                batch_claims, claim_index_batch = np.unique(pair_claims[start_i:end_i], return_inverse=True)
+                X_s_batch, X_s_lengths_batch = self.padding(sents[start_i:end_i], self.word_dict, self.s_max_length)
+                feed_dict = {self._claim_encodings: claim_encodings[batch_claims],
+                             self._X_h_length: claim_lengths[batch_claims],
+                             self._claim_index: claim_index_batch.reshape(-1),
+                             self._X_s: X_s_batch,
                              self._X_s_length: X_s_lengths_batch}
 
                 predict = sess.run(self.scores, feed_dict=feed_dict)
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def top_k(scores, k):
+    """
+    Indexes of the k highest scores, in descending order of score
+    :param scores: 1-d array of scores
+    :param k:
+    :return: array of at most k indexes
+    """
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def rank_claims(clf, X, indexes, k=50, num_claims_per_pass=None):
+    """
+    Score the (claim, sentence) pairs of many claims at once and keep the k best sentences of every claim.
+    The pairs of all claims are flattened, so clf.predict runs full batches instead of a few small batches per claim.
+    :param clf: retrieval model with predict([(claim, sentence), ...]) -> scores, e.g. ESIM, BiLSTM_RANKING or
+    Decomposable_Atten
+    :param X: list of the (claim, sentence) pairs of every claim
+    :param indexes: list of the (doc_id, sent_id) pairs of every claim, aligned with X
+    :param k: number of sentences to keep per claim
+    :param num_claims_per_pass: number of claims flattened per call of clf.predict, all claims by default
+    :return: list of the top k (doc_id, sent_id) pairs of every claim, list of their scores
+    """
+    if num_claims_per_pass is None:
+        num_claims_per_pass = max(len(X), 1)
+    predictions = []
+    all_scores = []
+    for start in range(0, len(X), num_claims_per_pass):
+        claims_input = X[start:start + num_claims_per_pass]
+        flat_input = [pair for line_input in claims_input for pair in line_input]
+        flat_scores = np.reshape(np.asarray(clf.predict(flat_input)), (-1,)) if flat_input else np.zeros(0)
+        offsets = np.cumsum([0] + [len(line_input) for line_input in claims_input])
+        for i in range(len(claims_input)):
+            scores = flat_scores[offsets[i]:offsets[i + 1]]
+            orders = top_k(scores, k)
+            sents_indexes = np.asarray(indexes[start + i])
+            predictions.append(sents_indexes[orders])
+            all_scores.append(scores[orders])
+    return predictions, all_scores
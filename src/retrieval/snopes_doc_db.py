@@ -1,27 +1,141 @@
+import argparse
 import json
+import mmap
+import os
+
+import numpy as np
+
+STORE_SUFFIX = '.store'
+_LINES_FILE = 'lines.bin'
+_OFFSETS_FILE = 'offsets.npy'
+_PAGES_FILE = 'pages.json'
+
+
+def default_store_path(db_path: str):
+    return os.path.splitext(db_path)[0] + STORE_SUFFIX
+
+
+def is_page_store(path: str):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, _PAGES_FILE))
+
+
+def build_snopes_page_store(db_path: str, store_path: str = None):
+    """
+    Compile snopes.page.json into a page store: all lines as one utf-8 blob, an offset index into the blob and a
+    small page index (page id -> first line, number of lines, remaining page fields).
+    :param db_path: /path/to/snopes.page.json
+    :param store_path: output directory. Defaults to snopes.page.store next to db_path
+    :return: the store path
+    """
+    if store_path is None:
+        store_path = default_store_path(db_path)
+    os.makedirs(store_path, exist_ok=True)
+    with open(db_path) as f:
+        db_dict = json.load(f)
+    pages = {}
+    offsets = [0]
+    with open(os.path.join(store_path, _LINES_FILE), 'wb') as f:
+        for page_id, page in db_dict.items():
+            lines = page.get('lines') or []
+            meta = {k: v for k, v in page.items() if k != 'lines'}
+            pages[page_id] = [len(offsets) - 1, len(lines), meta]
+            for line in lines:
+                encoded = line.encode('utf-8')
+                f.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+    np.save(os.path.join(store_path, _OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    # the page index is written last, so a store interrupted while building is never picked up
+    with open(os.path.join(store_path, _PAGES_FILE), 'w') as f:
+        json.dump(pages, f)
+    return store_path
 
 
 class SnopesDocDB(object):
+    """
+    Read-only access to the Snopes pages. The first time a snopes.page.json is opened it is compiled into a page
+    store (see build_snopes_page_store), afterwards lines are read from the memory-mapped store one at a time.
+    """
+
     def __init__(self, db_path: str):
         self.path = db_path
-        with open(self.path) as f:
-            self.db_dict = json.load(f)
+        if is_page_store(db_path):
+            store_path = db_path
+        else:
+            store_path = default_store_path(db_path)
+            if not is_page_store(store_path) or \
+                    os.path.getmtime(os.path.join(store_path, _PAGES_FILE)) < os.path.getmtime(db_path):
+                build_snopes_page_store(db_path, store_path)
+        self.store_path = store_path
+        with open(os.path.join(store_path, _PAGES_FILE)) as f:
+            self.pages = json.load(f)
+        self.offsets = np.load(os.path.join(store_path, _OFFSETS_FILE), mmap_mode='r')
+        with open(os.path.join(store_path, _LINES_FILE), 'rb') as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.blob = b''
+
+    def __contains__(self, doc_id):
+        return doc_id in self.pages
+
+    def __getitem__(self, doc_id):
+        """Page as in snopes.page.json. Prefer get_line / get_doc_meta, this decodes every line of the page."""
+        page = dict(self.pages[doc_id][2])
+        page['lines'] = self.get_lines(doc_id)
+        return page
 
     def path(self):
         return self.path
 
     def get_doc_ids(self):
-        results = list(self.db_dict.keys())
+        results = list(self.pages.keys())
         return results
 
+    def get_doc_meta(self, doc_id):
+        """Page fields other than 'lines', e.g. 'stance'."""
+        if doc_id not in self.pages:
+            return None
+        return self.pages[doc_id][2]
+
+    def num_lines(self, doc_id):
+        if doc_id not in self.pages:
+            return 0
+        return self.pages[doc_id][1]
+
+    def get_line(self, doc_id, line: int):
+        """Text of one line, None if the page or the line does not exist."""
+        if doc_id not in self.pages:
+            return None
+        first, count, _ = self.pages[doc_id]
+        if line < 0 or line >= count:
+            return None
+        idx = first + line
+        return self.blob[int(self.offsets[idx]):int(self.offsets[idx + 1])].decode('utf-8')
+
+    def get_lines(self, doc_id):
+        if doc_id not in self.pages:
+            return None
+        first, count, _ = self.pages[doc_id]
+        return [self.blob[int(start):int(end)].decode('utf-8') for start, end in
+                zip(self.offsets[first:first + count], self.offsets[first + 1:first + count + 1])]
+
     def get_doc_text(self, doc_id):
         return self.get_doc_lines(doc_id)
 
     def get_doc_lines(self, doc_id):
-        if doc_id not in self.db_dict:
+        lines = self.get_lines(doc_id)
+        if lines is None:
             return None
-        lines = [str(num) + '\t' + line for num, line in enumerate(self.db_dict[doc_id]['lines'])]
+        lines = [str(num) + '\t' + line for num, line in enumerate(lines)]
         return '\n'.join(lines)
 
     def get_non_empty_doc_ids(self):
-        return [result for result in self.get_doc_ids() if len(self.db_dict[result]['lines']) > 0]
+        return [doc_id for doc_id, (_, count, _) in self.pages.items() if count > 0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', help='/path/to/snopes.page.json', required=True)
+    parser.add_argument('--out', help='/path/to/output/store, defaults to snopes.page.store next to the db file')
+    args = parser.parse_args()
+    print(build_snopes_page_store(args.db, args.out))
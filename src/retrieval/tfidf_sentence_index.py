@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+
+import numpy as np
+from drqa import tokenizers
+from drqa.retriever import utils
+from scipy import sparse
+from tqdm import tqdm
+
+from retrieval.evidence_index import EvidenceIndex
+
+INDEX_SUFFIX = '.tfidf'
+_MATRIX_FILE = 'matrix.npz'
+_DOC_FREQS_FILE = 'doc_freqs.npz'
+_META_FILE = 'meta.json'
+
+
+def default_index_path(db_path: str):
+    return os.path.splitext(db_path)[0] + INDEX_SUFFIX
+
+
+def is_tfidf_index(path: str):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, _META_FILE))
+
+
+def _idfs(doc_freqs, num_sents):
+    idfs = np.log((num_sents - doc_freqs + 0.5) / (doc_freqs + 0.5))
+    idfs[idfs < 0] = 0
+    return idfs
+
+
+def hashed_ngrams(tokenizer, text, ngram, hash_size):
+    """
+    Hashed n-grams of a text, as in DrQA's TfidfDocRanker
+    """
+    tokens = tokenizer.tokenize(utils.normalize(text))
+    ngrams = tokens.ngrams(n=ngram, uncased=True, filter_fn=utils.filter_ngram)
+    return [utils.hash(gram, hash_size) for gram in ngrams]
+
+
+class TfidfSentenceIndex(object):
+    """
+    TF-IDF vectors of all sentences of a page db, with the same hashed n-gram features and weighting as the DrQA
+    rankers, but the document frequencies are counted over all sentences of the corpus. The vectors are stored as one
+    CSR matrix (sentences x hash_size), so the candidate sentences of many claims are scored by one sparse
+    multiplication instead of fitting a ranker per claim.
+    """
+
+    def __init__(self, matrix, doc_freqs, pages, ngram=2, hash_size=int(2 ** 24), tokenizer='simple'):
+        """
+        :param matrix: CSR matrix sentences x hash_size of the tf-idf vectors
+        :param doc_freqs: array hash_size of the number of sentences containing a hashed n-gram
+        :param pages: dict page -> [first row of the page in matrix, number of lines]
+        """
+        self.matrix = matrix
+        self.doc_freqs = doc_freqs
+        self.idfs = _idfs(doc_freqs, matrix.shape[0])
+        self.pages = pages
+        self.ngram = ngram
+        self.hash_size = hash_size
+        self.tokenizer_name = tokenizer
+        self.tokenizer = tokenizers.get_class(tokenizer)()
+
+    def texts2spmat(self, texts):
+        """
+        TF-IDF vectors of texts, e.g. claims
+        :return: CSR matrix len(texts) x hash_size
+        """
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            wids, counts = np.unique(np.asarray(hashed_ngrams(self.tokenizer, text, self.ngram, self.hash_size),
+                                                dtype=np.int64), return_counts=True)
+            indices.append(wids)
+            data.append(np.log1p(counts) * self.idfs[wids])
+            indptr.append(indptr[-1] + len(wids))
+        indices = np.concatenate(indices) if indices else np.zeros(0, np.int64)
+        data = np.concatenate(data) if data else np.zeros(0)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(texts), self.hash_size))
+
+    def text2spvec(self, text):
+        return self.texts2spmat([text])
+
+    def row(self, page, line):
+        """
+        Row of a sentence in the matrix, -1 if the page or the line does not exist
+        """
+        if page not in self.pages or line is None:
+            return -1
+        first, count = self.pages[page]
+        line = int(line)
+        if line < 0 or line >= count:
+            return -1
+        return first + line
+
+    def score(self, claims, candidates):
+        """
+        Score the candidate sentences of every claim
+        :param claims: list of claims
+        :param candidates: list of lists of (page, line) of the candidate sentences, aligned with claims
+        :return: list of arrays of scores, aligned with candidates. Sentences which are not in the index score 0
+        """
+        rows = []
+        claim_ids = []
+        for i, refs in enumerate(candidates):
+            rows.extend(self.row(ref[0], ref[1]) for ref in refs)
+            claim_ids.extend([i] * len(refs))
+        rows = np.asarray(rows, dtype=np.int64)
+        valid = rows >= 0
+        claims_mat = self.texts2spmat(claims)[np.asarray(claim_ids, dtype=np.int64)]
+        sents_mat = self.matrix[np.where(valid, rows, 0)]
+        scores = np.asarray(sents_mat.multiply(claims_mat).sum(axis=1)).ravel()
+        scores[~valid] = 0
+        return np.split(scores, np.cumsum([len(refs) for refs in candidates])[:-1])
+
+    def closest_sentences(self, claims, candidates, k=5):
+        """
+        Rank the candidate sentences of every claim like DrQA's closest_docs, sentences which share no n-gram with the
+        claim are left out
+        :return: list of the top k (page, line) arrays and list of their scores, aligned with claims
+        """
+        predictions = []
+        all_scores = []
+        for refs, scores in zip(candidates, self.score(claims, candidates)):
+            order = np.argsort(-scores, kind='stable')
+            order = order[scores[order] > 0][:k]
+            predictions.append(np.asarray(refs)[order])
+            all_scores.append(scores[order])
+        return predictions, all_scores
+
+    def save(self, index_path):
+        os.makedirs(index_path, exist_ok=True)
+        sparse.save_npz(os.path.join(index_path, _MATRIX_FILE), self.matrix)
+        sparse.save_npz(os.path.join(index_path, _DOC_FREQS_FILE), sparse.csr_matrix(self.doc_freqs))
+        # the meta data is written last, so an index interrupted while saving is never picked up
+        with open(os.path.join(index_path, _META_FILE), 'w') as f:
+            json.dump({'pages': self.pages, 'ngram': self.ngram, 'hash_size': self.hash_size,
+                       'tokenizer': self.tokenizer_name}, f)
+
+    @staticmethod
+    def load(index_path):
+        with open(os.path.join(index_path, _META_FILE)) as f:
+            meta = json.load(f)
+        matrix = sparse.load_npz(os.path.join(index_path, _MATRIX_FILE)).tocsr()
+        doc_freqs = sparse.load_npz(os.path.join(index_path, _DOC_FREQS_FILE)).toarray().ravel()
+        return TfidfSentenceIndex(matrix, doc_freqs, meta['pages'], meta['ngram'], meta['hash_size'],
+                                  meta['tokenizer'])
+
+
+def build_tfidf_sentence_index(db, ngram=2, hash_size=int(2 ** 24), tokenizer='simple'):
+    """
+    Build the tf-idf index of all sentences of a page db
+    :param db: SnopesDocDB, FeverDocDB or dict page -> list of lines (see EvidenceIndex)
+    :return: TfidfSentenceIndex
+    """
+    sent_tokenizer = tokenizers.get_class(tokenizer)()
+    lines_index = EvidenceIndex(db, cache_size=0)
+    page_ids = list(db.keys()) if isinstance(db, dict) else db.get_doc_ids()
+    pages = {}
+    indptr = [0]
+    indices = []
+    data = []
+    for page in tqdm(page_ids):
+        lines = lines_index.get_page_lines(page)
+        pages[page] = [len(indptr) - 1, len(lines)]
+        for line in lines:
+            wids, counts = np.unique(np.asarray(hashed_ngrams(sent_tokenizer, line, ngram, hash_size), dtype=np.int64),
+                                     return_counts=True)
+            indices.append(wids)
+            data.append(counts)
+            indptr.append(indptr[-1] + len(wids))
+    indices = np.concatenate(indices) if indices else np.zeros(0, np.int64)
+    data = np.concatenate(data) if data else np.zeros(0)
+    matrix = sparse.csr_matrix((np.log1p(data), indices, indptr), shape=(len(indptr) - 1, hash_size))
+    doc_freqs = np.bincount(matrix.indices, minlength=hash_size)
+    matrix.data *= _idfs(doc_freqs, matrix.shape[0])[matrix.indices]
+    return TfidfSentenceIndex(matrix, doc_freqs, pages, ngram, hash_size, tokenizer)
+
+
+def load_or_build_tfidf_sentence_index(db, db_path: str, index_path: str = None):
+    """
+    Load the tf-idf index of a page db, it is built and saved next to the db the first time or if the db is newer
+    :param db: the page db
+    :param db_path: /path/to/the/db
+    :param index_path: /path/to/index, defaults to the db path with the suffix .tfidf
+    """
+    if index_path is None:
+        index_path = default_index_path(db_path)
+    if is_tfidf_index(index_path) and \
+            os.path.getmtime(os.path.join(index_path, _META_FILE)) >= os.path.getmtime(db_path):
+        return TfidfSentenceIndex.load(index_path)
+    index = build_tfidf_sentence_index(db)
+    index.save(index_path)
+    return index
+
+
+if __name__ == '__main__':
+    from retrieval.snopes_doc_db import SnopesDocDB
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', help='/path/to/snopes.page.json', required=True)
+    parser.add_argument('--out', help='/path/to/output/index, defaults to snopes.page.tfidf next to the db file')
+    args = parser.parse_args()
+    load_or_build_tfidf_sentence_index(SnopesDocDB(args.db), args.db, args.out)
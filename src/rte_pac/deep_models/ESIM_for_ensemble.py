@@ -1,11 +1,12 @@
 from datetime import datetime
-from math import ceil
 
 import numpy as np
 import tensorflow as tf
 from sklearn.base import BaseEstimator, ClassifierMixin
 
 from common.util.log_helper import LogHelper
+from rte_pac.utils.batching import bucketed_batches, trim_batch, pad_sents, iterate_batches
+from rte_pac.utils.input_pipeline import input_placeholders, run_batches
 
 dim_fasttext = 300
 num_birnn = 2
@@ -20,7 +21,8 @@ class ESIM(BaseEstimator, ClassifierMixin):
                  pos_weight=None, optimizer='adam', learning_rate=0.001, batch_size=128,
                  activation='relu', initializer='he', num_epoch=100, dropout_rate=None,
                  max_check_without_progress=10, show_progress=1, tensorboard_logdir=None, random_state=None,
-                 vocab_size=None, n_outputs=3, max_gpu_memory=0.5):
+                 vocab_size=None, n_outputs=3, max_gpu_memory=0.5, bucket_batches=False, shuffle_buckets=True,
+                 input_pipeline=False, predict_batch_size=None):
 
         self.ckpt_path = ckpt_path
         self.trainable = trainable
@@ -42,6 +44,13 @@ class ESIM(BaseEstimator, ClassifierMixin):
         self.pos_weight = pos_weight
         self.name = name
         self.max_gpu_memory = max_gpu_memory
+        # batch size of validation and prediction, batch_size if None
+        self.predict_batch_size = predict_batch_size
+        # group the training samples by evidence length and trim every batch to its longest evidence
+        self.bucket_batches = bucket_batches
+        self.shuffle_buckets = shuffle_buckets
+        # gather the batches on a background tf.data pipeline instead of the main thread
+        self.input_pipeline = input_pipeline
         self.embedding = None
         self._graph = None
         self._classes = None
@@ -60,7 +69,8 @@ class ESIM(BaseEstimator, ClassifierMixin):
             self.name, self.ckpt_path, self.trainable, self.lstm_layers, self.num_neurons, self.pos_weight,
             self.optimizer, self.learning_rate, self.batch_size, self.activation, self.initializer, self.num_epoch,
             self.dropout_rate, self.max_check_without_progress, self.show_progress, self.tensorboard_logdir,
-            self.random_state, self.vocab_size, self.n_outputs, self.max_gpu_memory))
+            self.random_state, self.vocab_size, self.n_outputs, self.max_gpu_memory, self.bucket_batches,
+            self.shuffle_buckets, self.input_pipeline, self.predict_batch_size))
 
     def lstm_cell(self, hidden_size):
         lstm = tf.nn.rnn_cell.BasicLSTMCell(hidden_size)
@@ -349,18 +359,16 @@ class ESIM(BaseEstimator, ClassifierMixin):
         self.embed_size = len(self.embedding[0]) if self.embedding is not None else 0
         self.embedding_size = self.embed_size + dim_fasttext
 
-        X_heads = tf.placeholder(dtype=tf.int32, shape=[None, None, None], name="X_heads")
-        X_bodies = tf.placeholder(dtype=tf.int32, shape=[None, None, None], name="X_bodies")
-        X_heads_fasttext = tf.placeholder(dtype=tf.float32, shape=[None, None, None, dim_fasttext],
-                                          name="X_heads_fasttext")
-        X_bodies_fasttext = tf.placeholder(dtype=tf.float32, shape=[None, None, None, dim_fasttext],
-                                           name="X_bodies_fasttext")
-        X_head_sizes = tf.placeholder(dtype=tf.int32, shape=[None], name="head_sizes")
-        X_body_sizes = tf.placeholder(dtype=tf.int32, shape=[None], name="body_sizes")
-        X_head_sent_sizes = tf.placeholder(dtype=tf.int32, shape=[None, None], name="head_sent_sizes")
-        X_body_sent_sizes = tf.placeholder(dtype=tf.int32, shape=[None, None], name="body_sent_sizes")
-
-        y_ = tf.placeholder(tf.int32, shape=[None], name="y")
+        # in the order of the batch tuples of get_batch
+        input_specs = [("X_heads", tf.int32, [None, None, None]), ("X_bodies", tf.int32, [None, None, None]),
+                       ("head_sizes", tf.int32, [None]), ("body_sizes", tf.int32, [None]),
+                       ("head_sent_sizes", tf.int32, [None, None]), ("body_sent_sizes", tf.int32, [None, None]),
+                       ("X_heads_fasttext", tf.float32, [None, None, None, dim_fasttext]),
+                       ("X_bodies_fasttext", tf.float32, [None, None, None, dim_fasttext]),
+                       ("y", tf.int32, [None])]
+        self._inputs, self._input_pipeline = input_placeholders(input_specs, self.input_pipeline)
+        X_heads, X_bodies, X_head_sizes, X_body_sizes, X_head_sent_sizes, X_body_sent_sizes, X_heads_fasttext, \
+            X_bodies_fasttext, y_ = self._inputs
         y_one_hot = tf.one_hot(y_, self.n_outputs, on_value=1.0, off_value=0.0, axis=-1, dtype=tf.float32)
 
         if self.dropout_rate:
@@ -422,40 +430,25 @@ class ESIM(BaseEstimator, ClassifierMixin):
         self._init, self._saver = init, saver
 
     def get_batch(self, h_np, b_np, h_sizes, b_sizes, h_sent_sizes, b_sent_sizes, h_ft_np, b_ft_np, y=None):
+        """
+        Batches of predict_batch_size samples (batch_size by default), sliced lazily
+        :return: generator of batch tuples, with the labels last if y is given
+        """
+        return iterate_batches([h_np, b_np, h_sizes, b_sizes, h_sent_sizes, b_sent_sizes, h_ft_np, b_ft_np],
+                                self.predict_batch_size or self.batch_size, y)
 
-        num_batches = ceil(h_np.shape[0] / self.batch_size)
-        batches = []
-
-        for i in range(num_batches):
-            if (i + 1) * self.batch_size > h_np.shape[0]:
-                batch_h_np = h_np[i * self.batch_size:h_np.shape[0], :]
-                batch_b_np = b_np[i * self.batch_size:h_np.shape[0], :]
-                batch_h_ft_np = h_ft_np[i * self.batch_size:h_np.shape[0], :]
-                batch_b_ft_np = b_ft_np[i * self.batch_size:h_np.shape[0], :]
-                batch_h_sizes = h_sizes[i * self.batch_size:h_np.shape[0]]
-                batch_b_sizes = b_sizes[i * self.batch_size:h_np.shape[0]]
-                batch_h_sent_sizes = h_sent_sizes[i * self.batch_size:h_np.shape[0], :]
-                batch_b_sent_sizes = b_sent_sizes[i * self.batch_size:h_np.shape[0], :]
-                if y is not None:
-                    batch_y = y[i * self.batch_size:h_np.shape[0]]
-            else:
-                batch_h_np = h_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_np = b_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_h_ft_np = h_ft_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_ft_np = b_ft_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_h_sizes = h_sizes[i * self.batch_size:(i + 1) * self.batch_size]
-                batch_b_sizes = b_sizes[i * self.batch_size:(i + 1) * self.batch_size]
-                batch_h_sent_sizes = h_sent_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_sent_sizes = b_sent_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                if y is not None:
-                    batch_y = y[i * self.batch_size:(i + 1) * self.batch_size]
-            if y is not None:
-                batches.append((batch_h_np, batch_b_np, batch_h_sizes, batch_b_sizes, batch_h_sent_sizes,
-                                batch_b_sent_sizes, batch_h_ft_np, batch_b_ft_np, batch_y))
-            else:
-                batches.append((batch_h_np, batch_b_np, batch_h_sizes, batch_b_sizes, batch_h_sent_sizes,
-                                batch_b_sent_sizes, batch_h_ft_np, batch_b_ft_np))
-        return batches
+    def _trim_batch(self, batch):
+        """
+        Trim a batch tuple of get_batch to its longest claim and its longest evidence if bucket_batches is set
+        """
+        if not self.bucket_batches:
+            return batch
+        h_batch, b_batch, h_sizes_batch, b_sizes_batch, h_sent_sizes_batch, b_sent_sizes_batch, h_ft_batch, \
+            b_ft_batch = batch[:8]
+        b_sent_sizes_batch, (h_batch, h_ft_batch), (b_batch, b_ft_batch) = trim_batch(
+            h_sent_sizes_batch, b_sizes_batch, b_sent_sizes_batch, [h_batch, h_ft_batch], [b_batch, b_ft_batch])
+        return (h_batch, b_batch, h_sizes_batch, b_sizes_batch, h_sent_sizes_batch, b_sent_sizes_batch, h_ft_batch,
+                b_ft_batch) + tuple(batch[8:])
 
     def cal_f1_macro(self, confusion_matrix):
         """
@@ -516,25 +509,24 @@ class ESIM(BaseEstimator, ClassifierMixin):
             for epoch in range(self.num_epoch):
                 losses = []
                 accs = []
-                rnd_idx = np.random.permutation(num_instances)
-                for rnd_indices in np.array_split(rnd_idx, num_instances // self.batch_size):
-
-                    X_head_batch, X_body_batch, X_h_sizes_batch, X_b_sizes_batch, X_h_sent_sizes_batch, X_b_sent_sizes_batch, y_batch = \
-                        h_np[rnd_indices], b_np[rnd_indices], \
-                        h_sizes[rnd_indices], b_sizes[rnd_indices], \
-                        h_sent_sizes[rnd_indices], b_sent_sizes[rnd_indices], \
-                        y[rnd_indices]
-                    X_head_ft_batch, X_body_ft_batch = h_ft_np[rnd_indices], b_ft_np[rnd_indices]
-                    y_batch = np.asarray(y_batch)
-                    feed_dict = {self._X_head: X_head_batch, self._X_body: X_body_batch,
-                                 self._X_h_sizes: X_h_sizes_batch, self._X_b_sizes: X_b_sizes_batch,
-                                 self._X_h_sent_sizes: X_h_sent_sizes_batch, self._X_b_sent_sizes: X_b_sent_sizes_batch,
-                                 self._X_head_fasttext: X_head_ft_batch, self._X_body_fasttext: X_body_ft_batch,
-                                 self.y: y_batch}
-                    if self._training is not None:
-                        feed_dict[self._training] = True
-
-                    train_acc, _, loss = sess.run([self._accuracy, self._training_op, self._loss], feed_dict=feed_dict)
+                if self.bucket_batches:
+                    batch_indices = bucketed_batches(b_sizes, b_sent_sizes, self.batch_size, self.shuffle_buckets,
+                                                     num_batches=num_instances // self.batch_size)
+                else:
+                    rnd_idx = np.random.permutation(num_instances)
+                    batch_indices = np.array_split(rnd_idx, num_instances // self.batch_size)
+
+                def train_batches():
+                    for rnd_indices in batch_indices:
+                        yield self._trim_batch((h_np[rnd_indices], b_np[rnd_indices], h_sizes[rnd_indices],
+                                                b_sizes[rnd_indices], h_sent_sizes[rnd_indices],
+                                                b_sent_sizes[rnd_indices], h_ft_np[rnd_indices],
+                                                b_ft_np[rnd_indices], y[rnd_indices]))
+
+                training_feed_dict = {self._training: True} if self._training is not None else None
+                for train_acc, _, loss in run_batches(sess, [self._accuracy, self._training_op, self._loss],
+                                                      self._inputs, train_batches, self._input_pipeline,
+                                                      training_feed_dict):
                     losses.append(loss)
                     accs.append(train_acc)
                 average_loss = sum(losses) / len(losses)
@@ -555,26 +547,15 @@ class ESIM(BaseEstimator, ClassifierMixin):
                     batch_losses = []
                     batch_accuracies = []
                     valid_cm = np.zeros(shape=(self.n_outputs, self.n_outputs), dtype=np.int32)
-                    for (
-                            valid_h_batch, valid_b_batch, valid_h_sizes_batch, valid_b_sizes_batch,
-                            valid_h_sent_sizes_batch, valid_b_sent_sizes_batch, valid_h_ft_batch, valid_b_ft_batch,
-                            valid_y_batch) in batches:
-
-                        feed_dict_valid = {self._X_head: valid_h_batch, self._X_body: valid_b_batch,
-                                           self._X_h_sizes: valid_h_sizes_batch, self._X_b_sizes: valid_b_sizes_batch,
-                                           self._X_h_sent_sizes: valid_h_sent_sizes_batch,
-                                           self._X_b_sent_sizes: valid_b_sent_sizes_batch,
-                                           self._X_head_fasttext: valid_h_ft_batch,
-                                           self._X_body_fasttext: valid_b_ft_batch, self.y: valid_y_batch}
+                    if self.tensorboard_logdir:
+                        valid_fetches = [self._accuracy, self._loss, self._confusion_matrix, self._merged_summary]
+                    else:
+                        valid_fetches = [self._accuracy, self._loss, self._confusion_matrix]
+                    for results in run_batches(sess, valid_fetches, self._inputs,
+                                               lambda: map(self._trim_batch, batches), self._input_pipeline):
+                        val_acc_batch, val_loss_batch, cm = results[:3]
                         if self.tensorboard_logdir:
-                            val_acc_batch, val_loss_batch, cm, summary, attention_weights = sess.run(
-                                [self._accuracy, self._loss, self._confusion_matrix, self._merged_summary,
-                                 self._attention_weights], feed_dict=feed_dict_valid)
-                            self._file_writer.add_summary(summary, epoch)
-                        else:
-                            val_acc_batch, val_loss_batch, attention_weights, cm = sess.run(
-                                [self._accuracy, self._loss, self._attention_weights, self._confusion_matrix],
-                                feed_dict=feed_dict_valid)
+                            self._file_writer.add_summary(results[3], epoch)
 
                         batch_losses.append(val_loss_batch)
                         batch_accuracies.append(val_acc_batch)
@@ -628,24 +609,15 @@ class ESIM(BaseEstimator, ClassifierMixin):
         probabilities = []
         attention_weights = []
         with self._session.as_default() as sess:
-            for (pred_h_batch, pred_b_batch, pred_h_sizes_batch, pred_b_sizes_batch, pred_h_sent_sizes_batch,
-                 pred_b_sent_sizes_batch, pred_h_ft_batch, pred_b_ft_batch) in batches:
-                predictions_batch, attention_weights_batch = sess.run([self._probabilities, self._attention_weights],
-                                                                      feed_dict={
-                                                                          self._X_head: pred_h_batch,
-                                                                          self._X_body: pred_b_batch,
-                                                                          self._X_h_sizes: pred_h_sizes_batch,
-                                                                          self._X_b_sizes: pred_b_sizes_batch,
-                                                                          self._X_h_sent_sizes: pred_h_sent_sizes_batch,
-                                                                          self._X_b_sent_sizes: pred_b_sent_sizes_batch,
-                                                                          self._X_head_fasttext: pred_h_ft_batch,
-                                                                          self._X_body_fasttext: pred_b_ft_batch
-                                                                      })
+            for predictions_batch, attention_weights_batch in run_batches(
+                    sess, [self._probabilities, self._attention_weights], self._inputs,
+                    lambda: map(self._trim_batch, batches), self._input_pipeline):
                 for prediction in predictions_batch:
                     probabilities.append(prediction)
-                attention_weights.append(attention_weights_batch)
+                attention_weights_batch = np.reshape(attention_weights_batch, [len(predictions_batch), -1])
+                attention_weights.append(pad_sents(attention_weights_batch, b_np.shape[1]))
         np_probas = np.asarray(probabilities)
-        attention_weights = np.reshape(np.concatenate(attention_weights), [b_np.shape[0], b_np.shape[1]])
+        attention_weights = np.concatenate(attention_weights)
         # save predictions
         _prediction_save_file = self.ckpt_path + "_predictions.p"
         _weights_save_file = self.ckpt_path + "_weights.p"
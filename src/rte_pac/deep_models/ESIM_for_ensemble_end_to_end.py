@@ -8,6 +8,7 @@ from sklearn.base import BaseEstimator, ClassifierMixin
 from tqdm import tqdm
 
 from common.util.log_helper import LogHelper
+from rte_pac.utils.batching import iterate_batches
 
 num_birnn = 2
 
@@ -22,7 +23,7 @@ class ESIM(BaseEstimator, ClassifierMixin):
                  activation='relu', initializer='he', num_epoch=100, dropout_rate=None,
                  max_check_without_progress=10, show_progress=1, tensorboard_logdir=None, random_state=None,
                  vocab_size=None, n_outputs=3, shared_rnn=True, num_units=128, h_max_length=50, s_max_length=50,
-                 n_best_sents=5, max_gpu_memory=0.5):
+                 n_best_sents=5, max_gpu_memory=0.5, predict_batch_size=None):
 
         self.ckpt_path = ckpt_path
         self.trainable = trainable
@@ -49,6 +50,8 @@ class ESIM(BaseEstimator, ClassifierMixin):
         self.s_max_length = s_max_length
         self.n_best_sents = n_best_sents
         self.max_gpu_memory = max_gpu_memory
+        # batch size of validation and prediction, batch_size if None
+        self.predict_batch_size = predict_batch_size
         self.embedding = None
         self._graph = None
         self._classes = None
@@ -68,7 +71,7 @@ class ESIM(BaseEstimator, ClassifierMixin):
             self.optimizer, self.learning_rate, self.batch_size, self.activation, self.initializer, self.num_epoch,
             self.dropout_rate, self.max_check_without_progress, self.show_progress, self.tensorboard_logdir,
             self.random_state, self.vocab_size, self.n_outputs, self.shared_rnn, self.num_units, self.h_max_length,
-            self.s_max_length, self.n_best_sents, self.max_gpu_memory))
+            self.s_max_length, self.n_best_sents, self.max_gpu_memory, self.predict_batch_size))
 
     def lstm_cell(self, hidden_size):
         lstm = tf.nn.rnn_cell.BasicLSTMCell(hidden_size)
@@ -542,34 +545,12 @@ class ESIM(BaseEstimator, ClassifierMixin):
         return masked_scores, best_sent_indices, best_scores, best_s, best_s_length, embed_h, X_h_length, s_num_best_sents
 
     def get_batch(self, h_np, b_np, h_sizes, b_sizes, h_sent_sizes, b_sent_sizes, y=None):
-
-        num_batches = ceil(h_np.shape[0] / self.batch_size)
-
-        for i in range(num_batches):
-            if (i + 1) * self.batch_size > h_np.shape[0]:
-                batch_h_np = h_np[i * self.batch_size:h_np.shape[0], :]
-                batch_b_np = b_np[i * self.batch_size:h_np.shape[0], :]
-                batch_h_sizes = h_sizes[i * self.batch_size:h_np.shape[0]]
-                batch_b_sizes = b_sizes[i * self.batch_size:h_np.shape[0]]
-                batch_h_sent_sizes = h_sent_sizes[i * self.batch_size:h_np.shape[0], :]
-                batch_b_sent_sizes = b_sent_sizes[i * self.batch_size:h_np.shape[0], :]
-                if y is not None:
-                    batch_y = y[i * self.batch_size:h_np.shape[0]]
-            else:
-                batch_h_np = h_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_np = b_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_h_sizes = h_sizes[i * self.batch_size:(i + 1) * self.batch_size]
-                batch_b_sizes = b_sizes[i * self.batch_size:(i + 1) * self.batch_size]
-                batch_h_sent_sizes = h_sent_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_sent_sizes = b_sent_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                if y is not None:
-                    batch_y = y[i * self.batch_size:(i + 1) * self.batch_size]
-            if y is not None:
-                yield (batch_h_np, batch_b_np, batch_h_sizes, batch_b_sizes, batch_h_sent_sizes,
-                       batch_b_sent_sizes, batch_y)
-            else:
-                yield (batch_h_np, batch_b_np, batch_h_sizes, batch_b_sizes, batch_h_sent_sizes,
-                       batch_b_sent_sizes)
+        """
+        Batches of predict_batch_size samples (batch_size by default), sliced lazily
+        :return: generator of batch tuples, with the labels last if y is given
+        """
+        return iterate_batches([h_np, b_np, h_sizes, b_sizes, h_sent_sizes, b_sent_sizes],
+                                self.predict_batch_size or self.batch_size, y)
 
     def fit(self, X_dict, y):
         self.logger.debug("training...")
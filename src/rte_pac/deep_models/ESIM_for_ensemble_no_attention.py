@@ -1,11 +1,12 @@
 from datetime import datetime
-from math import ceil
 
 import numpy as np
 import tensorflow as tf
 from sklearn.base import BaseEstimator, ClassifierMixin
 
 from common.util.log_helper import LogHelper
+from rte_pac.utils.batching import iterate_batches
+from rte_pac.utils.batching import bucketed_batches, trim_batch
 
 dim_fasttext = 300
 num_birnn = 2
@@ -20,7 +21,8 @@ class ESIM(BaseEstimator, ClassifierMixin):
                  pos_weight=None, optimizer='adam', learning_rate=0.001, batch_size=128,
                  activation='relu', initializer='he', num_epoch=100, dropout_rate=None,
                  max_check_without_progress=10, show_progress=1, tensorboard_logdir=None, random_state=None,
-                 vocab_size=None, n_outputs=3, max_gpu_memory=0.5):
+                 vocab_size=None, n_outputs=3, max_gpu_memory=0.5, bucket_batches=False, shuffle_buckets=True,
+                 predict_batch_size=None):
 
         self.ckpt_path = ckpt_path
         self.trainable = trainable
@@ -42,6 +44,11 @@ class ESIM(BaseEstimator, ClassifierMixin):
         self.pos_weight = pos_weight
         self.name = name
         self.max_gpu_memory = max_gpu_memory
+        # group the training samples by evidence length and trim every batch to its longest evidence
+        self.bucket_batches = bucket_batches
+        self.shuffle_buckets = shuffle_buckets
+        # batch size of validation and prediction, batch_size if None
+        self.predict_batch_size = predict_batch_size
         self.embedding = None
         self._graph = None
         self._classes = None
@@ -60,7 +67,8 @@ class ESIM(BaseEstimator, ClassifierMixin):
             self.name, self.ckpt_path, self.trainable, self.lstm_layers, self.num_neurons, self.pos_weight,
             self.optimizer, self.learning_rate, self.batch_size, self.activation, self.initializer, self.num_epoch,
             self.dropout_rate, self.max_check_without_progress, self.show_progress, self.tensorboard_logdir,
-            self.random_state, self.vocab_size, self.n_outputs, self.max_gpu_memory))
+            self.random_state, self.vocab_size, self.n_outputs, self.max_gpu_memory, self.bucket_batches,
+            self.shuffle_buckets, self.predict_batch_size))
 
     def lstm_cell(self, hidden_size):
         lstm = tf.nn.rnn_cell.BasicLSTMCell(hidden_size)
@@ -414,37 +422,12 @@ class ESIM(BaseEstimator, ClassifierMixin):
         self._init, self._saver = init, saver
 
     def get_batch(self, h_np, b_np, h_sizes, b_sizes, h_sent_sizes, b_sent_sizes, h_ft_np, b_ft_np, y=None):
-
-        num_batches = ceil(h_np.shape[0] / self.batch_size)
-        for i in range(num_batches):
-            if (i + 1) * self.batch_size > h_np.shape[0]:
-                batch_h_np = h_np[i * self.batch_size:h_np.shape[0], :]
-                batch_b_np = b_np[i * self.batch_size:h_np.shape[0], :]
-                batch_h_ft_np = h_ft_np[i * self.batch_size:h_np.shape[0], :]
-                batch_b_ft_np = b_ft_np[i * self.batch_size:h_np.shape[0], :]
-                batch_h_sizes = h_sizes[i * self.batch_size:h_np.shape[0]]
-                batch_b_sizes = b_sizes[i * self.batch_size:h_np.shape[0]]
-                batch_h_sent_sizes = h_sent_sizes[i * self.batch_size:h_np.shape[0], :]
-                batch_b_sent_sizes = b_sent_sizes[i * self.batch_size:h_np.shape[0], :]
-                if y is not None:
-                    batch_y = y[i * self.batch_size:h_np.shape[0]]
-            else:
-                batch_h_np = h_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_np = b_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_h_ft_np = h_ft_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_ft_np = b_ft_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_h_sizes = h_sizes[i * self.batch_size:(i + 1) * self.batch_size]
-                batch_b_sizes = b_sizes[i * self.batch_size:(i + 1) * self.batch_size]
-                batch_h_sent_sizes = h_sent_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_sent_sizes = b_sent_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                if y is not None:
-                    batch_y = y[i * self.batch_size:(i + 1) * self.batch_size]
-            if y is not None:
-                yield (batch_h_np, batch_b_np, batch_h_sizes, batch_b_sizes, batch_h_sent_sizes,
-                       batch_b_sent_sizes, batch_h_ft_np, batch_b_ft_np, batch_y)
-            else:
-                yield (batch_h_np, batch_b_np, batch_h_sizes, batch_b_sizes, batch_h_sent_sizes,
-                       batch_b_sent_sizes, batch_h_ft_np, batch_b_ft_np)
+        """
+        Batches of predict_batch_size samples (batch_size by default), sliced lazily
+        :return: generator of batch tuples, with the labels last if y is given
+        """
+        return iterate_batches([h_np, b_np, h_sizes, b_sizes, h_sent_sizes, b_sent_sizes, h_ft_np, b_ft_np],
+                                self.predict_batch_size or self.batch_size, y)
 
     def cal_f1_macro(self, confusion_matrix):
         """
@@ -505,8 +488,13 @@ class ESIM(BaseEstimator, ClassifierMixin):
             for epoch in range(self.num_epoch):
                 losses = []
                 accs = []
-                rnd_idx = np.random.permutation(num_instances)
-                for rnd_indices in np.array_split(rnd_idx, num_instances // self.batch_size):
+                if self.bucket_batches:
+                    batch_indices = bucketed_batches(b_sizes, b_sent_sizes, self.batch_size, self.shuffle_buckets,
+                                                     num_batches=num_instances // self.batch_size)
+                else:
+                    rnd_idx = np.random.permutation(num_instances)
+                    batch_indices = np.array_split(rnd_idx, num_instances // self.batch_size)
+                for rnd_indices in batch_indices:
 
                     X_head_batch, X_body_batch, X_h_sizes_batch, X_b_sizes_batch, X_h_sent_sizes_batch, X_b_sent_sizes_batch, y_batch = \
                         h_np[rnd_indices], b_np[rnd_indices], \
@@ -514,6 +502,10 @@ class ESIM(BaseEstimator, ClassifierMixin):
                         h_sent_sizes[rnd_indices], b_sent_sizes[rnd_indices], \
                         y[rnd_indices]
                     X_head_ft_batch, X_body_ft_batch = h_ft_np[rnd_indices], b_ft_np[rnd_indices]
+                    if self.bucket_batches:
+                        X_b_sent_sizes_batch, (X_head_batch, X_head_ft_batch), (X_body_batch, X_body_ft_batch) = \
+                            trim_batch(X_h_sent_sizes_batch, X_b_sizes_batch, X_b_sent_sizes_batch,
+                                       [X_head_batch, X_head_ft_batch], [X_body_batch, X_body_ft_batch])
                     y_batch = np.asarray(y_batch)
                     feed_dict = {self._X_head: X_head_batch, self._X_body: X_body_batch,
                                  self._X_h_sizes: X_h_sizes_batch, self._X_b_sizes: X_b_sizes_batch,
@@ -547,6 +539,11 @@ class ESIM(BaseEstimator, ClassifierMixin):
                             valid_h_batch, valid_b_batch, valid_h_sizes_batch, valid_b_sizes_batch,
                             valid_h_sent_sizes_batch, valid_b_sent_sizes_batch, valid_h_ft_batch, valid_b_ft_batch,
                             valid_y_batch) in batches:
+                        if self.bucket_batches:
+                            valid_b_sent_sizes_batch, (valid_h_batch, valid_h_ft_batch), (
+                                valid_b_batch, valid_b_ft_batch) = trim_batch(
+                                valid_h_sent_sizes_batch, valid_b_sizes_batch, valid_b_sent_sizes_batch,
+                                [valid_h_batch, valid_h_ft_batch], [valid_b_batch, valid_b_ft_batch])
 
                         feed_dict_valid = {self._X_head: valid_h_batch, self._X_body: valid_b_batch,
                                            self._X_h_sizes: valid_h_sizes_batch, self._X_b_sizes: valid_b_sizes_batch,
@@ -614,6 +611,10 @@ class ESIM(BaseEstimator, ClassifierMixin):
         with self._session.as_default():
             for (pred_h_batch, pred_b_batch, pred_h_sizes_batch, pred_b_sizes_batch, pred_h_sent_sizes_batch,
                  pred_b_sent_sizes_batch, pred_h_ft_batch, pred_b_ft_batch) in batches:
+                if self.bucket_batches:
+                    pred_b_sent_sizes_batch, (pred_h_batch, pred_h_ft_batch), (pred_b_batch, pred_b_ft_batch) = \
+                        trim_batch(pred_h_sent_sizes_batch, pred_b_sizes_batch, pred_b_sent_sizes_batch,
+                                   [pred_h_batch, pred_h_ft_batch], [pred_b_batch, pred_b_ft_batch])
                 predictions_batch = self._probabilities.eval(
                     feed_dict={self._X_head: pred_h_batch, self._X_body: pred_b_batch,
                                self._X_h_sizes: pred_h_sizes_batch, self._X_b_sizes: pred_b_sizes_batch,
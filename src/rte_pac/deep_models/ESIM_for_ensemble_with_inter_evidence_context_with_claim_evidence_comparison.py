@@ -1,5 +1,4 @@
 from datetime import datetime
-from math import ceil
 
 import numpy as np
 import tensorflow as tf
@@ -7,6 +6,7 @@ from sklearn.base import BaseEstimator, ClassifierMixin
 from tqdm import tqdm
 
 from common.util.log_helper import LogHelper
+from rte_pac.utils.batching import iterate_batches
 
 
 class ESIM(BaseEstimator, ClassifierMixin):
@@ -18,7 +18,7 @@ class ESIM(BaseEstimator, ClassifierMixin):
                  pos_weight=None, optimizer='adam', learning_rate=0.001, batch_size=128,
                  activation='relu', initializer='he', num_epoch=100, dropout_rate=None,
                  max_check_without_progress=10, show_progress=10, tensorboard_logdir=None, random_state=None,
-                 vocab_size=None, n_outputs=3, device=None):
+                 vocab_size=None, n_outputs=3, device=None, predict_batch_size=None):
 
         self.ckpt_path = ckpt_path
         self.trainable = trainable
@@ -40,6 +40,8 @@ class ESIM(BaseEstimator, ClassifierMixin):
         self.pos_weight = pos_weight
         self.name = name
         self.device = device
+        # batch size of validation and prediction, batch_size if None
+        self.predict_batch_size = predict_batch_size
         self.embedding = None
         self._graph = None
         self._classes = None
@@ -58,7 +60,7 @@ class ESIM(BaseEstimator, ClassifierMixin):
             self.name, self.ckpt_path, self.trainable, self.lstm_layers, self.num_neurons, self.pos_weight,
             self.optimizer, self.learning_rate, self.batch_size, self.activation, self.initializer, self.num_epoch,
             self.dropout_rate, self.max_check_without_progress, self.show_progress, self.tensorboard_logdir,
-            self.random_state, self.vocab_size, self.n_outputs, self.device))
+            self.random_state, self.vocab_size, self.n_outputs, self.device, self.predict_batch_size))
 
     def lstm_cell(self, hidden_size):
         lstm = tf.nn.rnn_cell.BasicLSTMCell(hidden_size)
@@ -513,44 +515,13 @@ class ESIM(BaseEstimator, ClassifierMixin):
 
     def get_batch_attention(self, h_np, b_np, h_sizes, b_sizes, h_sent_sizes, b_sent_sizes, b_concat_indices,
                             b_concat_sizes, b_concat_indices_for_h, b_concat_sizes_for_h, y=None):
-
-        num_batches = ceil(h_np.shape[0] / self.batch_size)
-
-        for i in range(num_batches):
-            if (i + 1) * self.batch_size > h_np.shape[0]:
-                batch_h_np = h_np[i * self.batch_size:h_np.shape[0], :]
-                batch_b_np = b_np[i * self.batch_size:h_np.shape[0], :]
-                batch_h_sizes = h_sizes[i * self.batch_size:h_np.shape[0]]
-                batch_b_sizes = b_sizes[i * self.batch_size:h_np.shape[0]]
-                batch_h_sent_sizes = h_sent_sizes[i * self.batch_size:h_np.shape[0], :]
-                batch_b_sent_sizes = b_sent_sizes[i * self.batch_size:h_np.shape[0], :]
-                batch_b_concat_indices = b_concat_indices[i * self.batch_size:h_np.shape[0], :]
-                batch_b_concat_sizes = b_concat_sizes[i * self.batch_size:h_np.shape[0], :]
-                batch_b_concat_indices_for_h = b_concat_indices_for_h[i * self.batch_size:h_np.shape[0], :]
-                batch_b_concat_sizes_for_h = b_concat_sizes_for_h[i * self.batch_size:h_np.shape[0]]
-                if y is not None:
-                    batch_y = y[i * self.batch_size:h_np.shape[0]]
-            else:
-                batch_h_np = h_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_np = b_np[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_h_sizes = h_sizes[i * self.batch_size:(i + 1) * self.batch_size]
-                batch_b_sizes = b_sizes[i * self.batch_size:(i + 1) * self.batch_size]
-                batch_h_sent_sizes = h_sent_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_sent_sizes = b_sent_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_concat_indices = b_concat_indices[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_concat_sizes = b_concat_sizes[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_concat_indices_for_h = b_concat_indices_for_h[i * self.batch_size:(i + 1) * self.batch_size, :]
-                batch_b_concat_sizes_for_h = b_concat_sizes_for_h[i * self.batch_size:(i + 1) * self.batch_size]
-                if y is not None:
-                    batch_y = y[i * self.batch_size:(i + 1) * self.batch_size]
-            if y is not None:
-                yield (batch_h_np, batch_b_np, batch_h_sizes, batch_b_sizes, batch_h_sent_sizes,
-                       batch_b_sent_sizes, batch_b_concat_indices, batch_b_concat_sizes, batch_b_concat_indices_for_h,
-                       batch_b_concat_sizes_for_h, batch_y)
-            else:
-                yield (batch_h_np, batch_b_np, batch_h_sizes, batch_b_sizes, batch_h_sent_sizes,
-                       batch_b_sent_sizes, batch_b_concat_indices, batch_b_concat_sizes, batch_b_concat_indices_for_h,
-                       batch_b_concat_indices_for_h)
+        """
+        Batches of predict_batch_size samples (batch_size by default), sliced lazily
+        :return: generator of batch tuples, with the labels last if y is given
+        """
+        return iterate_batches([h_np, b_np, h_sizes, b_sizes, h_sent_sizes, b_sent_sizes, b_concat_indices,
+                                b_concat_sizes, b_concat_indices_for_h, b_concat_sizes_for_h],
+                                self.predict_batch_size or self.batch_size, y)
 
     def fit(self, X_dict, y):
         self.logger.debug("training...")
@@ -62,7 +62,12 @@ class USEAttention(BaseEstimator, ClassifierMixin):
                  activation='relu', initializer='he', num_epoch=100, batch_norm_momentum=None, dropout_rate=None,
                  n_outputs=3, max_check_without_progress=10, show_progress=1, tensorboard_logdir=None, ckpt_path=None,
                  random_state=None, l2_lambda=0, max_sentences=5, attention=cosine_similarity, pos_weight=None,
-                 max_gpu_memory=0.5):
+                 max_gpu_memory=0.5, precomputed_embeddings=False):
+        """
+        :param precomputed_embeddings: X['h'] and X['b'] are the USE embeddings of the claims [batch, 512] and of the
+        evidences [batch, max_sentences, 512] instead of strings, e.g. from rte_pac.utils.use_encoding, so the frozen
+        encoder is run once per sentence instead of in every batch of every epoch
+        """
 
         self.num_neurons = num_neurons
         self.optimizer = optimizer
@@ -84,6 +89,7 @@ class USEAttention(BaseEstimator, ClassifierMixin):
         self.pos_weight = pos_weight
         self.ckpt_path = ckpt_path
         self.max_gpu_memory = max_gpu_memory
+        self.precomputed_embeddings = precomputed_embeddings
         self._session = None
         self._activation = None
         self._initializer = None
@@ -97,7 +103,8 @@ class USEAttention(BaseEstimator, ClassifierMixin):
             self.num_neurons, self.optimizer, self.learning_rate, self.batch_size, self.activation, self.initializer,
             self.num_epoch, self.batch_norm_momentum, self.dropout_rate, self.n_outputs,
             self.max_checks_without_progress, self.show_progress, self.tensorboard_logdir, self.ckpt_path,
-            self.random_state, self.l2_lambda, self.max_sentences, self.attention, self.pos_weight, self.max_gpu_memory
+            self.random_state, self.l2_lambda, self.max_sentences, self.attention, self.pos_weight, self.max_gpu_memory,
+            self.precomputed_embeddings
         ))
 
     def _attention(self, claims, evidences, scope=None):
@@ -115,14 +122,17 @@ class USEAttention(BaseEstimator, ClassifierMixin):
             return weighted_evidence
 
     def _sent_network(self, h_inputs, b_inputs):
-        embed = hub.Module("https://tfhub.dev/google/universal-sentence-encoder/2", trainable=False)
-        # batch * embed
-        h_embeddings = embed(h_inputs)
-        batch_size, b_sent_num = tf.unstack(tf.shape(b_inputs))
-        flat_b_inputs = tf.reshape(b_inputs, [batch_size * self.max_sentences])
-        flat_b_embeddings = embed(flat_b_inputs)
-        # batch * sents * embed
-        b_embeddings = tf.reshape(flat_b_embeddings, [batch_size, self.max_sentences, dim_USE])
+        if self.precomputed_embeddings:
+            h_embeddings, b_embeddings = h_inputs, b_inputs
+        else:
+            embed = hub.Module("https://tfhub.dev/google/universal-sentence-encoder/2", trainable=False)
+            # batch * embed
+            h_embeddings = embed(h_inputs)
+            batch_size, b_sent_num = tf.unstack(tf.shape(b_inputs))
+            flat_b_inputs = tf.reshape(b_inputs, [batch_size * self.max_sentences])
+            flat_b_embeddings = embed(flat_b_inputs)
+            # batch * sents * embed
+            b_embeddings = tf.reshape(flat_b_embeddings, [batch_size, self.max_sentences, dim_USE])
         # batch * embed
         weighted_evidence = self._attention(h_embeddings, b_embeddings)
         outputs = tf.concat([h_embeddings, weighted_evidence, tf.abs(tf.subtract(
@@ -156,8 +166,12 @@ class USEAttention(BaseEstimator, ClassifierMixin):
             if self.optimizer == 'adam':
                 self._optimizer = tf.train.AdamOptimizer
 
-        X_heads = tf.placeholder(tf.string, shape=[None], name="X_heads")
-        X_bodies = tf.placeholder(tf.string, shape=[None, self.max_sentences], name="X_bodies")
+        if self.precomputed_embeddings:
+            X_heads = tf.placeholder(tf.float32, shape=[None, dim_USE], name="X_heads")
+            X_bodies = tf.placeholder(tf.float32, shape=[None, self.max_sentences, dim_USE], name="X_bodies")
+        else:
+            X_heads = tf.placeholder(tf.string, shape=[None], name="X_heads")
+            X_bodies = tf.placeholder(tf.string, shape=[None, self.max_sentences], name="X_bodies")
         y_ = tf.placeholder(tf.int32, shape=[None], name="y")
         y_one_hot = tf.one_hot(y_, self.n_outputs, on_value=1.0, off_value=0.0, axis=-1, dtype=tf.float32)
 
@@ -291,8 +305,8 @@ class USEAttention(BaseEstimator, ClassifierMixin):
         dataset = list(zip(h, b, y))
         random.shuffle(dataset)
         h, b, y = zip(*dataset)
-        h = np.asarray(h, dtype=np.str)
-        b = np.asarray(b, dtype=np.str)
+        h = np.asarray(h, dtype=np.float32 if self.precomputed_embeddings else np.str)
+        b = np.asarray(b, dtype=np.float32 if self.precomputed_embeddings else np.str)
         y = np.asarray(y)
 
         return h, b, y
@@ -1,5 +1,4 @@
 import argparse
-import json
 import os
 import pickle
 
@@ -41,18 +40,16 @@ def generate_submission(_predictions, test_set_path, submission_path):
     :param submission_path:
     :return:
     """
-    from common.dataset.reader import JSONLineReader
+    from common.dataset.reader import JSONLineReader, JSONLineWriter
     jlr = JSONLineReader()
-    json_lines = jlr.read(test_set_path)
+    json_lines = jlr.iterate(test_set_path, fields=['id', 'predicted_evidence'])
     os.makedirs(os.path.dirname(os.path.abspath(submission_path)), exist_ok=True)
-    with open(submission_path, 'w') as f:
+    with JSONLineWriter(submission_path, append=False) as writer:
         for _prediction, line in tqdm(zip(_predictions, json_lines)):
             for i, evidence in enumerate(line['predicted_evidence']):
                 line['predicted_evidence'][i][0] = normalize(evidence[0])
-            obj = {"id": line['id'], "predicted_evidence": line['predicted_evidence'],
-                   "predicted_label": prediction_2_label(_prediction)}
-            f.write(json.dumps(obj))
-            f.write('\n')
+            writer.write({"id": line['id'], "predicted_evidence": line['predicted_evidence'],
+                          "predicted_label": prediction_2_label(_prediction)})
 
 
 if __name__ == '__main__':
@@ -0,0 +1,92 @@
+from math import ceil
+
+import numpy as np
+
+
+def evidence_lengths(b_sizes, b_sent_sizes):
+    """
+    Number of padded evidence sentences and number of padded words a sample actually needs
+    :param b_sizes: numbers of evidence sentences, batch_size
+    :param b_sent_sizes: sentence sizes of the evidence sentences, batch_size * sents
+    :return: numbers of sentences, numbers of words of the longest sentence
+    """
+    b_sent_sizes = np.asarray(b_sent_sizes)
+    num_sents = np.minimum(np.asarray(b_sizes), b_sent_sizes.shape[1])
+    num_words = b_sent_sizes.max(axis=1) if b_sent_sizes.shape[1] > 0 else np.zeros(len(b_sent_sizes), np.int64)
+    return num_sents, num_words
+
+
+def bucketed_batches(b_sizes, b_sent_sizes, batch_size, shuffle=True, num_batches_per_bucket=50, num_batches=None):
+    """
+    Indexes of the training batches of one epoch, grouped by length of the evidences so that each batch can be trimmed
+    to its own longest evidence instead of max_sentences * max_sentence_size.
+    With shuffle, the samples are shuffled, cut into buckets of num_batches_per_bucket batches, sorted by length within
+    each bucket and the batches are shuffled, so every epoch sees different batches in a different order.
+    Without shuffle, the samples are sorted by length over the whole data set and the batches are returned in order.
+    :param b_sizes: numbers of evidence sentences, N
+    :param b_sent_sizes: sentence sizes of the evidence sentences, N * sents
+    :param batch_size:
+    :param shuffle: keep the epoch-level shuffling
+    :param num_batches_per_bucket: number of batches sorted together when shuffling
+    :param num_batches: number of batches, ceil(N / batch_size) by default
+    :return: list of arrays of indexes
+    """
+    num_sents, num_words = evidence_lengths(b_sizes, b_sent_sizes)
+    num_instances = len(num_sents)
+    if num_batches is None:
+        num_batches = ceil(num_instances / batch_size)
+    num_batches = max(min(num_batches, num_instances), 1)
+    if shuffle:
+        order = np.random.permutation(num_instances)
+        bucket_size = max(num_instances * num_batches_per_bucket // num_batches, 1)
+        buckets = [bucket[np.lexsort((num_words[bucket], num_sents[bucket]))]
+                   for bucket in np.array_split(order, max(ceil(num_instances / bucket_size), 1))]
+        order = np.concatenate(buckets)
+    else:
+        order = np.lexsort((np.arange(num_instances), num_words, num_sents))
+    batches = [np.sort(batch) for batch in np.array_split(order, num_batches)]
+    if shuffle:
+        batches = [batches[i] for i in np.random.permutation(len(batches))]
+    return batches
+
+
+def trim_batch(h_sent_sizes, b_sizes, b_sent_sizes, heads=(), bodies=()):
+    """
+    Trim the padding of a batch to its longest claim and its longest evidence
+    :param h_sent_sizes: sentence sizes of the claims, batch_size * 1
+    :param b_sizes: numbers of evidence sentences, batch_size
+    :param b_sent_sizes: sentence sizes of the evidence sentences, batch_size * sents
+    :param heads: claim arrays, batch_size * 1 * h_words * ...
+    :param bodies: evidence arrays, batch_size * sents * b_words * ...
+    :return: trimmed b_sent_sizes, list of trimmed heads, list of trimmed bodies
+    """
+    num_sents, num_words = evidence_lengths(b_sizes, b_sent_sizes)
+    # keep at least one sentence and one word, empty dimensions break the reshapes of the graph
+    max_sents = max(int(num_sents.max()), 1) if len(num_sents) else 1
+    max_b_words = max(int(num_words.max()), 1) if len(num_words) else 1
+    max_h_words = max(int(np.max(h_sent_sizes)), 1) if np.size(h_sent_sizes) else 1
+    trimmed_heads = [head[:, :, :max_h_words] for head in heads]
+    trimmed_bodies = [body[:, :max_sents, :max_b_words] for body in bodies]
+    return np.asarray(b_sent_sizes)[:, :max_sents], trimmed_heads, trimmed_bodies
+
+
+def pad_sents(array, num_sents):
+    """
+    Pad the trimmed sentence dimension of batch_size * sents arrays back to num_sents, e.g. attention weights
+    """
+    return np.pad(array, [(0, 0), (0, num_sents - array.shape[1])], mode='constant')
+
+
+def iterate_batches(arrays, batch_size, y=None):
+    """
+    Lazily slice aligned arrays into consecutive batches, so no batch is built before it is used
+    :param arrays: list of arrays with the samples along the first axis
+    :param batch_size:
+    :param y: labels, appended to every batch tuple if given
+    :return: generator of batch tuples
+    """
+    if y is not None:
+        arrays = list(arrays) + [y]
+    num_instances = len(arrays[0])
+    for start in range(0, num_instances, batch_size):
+        yield tuple(array[start:start + batch_size] for array in arrays)
@@ -0,0 +1,29 @@
+import threading
+from functools import lru_cache
+
+from rte_pac.utils.sentence_embedding import SentenceEncoder
+
+
+def bert_client_encode_fn(port: int = 5555, port_out: int = 5556):
+    """
+    Function list of sentences -> array of their embeddings, by the bert-as-service server on port/port_out
+    """
+    clients = threading.local()
+
+    def encode_fn(sents):
+        # a BertClient must not be shared between threads
+        if not hasattr(clients, 'bc'):
+            from bert_serving.client import BertClient
+            clients.bc = BertClient(port=port, port_out=port_out)
+        return clients.bc.encode(sents)
+
+    return encode_fn
+
+
+@lru_cache(maxsize=None)
+def get_bert_encoder(cache_folder: str = None, port: int = 5555, port_out: int = 5556):
+    """
+    SentenceEncoder of the bert-as-service server on port/port_out, shared by all calls with the same arguments. The
+    float16 embeddings are kept in the store under cache_folder.
+    """
+    return SentenceEncoder(bert_client_encode_fn(port, port_out), cache_folder=cache_folder)
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def _exclusive_cumsum(x):
+    return np.cumsum(x, axis=-1) - x
+
+
+def _scatter_to_ranks(ranks):
+    """
+    Invert a permutation along the last axis: order[..., ranks[..., p]] = p
+    :param ranks: int array [..., n], a permutation of range(n) along the last axis
+    :return: int32 array [..., n]
+    """
+    n = ranks.shape[-1]
+    rows = np.arange(int(np.prod(ranks.shape[:-1])), dtype=np.int64).reshape(ranks.shape[:-1] + (1,)) * n
+    order = np.empty(ranks.size, dtype=np.int32)
+    order[(rows + ranks).ravel()] = np.broadcast_to(np.arange(n, dtype=np.int32), ranks.shape).ravel()
+    return order.reshape(ranks.shape)
+
+
+def generate_concat_indices_for_inter_evidence(evidences_np, evidences_sizes_np, max_sent_size: int, max_sent_num: int):
+    """
+    Indices into the flattened words of the evidences (max_sent_num * max_sent_size) which concatenate, for every
+    evidence, all other evidences of the claim: their words first, then their padding, both in the order of the
+    evidences. The rank of every word is computed from the prefix sums of the sentence sizes with broadcasting.
+    :param evidences_np: array [batch, max_sent_num, max_sent_size, ...] of the evidences
+    :param evidences_sizes_np: array [batch, max_sent_num] of the sentence sizes
+    :return: int32 array [batch, max_sent_num, (max_sent_num - 1) * max_sent_size] of the indices and array
+    [batch, max_sent_num] of the sizes of the concatenations, 0 for empty evidences
+    """
+    batch_size = evidences_np.shape[0]
+    sizes = np.asarray(evidences_sizes_np)[:batch_size, :max_sent_num].astype(np.int64)
+    paddings = max_sent_size - sizes
+    num_tokens = sizes.sum(axis=1)
+    # batch * 1 * sents * 1, the evidences k
+    sizes_k = sizes[:, None, :, None]
+    token_starts_k = _exclusive_cumsum(sizes)[:, None, :, None]
+    padding_starts_k = _exclusive_cumsum(paddings)[:, None, :, None]
+    # batch * sents * 1 * 1, the evidence j the others are concatenated for, which is left out
+    sizes_j = sizes[:, :, None, None]
+    paddings_j = paddings[:, :, None, None]
+    num_tokens_j = num_tokens[:, None, None, None] - sizes_j
+    # 1 * sents * sents * 1, evidence j comes before evidence k
+    j_before_k = np.triu(np.ones((max_sent_num, max_sent_num), dtype=np.int64), 1)[None, :, :, None]
+    words = np.arange(max_sent_size, dtype=np.int64)[None, None, None, :]
+    token_ranks = token_starts_k - j_before_k * sizes_j + words
+    padding_ranks = num_tokens_j + padding_starts_k - j_before_k * paddings_j + words - sizes_k
+    concat_size = (max_sent_num - 1) * max_sent_size
+    # the words of evidence j go behind the concatenation, which is cut off
+    ranks = np.where(words < sizes_k, token_ranks, padding_ranks)
+    ranks = np.where(np.eye(max_sent_num, dtype=bool)[None, :, :, None], concat_size + words, ranks)
+    concat_indices = _scatter_to_ranks(ranks.reshape(batch_size, max_sent_num, max_sent_num * max_sent_size))
+    concat_sent_sizes = np.where(sizes == 0, 0, num_tokens[:, None] - sizes).astype(np.int_)
+    return concat_indices[:, :, :concat_size], concat_sent_sizes
+
+
+def generate_concat_indices_for_claim(evidences_np, evidences_sizes_np, max_sent_size: int, max_sent_num: int):
+    """
+    Indices into the flattened words of the evidences (max_sent_num * max_sent_size) which concatenate all evidences
+    of a claim: their words first, then their padding, both in the order of the evidences
+    :param evidences_np: array [batch, max_sent_num, max_sent_size, ...] of the evidences
+    :param evidences_sizes_np: array [batch, max_sent_num] of the sentence sizes
+    :return: int32 array [batch, max_sent_num * max_sent_size] of the indices and array [batch] of the sizes of the
+    concatenations
+    """
+    batch_size = evidences_np.shape[0]
+    sizes = np.asarray(evidences_sizes_np)[:batch_size, :max_sent_num].astype(np.int64)
+    num_tokens = sizes.sum(axis=1)
+    # batch * sents * 1
+    sizes_k = sizes[:, :, None]
+    words = np.arange(max_sent_size, dtype=np.int64)[None, None, :]
+    token_ranks = _exclusive_cumsum(sizes)[:, :, None] + words
+    padding_ranks = num_tokens[:, None, None] + _exclusive_cumsum(max_sent_size - sizes)[:, :, None] + words - sizes_k
+    ranks = np.where(words < sizes_k, token_ranks, padding_ranks)
+    concat_indices = _scatter_to_ranks(ranks.reshape(batch_size, max_sent_num * max_sent_size))
+    return concat_indices, num_tokens.astype(np.int_)
@@ -1,4 +1,7 @@
 import json
+import os
+import re
+from functools import lru_cache
 from typing import List, Union, Dict
 
 import numpy as np
@@ -7,8 +10,14 @@ from tqdm import tqdm
 
 from rte_pac.utils.text_processing import clean_text, loadGloVe, vocab_map, distinct_wordids, word_2_ids, tokenize, \
     load_whole_glove
+from rte_pac.utils.token_ids import encode_sentences, encode_documents, embed_sentences, embed_documents
+from rte_pac.utils.padding import pad_sentences, pad_documents, as_ragged_sentences, as_ragged_documents
+from rte_pac.utils.bert_encoding import get_bert_encoder
+from rte_pac.utils.concat_indices import generate_concat_indices_for_inter_evidence, generate_concat_indices_for_claim
+from common.dataset.reader import json_loads
 from common.util.log_helper import LogHelper
 from common.util.random import SimpleRandom
+from retrieval.snopes_doc_db import SnopesDocDB
 # from retrieval.fever_doc_db import FeverDocDB
 
 label_dict = ['SUPPORTS', 'REFUTES', 'NOT ENOUGH INFO']
@@ -25,15 +34,15 @@ def prediction_2_label(prediction):
     return label_dict[prediction]
 
 
-def evidence_num_to_text_snopes(db: Dict, page_id: str, line: int):
-    lines = db[page_id]['lines']
-    if lines is None or len(lines) <= line:
+def evidence_num_to_text_snopes(db: SnopesDocDB, page_id: str, line: int):
+    text = db.get_line(page_id, line)
+    if text is None:
         return ""
-    return lines[line]
+    return text
 
 
-def evidence_num_to_text(db: Dict, page_id: str, line: int, is_snopes: bool = False):
-    assert isinstance(db, Dict) or not is_snopes, "db should be dictionary for Snopes data"
+def evidence_num_to_text(db, page_id: str, line: int, is_snopes: bool = False):
+    assert isinstance(db, SnopesDocDB) or not is_snopes, "db should be SnopesDocDB for Snopes data"
 #     assert isinstance(db, FeverDocDB) or is_snopes, "db should be fever DB for fever data"
     logger = LogHelper.get_logger("evidence_num_to_text")
     if is_snopes:
@@ -52,24 +61,10 @@ def evidence_num_to_text(db: Dict, page_id: str, line: int, is_snopes: bool = Fa
 def single_sentence_set_2_ids(texts, vocab_dict, embed, unk_words=True, initialize_unk=False):
     assert embed is not None or not initialize_unk, "Self defined vocabulary cannot initialize unknown tokens."
     logger = LogHelper.get_logger("single_sentence_set_2_ids")
-    doc_ids = []
-    out_of_vocab_counts = 0
-    for sent in texts:
-        tokens = tokenize(sent)
-        word_ids = []
-        for token in tokens:
-            if token.lower() in vocab_dict:
-                word_ids.append(vocab_dict[token.lower()])
-            else:
-                out_of_vocab_counts += 1
-                if initialize_unk:
-                    vocab_dict[vocab_dict.lower()] = len(embed)
-                    word_ids.append(len(embed))
-                    random_embedding = np.random.uniform(-0.1, 0.1, 50)
-                    embed.append(random_embedding)
-                elif unk_words:
-                    word_ids.append(vocab_dict[_unknown_vocab])
-        doc_ids.append(word_ids)
+    doc_ids, new_embed, out_of_vocab_counts = encode_sentences(texts, vocab_dict, unk_words,
+                                                               embed=embed if initialize_unk else None)
+    if initialize_unk:
+        embed = new_embed
     logger.debug("{} times out of vocab".format(str(out_of_vocab_counts)))
     return doc_ids, embed
 
@@ -77,141 +72,41 @@ def single_sentence_set_2_ids(texts, vocab_dict, embed, unk_words=True, initiali
 def multi_sentence_set_2_ids(texts, vocab_dict, embed, unk_words=True, initialize_unk=False):
     assert embed is not None or not initialize_unk, "Self defined vocabulary cannot initialize unknown tokens."
     logger = LogHelper.get_logger("multi_sentence_set_2_ids")
-    doc_ids = []
-    out_of_vocab_counts = 0
-    for sents in texts:
-        sent_ids = []
-        for sent in sents:
-            tokens = tokenize(sent)
-            word_ids = []
-            for token in tokens:
-                if token.lower() in vocab_dict:
-                    word_ids.append(vocab_dict[token.lower()])
-                else:
-                    out_of_vocab_counts += 1
-                    if initialize_unk:
-                        vocab_dict[vocab_dict.lower()] = len(embed)
-                        word_ids.append(len(embed))
-                        random_embedding = np.random.uniform(-0.1, 0.1, 50)
-                        embed.append(random_embedding)
-                    elif unk_words:
-                        word_ids.append(vocab_dict[_unknown_vocab])
-            sent_ids.append(word_ids)
-        doc_ids.append(sent_ids)
+    doc_ids, new_embed, out_of_vocab_counts = encode_documents(texts, vocab_dict, unk_words,
+                                                               embed=embed if initialize_unk else None)
+    if initialize_unk:
+        embed = new_embed
     logger.debug("{} times out of vocab".format(str(out_of_vocab_counts)))
     return doc_ids, embed
 
 
 def single_sentence_set_2_ids_with_vocab_limit(texts, vocab_dict, vocab_limit):
     logger = LogHelper.get_logger("single_sentence_set_2_ids")
-    doc_ids = []
-    out_of_vocab_counts = 0
-    for sent in texts:
-        tokens = tokenize(sent)
-        word_ids = []
-        for token in tokens:
-            if token.lower() in vocab_dict:
-                word_ids.append(vocab_dict[token.lower()])
-            elif len(vocab_dict) < vocab_limit:
-                vocab_dict[token.lower()] = len(vocab_dict)
-            else:
-                out_of_vocab_counts += 1
-                word_ids.append(vocab_dict[_unknown_vocab])
-        doc_ids.append(word_ids)
+    doc_ids, _, out_of_vocab_counts = encode_sentences(texts, vocab_dict, vocab_limit=vocab_limit)
     logger.debug("{} times out of vocab".format(str(out_of_vocab_counts)))
     return doc_ids
 
 
 def multi_sentence_set_2_ids_with_vocab_limit(texts, vocab_dict, vocab_limit):
     logger = LogHelper.get_logger("multi_sentence_set_2_ids")
-    doc_ids = []
-    out_of_vocab_counts = 0
-    for sents in texts:
-        sent_ids = []
-        for sent in sents:
-            tokens = tokenize(sent)
-            word_ids = []
-            for token in tokens:
-                if token.lower() in vocab_dict:
-                    word_ids.append(vocab_dict[token.lower()])
-                elif len(vocab_dict) < vocab_limit:
-                    vocab_dict[token.lower()] = len(vocab_dict)
-                else:
-                    out_of_vocab_counts += 1
-                    word_ids.append(vocab_dict[_unknown_vocab])
-            sent_ids.append(word_ids)
-        doc_ids.append(sent_ids)
+    doc_ids, _, out_of_vocab_counts = encode_documents(texts, vocab_dict, vocab_limit=vocab_limit)
     logger.debug("{} times out of vocab".format(str(out_of_vocab_counts)))
     return doc_ids
 
 
 def ids_padding_for_multi_sentences_set(sents_list, bodies_size=None, bodies_sent_size=None):
-    b_sizes = np.asarray([len(sents) for sents in sents_list])
-    bodies_sent_sizes_ = [[len(sent) for sent in sents] for sents in sents_list]
-    if bodies_size is None:
-        bodies_size = max(b_sizes)
-    else:
-        b_sizes = np.asarray([size if size < bodies_size else bodies_size for size in b_sizes])
-    if bodies_sent_size is None:
-        bodies_sent_size = max(map(max, bodies_sent_sizes_))
-
-    def padded_text_ids(_list, sent_sizes_, num_doc, max_num_sent, max_num_words):
-        doc_np = np.zeros([num_doc, max_num_sent, max_num_words], dtype=np.int32)
-        doc_sent_sizes = np.zeros([num_doc, max_num_sent], dtype=np.int32)
-        for i, doc in enumerate(_list):
-            for j, sent in enumerate(doc):
-                if j >= max_num_sent:
-                    break
-                doc_sent_sizes[i, j] = sent_sizes_[i][j] if sent_sizes_[i][j] < max_num_words else max_num_words
-                for k, word in enumerate(sent):
-                    if k >= max_num_words:
-                        break
-                    doc_np[i, j, k] = word
-        return doc_np, doc_sent_sizes
-
-    b_np, b_sent_sizes = padded_text_ids(sents_list, bodies_sent_sizes_, len(sents_list), bodies_size,
-                                         bodies_sent_size)
+    b_np, b_sizes, b_sent_sizes = pad_documents(sents_list, bodies_size, bodies_sent_size, dtype=np.int32)
+    if bodies_size is not None:
+        b_sizes = np.minimum(b_sizes, bodies_size)
     return b_np, b_sizes, b_sent_sizes
 
 
 def ids_padding_for_single_sentence_set(sent_list):
-    sent_sizes_ = np.asarray([len(sent) for sent in sent_list])
-    max_sent_size = sent_sizes_.max()
-
-    def padded_text_ids(_list, sent_sizes_, num_doc, max_num_words):
-        doc_np = np.zeros([num_doc, max_num_words], dtype=np.int32)
-        doc_sent_sizes = np.zeros([num_doc], dtype=np.int32)
-        for i, doc in enumerate(_list):
-            doc_sent_sizes[i] = sent_sizes_[i]
-            for k, word in enumerate(doc):
-                doc_np[i, k] = word
-        return doc_np, doc_sent_sizes
-
-    b_np, b_sent_sizes = padded_text_ids(
-        sent_list, sent_sizes_, len(sent_list), max_sent_size)
-    return b_np, b_sent_sizes
+    return pad_sentences(sent_list, dtype=np.int32)
 
 
 def ids_padding_for_single_sentence_set_given_size(sent_list, max_sent_size=None):
-    sent_sizes_ = np.asarray([len(sent) for sent in sent_list])
-    if max_sent_size is None:
-        max_sent_size = sent_sizes_.max()
-
-    def padded_text_ids(_list, sent_sizes_, num_doc, max_num_words):
-        doc_np = np.zeros([num_doc, max_num_words], dtype=np.int32)
-        doc_sent_sizes = np.zeros([num_doc], dtype=np.int32)
-        for i, doc in enumerate(_list):
-            doc_sent_sizes[i] = sent_sizes_[i] if sent_sizes_[
-                                                      i] < max_num_words else max_num_words
-            for k, word in enumerate(doc):
-                if k >= max_num_words:
-                    break
-                doc_np[i, k] = word
-        return doc_np, doc_sent_sizes
-
-    b_np, b_sent_sizes = padded_text_ids(
-        sent_list, sent_sizes_, len(sent_list), max_sent_size)
-    return b_np, b_sent_sizes
+    return pad_sentences(sent_list, max_sent_size, dtype=np.int32)
 
 
 def read_data_set_from_jsonl(file_path: str, db: str, predicted: bool = True, num_sentences=None,
@@ -220,9 +115,8 @@ def read_data_set_from_jsonl(file_path: str, db: str, predicted: bool = True, nu
     if not is_snopes:
         if type(db) is str:
             db = FeverDocDB(db)
-    else:
-        with open(db) as f:
-            db = json.load(f)
+    elif type(db) is str:
+        db = SnopesDocDB(db)
 
     with open(file_path, 'r') as f:
         claims = []
@@ -231,7 +125,7 @@ def read_data_set_from_jsonl(file_path: str, db: str, predicted: bool = True, nu
         labels = []
         ids = []
         for line in tqdm(f):
-            json_obj = json.loads(line)
+            json_obj = json_loads(line)
             if predicted:
                 evidences_texts = []
                 if 'predicted_evidence' in json_obj:
@@ -317,7 +211,7 @@ def read_data_set_from_jsonl_with_evidence_labels(file_path: str, db: str, predi
         claims_for_evaluation = []
         evidences_for_evaluation = []
         for line in tqdm(f):
-            json_obj = json.loads(line)
+            json_obj = json_loads(line)
             if predicted:
                 evidences_texts = []
                 if 'predicted_evidence' in json_obj:
@@ -369,38 +263,14 @@ def read_data_set_from_jsonl_with_evidence_labels(file_path: str, db: str, predi
 
 def single_sentence_set_2_ids_given_vocab(texts, vocab_dict):
     logger = LogHelper.get_logger("single_sentence_set_2_ids_given_vocab")
-    doc_ids = []
-    out_of_vocab_counts = 0
-    for sent in texts:
-        tokens = tokenize(sent)
-        word_ids = []
-        for token in tokens:
-            if token.lower() in vocab_dict:
-                word_ids.append(vocab_dict[token.lower()])
-            else:
-                out_of_vocab_counts += 1
-                word_ids.append(vocab_dict[_unknown_vocab])
-        doc_ids.append(word_ids)
+    doc_ids, _, out_of_vocab_counts = encode_sentences(texts, vocab_dict)
     logger.debug("{} times out of vocab".format(str(out_of_vocab_counts)))
     return doc_ids
 
 
 def multi_sentence_set_2_ids_given_vocab(texts, vocab_dict):
     logger = LogHelper.get_logger("multi_sentence_set_2_ids_given_vocab")
-    doc_ids = []
-    out_of_vocab_counts = 0
-    for sents in texts:
-        sent_ids = []
-        for sent in sents:
-            tokens = tokenize(sent)
-            word_ids = []
-            for token in tokens:
-                if token.lower() in vocab_dict:
-                    word_ids.append(vocab_dict[token.lower()])
-                else:
-                    word_ids.append(vocab_dict[_unknown_vocab])
-            sent_ids.append(word_ids)
-        doc_ids.append(sent_ids)
+    doc_ids, _, out_of_vocab_counts = encode_documents(texts, vocab_dict)
     logger.debug("{} times out of vocab".format(str(out_of_vocab_counts)))
     return doc_ids
 
@@ -537,20 +407,21 @@ def embed_data_sets_with_glove_concat(data_set_paths: List[str], db: str, glove_
     return dataset_list, vocab, embeddings
 
 
+def _fasttext_embedding_fn(fasttext_model: FastText):
+    def _embedding(token):
+        try:
+            return fasttext_model[token]
+        except KeyError:
+            return np.ones([dim_fasttext], np.float32)
+
+    return _embedding
+
+
 def single_sentence_set_2_fasttext_embedded(sents: List[str], fasttext_model: Union[str, FastText]):
     logger = LogHelper.get_logger("single_sentence_set_2_fasttext_embedded")
     if type(fasttext_model) == str:
         fasttext_model = FastText.load_fasttext_format(fasttext_model)
-    fasttext_embeddings = []
-    for sent in sents:
-        tokens = tokenize(sent)
-        sent_embeddings = []
-        for token in tokens:
-            try:
-                sent_embeddings.append(fasttext_model[token.lower()])
-            except KeyError:
-                sent_embeddings.append(np.ones([dim_fasttext], np.float32))
-        fasttext_embeddings.append(sent_embeddings)
+    fasttext_embeddings = embed_sentences(sents, _fasttext_embedding_fn(fasttext_model))
     return fasttext_embeddings, fasttext_model
 
 
@@ -558,63 +429,19 @@ def multi_sentence_set_2_fasttext_embedded(texts: List[List[str]], fasttext_mode
     logger = LogHelper.get_logger("multi_sentence_set_2_fasttext_embedded")
     if type(fasttext_model) == str:
         fasttext_model = FastText.load_fasttext_format(fasttext_model)
-    fasttext_embeddings = []
-    for sents in texts:
-        text_embeddings = []
-        for sent in sents:
-            tokens = tokenize(sent)
-            sent_embeddings = []
-            for token in tokens:
-                try:
-                    sent_embeddings.append(fasttext_model[token.lower()])
-                except KeyError:
-                    sent_embeddings.append(np.ones([dim_fasttext], np.float32))
-            text_embeddings.append(sent_embeddings)
-        fasttext_embeddings.append(text_embeddings)
+    fasttext_embeddings = embed_documents(texts, _fasttext_embedding_fn(fasttext_model))
     return fasttext_embeddings, fasttext_model
 
 
 def fasttext_padding_for_single_sentence_set_given_size(fasttext_embeddings, max_sent_size=None):
     logger = LogHelper.get_logger("fasttext_padding_for_single_sentence_set_given_size")
-    sent_sizes_ = np.asarray([len(sent) for sent in fasttext_embeddings])
-    if max_sent_size is None:
-        max_sent_size = sent_sizes_.max()
-
-    def padded_text_ids(_list, num_doc, max_num_words):
-        doc_np = np.zeros([num_doc, max_num_words, dim_fasttext], dtype=np.float32)
-        for i, doc in enumerate(_list):
-            for k, word in enumerate(doc):
-                if k >= max_num_words:
-                    break
-                doc_np[i, k] = word
-        return doc_np
-
-    ft_np = padded_text_ids(fasttext_embeddings, len(fasttext_embeddings), max_sent_size)
+    ft_np, _ = pad_sentences(fasttext_embeddings, max_sent_size, dtype=np.float32)
     return ft_np
 
 
 def fasttext_padding_for_multi_sentences_set(fasttext_embeddings, max_bodies_size=None, max_bodies_sent_size=None):
     logger = LogHelper.get_logger("fasttext_padding_for_multi_sentences_set")
-    b_sizes = np.asarray([len(sents) for sents in fasttext_embeddings])
-    bodies_sent_sizes_ = [[len(sent) for sent in sents] for sents in fasttext_embeddings]
-    if max_bodies_size is None:
-        max_bodies_size = max(b_sizes)
-    if max_bodies_sent_size is None:
-        max_bodies_sent_size = max(map(max, bodies_sent_sizes_))
-
-    def padded_text_ids(_list, num_doc, max_num_sent, max_num_words):
-        doc_np = np.zeros([num_doc, max_num_sent, max_num_words, dim_fasttext], dtype=np.float32)
-        for i, doc in enumerate(_list):
-            for j, sent in enumerate(doc):
-                if j >= max_num_sent:
-                    break
-                for k, word in enumerate(sent):
-                    if k >= max_num_words:
-                        break
-                    doc_np[i, j, k] = word
-        return doc_np
-
-    ft_np = padded_text_ids(fasttext_embeddings, len(fasttext_embeddings), max_bodies_size, max_bodies_sent_size)
+    ft_np, _, _ = pad_documents(fasttext_embeddings, max_bodies_size, max_bodies_sent_size, dtype=np.float32)
     return ft_np
 
 
@@ -681,7 +508,7 @@ def read_data_set_from_jsonl_claim_only(data_set_path):
         labels = []
         ids = []
         for line in tqdm(f):
-            json_obj = json.loads(line)
+            json_obj = json_loads(line)
             claims.append(clean_text(json_obj['claim']))
             if 'label' in json_obj:
                 labels.append(label_dict.index(json_obj['label']))
@@ -865,53 +692,13 @@ def multi_sentence_set_2_tokens(texts):
 
 
 def tokens_padding_for_single_sentence_set_given_size(sent_list, max_sent_size=None):
-    sent_sizes_ = np.asarray([len(sent) for sent in sent_list])
-    if max_sent_size is None:
-        max_sent_size = sent_sizes_.max()
-
-    def padded_text_ids(_list, sent_sizes_, num_doc, max_num_words):
-        # doc_tokens = np.array([num_doc, max_num_words], dtype=np.str)
-        doc_tokens = [[""] * max_num_words] * num_doc
-        doc_tokens = np.array(doc_tokens)
-        doc_sent_sizes = np.zeros([num_doc], dtype=np.int32)
-        for i, doc in enumerate(_list):
-            doc_sent_sizes[i] = sent_sizes_[i] if sent_sizes_[
-                                                      i] < max_num_words else max_num_words
-            for k, word in enumerate(doc):
-                if k >= max_num_words:
-                    break
-                doc_tokens[i, k] = word
-        return doc_tokens, doc_sent_sizes
-
-    tokens, sent_sizes = padded_text_ids(sent_list, sent_sizes_, len(sent_list), max_sent_size)
+    tokens, sent_sizes = pad_sentences(as_ragged_sentences(sent_list, dtype=np.str_), max_sent_size)
     return tokens, sent_sizes
 
 
 def tokens_padding_for_multi_sentences_set(sents_list, max_sent_num=None, max_sent_size=None):
-    sent_counts = np.asarray([len(sents) for sents in sents_list])
-    _sent_sizes = [[len(sent) for sent in sents] for sents in sents_list]
-    if max_sent_num is None:
-        max_sent_num = max(sent_counts)
-    if max_sent_size is None:
-        max_sent_size = max(map(max, _sent_sizes))
-
-    def padded_text_ids(_list, sent_sizes_, num_doc, max_num_sent, max_num_words):
-        # doc_tokens = np.zeros([num_doc, max_num_sent, max_num_words], dtype=np.int32)
-        doc_tokens = [[[""] * max_num_words] * max_num_sent] * num_doc
-        doc_tokens = np.array(doc_tokens)
-        doc_sent_sizes = np.zeros([num_doc, max_num_sent], dtype=np.int32)
-        for i, doc in enumerate(_list):
-            for j, sent in enumerate(doc):
-                if j >= max_num_sent:
-                    break
-                doc_sent_sizes[i, j] = sent_sizes_[i][j] if sent_sizes_[i][j] < max_num_words else max_num_words
-                for k, word in enumerate(sent):
-                    if k >= max_num_words:
-                        break
-                    doc_tokens[i, j, k] = word
-        return doc_tokens, doc_sent_sizes
-
-    tokens, sent_sizes = padded_text_ids(sents_list, _sent_sizes, len(sents_list), max_sent_num, max_sent_size)
+    tokens, sent_counts, sent_sizes = pad_documents(as_ragged_documents(sents_list, dtype=np.str_), max_sent_num,
+                                                    max_sent_size)
     return tokens, sent_counts, sent_sizes
 
 
@@ -946,9 +733,8 @@ def load_scores(data_set_path: str, max_sent_num: int = 5):
     logger = LogHelper.get_logger("load_scores")
     from common.dataset.reader import JSONLineReader
     jlr = JSONLineReader()
-    lines = jlr.read(data_set_path)
     scores = []
-    for obj in lines:
+    for obj in jlr.iterate(data_set_path, fields=['scores']):
         _scores = obj['scores']
         if max_sent_num > len(_scores):
             for _ in range(max_sent_num - len(_scores)):
@@ -960,27 +746,22 @@ def load_scores(data_set_path: str, max_sent_num: int = 5):
     return np.asarray(scores)
 
 
-def encode_single_sentence_set_with_bert(sents, port: int = 5555, port_out: int = 5556):
-    from bert_serving.client import BertClient
-    bc = BertClient(port=port, port_out=port_out)
-    return np.asarray(bc.encode(sents), np.float32)
-
-
-def encode_multi_sentence_set_with_bert(sents_list, sents_num=None, port: int = 5555, port_out: int = 5556):
-    from bert_serving.client import BertClient
-    bc = BertClient(port=port, port_out=port_out)
-    encoded_sents_list = [bc.encode(sents) for sents in sents_list]
-    if sents_num is not None:
-        padding_sent = np.zeros([1, dim_bert], np.float32)
-        for i, encoded_sents in enumerate(encoded_sents_list):
-            encoded_sents = encoded_sents[:sents_num]
-            if len(encoded_sents) < sents_num:
-                for _ in range(sents_num - len(encoded_sents)):
-                    encoded_sents = np.concatenate((encoded_sents, padding_sent))
-            encoded_sents_list[i] = encoded_sents
-        return np.asarray(encoded_sents_list, np.float32)
-    else:
-        return encoded_sents_list
+def _bert_cache_folder(cache_folder, name):
+    return os.path.join(cache_folder, name) if cache_folder is not None else None
+
+
+def encode_single_sentence_set_with_bert(sents, port: int = 5555, port_out: int = 5556, cache_folder: str = None):
+    """
+    BERT sentence embeddings, see SentenceEncoder
+    :param cache_folder: folder of the embeddings of the BERT server, None to keep them in memory only
+    """
+    return get_bert_encoder(_bert_cache_folder(cache_folder, 'sent'), port, port_out).encode(sents)
+
+
+def encode_multi_sentence_set_with_bert(sents_list, sents_num=None, port: int = 5555, port_out: int = 5556,
+                                        cache_folder: str = None):
+    return get_bert_encoder(_bert_cache_folder(cache_folder, 'sent'), port, port_out).encode_sets(sents_list,
+                                                                                                 sents_num)
 
 
 def _is_padding_of_bert(embedding):
@@ -1045,13 +826,16 @@ def embed_data_set_with_bert(data_set_path: str,
                              threshold_b_sent_size=50,
                              is_snopes=True,
                              port: int = 5555,
-                             port_out: int = 5556):
+                             port_out: int = 5556,
+                             cache_folder: str = None):
     logger = LogHelper.get_logger("embed_data_set_with_bert")
     datas, labels = read_data_set_from_jsonl(data_set_path, db, predicted, is_snopes=is_snopes,
                                              num_sentences=threshold_b_sent_num)
-    heads_embeddings = single_sentence_set_2_bert_word_embedding(datas['h'], port=port, port_out=port_out)
+    heads_embeddings = single_sentence_set_2_bert_word_embedding(datas['h'], port=port, port_out=port_out,
+                                                                 cache_folder=cache_folder)
     bodies_embeddings = multi_sentence_set_2_bert_word_embedding(datas['b'], threshold_b_sent_size,
-                                                                 threshold_b_sent_num, port=port, port_out=port_out)
+                                                                 threshold_b_sent_num, port=port, port_out=port_out,
+                                                                 cache_folder=cache_folder)
     logger.debug("heads_embeddings.type: " + str(type(heads_embeddings)) + " shape: " + str(heads_embeddings.shape))
     logger.debug("bodies_embeddings.type: " + str(type(bodies_embeddings)) + " shape: " + str(bodies_embeddings.shape))
     h_sent_sizes = get_sent_sizes_for_single_sent_set_with_bert(heads_embeddings)
@@ -1069,37 +853,28 @@ def embed_data_set_with_bert(data_set_path: str,
     return processed_data_set
 
 
-def single_sentence_set_2_bert_word_embedding(sents, port: int = 5555, port_out: int = 5556):
-    from bert_serving.client import BertClient
-    bc = BertClient(port=port, port_out=port_out)
-    return bc.encode(sents)
+def single_sentence_set_2_bert_word_embedding(sents, port: int = 5555, port_out: int = 5556, cache_folder: str = None):
+    return get_bert_encoder(_bert_cache_folder(cache_folder, 'word'), port, port_out).encode(sents)
 
 
 def multi_sentence_set_2_bert_word_embedding(sents_list, max_seq_len=50, max_sent_num=None, port: int = 5555,
-                                             port_out: int = 5556):
-    from bert_serving.client import BertClient
-    bc = BertClient(port=port, port_out=port_out)
-    encoded_sents_list = [bc.encode(sents) for sents in sents_list]
-    if max_sent_num is not None:
-        padding = np.zeros([1, max_seq_len, dim_bert], np.float32)
-        for i, encoded_sents in tqdm(enumerate(encoded_sents_list)):
-            if len(encoded_sents) < max_sent_num:
-                for _ in range(max_sent_num - len(encoded_sents)):
-                    encoded_sents = np.concatenate((encoded_sents, padding))
-                encoded_sents_list[i] = encoded_sents
-        return np.asarray(encoded_sents_list)
-    else:
-        return encoded_sents_list
+                                             port_out: int = 5556, cache_folder: str = None):
+    """
+    BERT word embeddings [n_sets, max_sent_num, max_seq_len, dim_bert] of sets of sentences, the word embeddings of
+    the server (pooling_strategy NONE) already have max_seq_len words
+    """
+    return get_bert_encoder(_bert_cache_folder(cache_folder, 'word'), port, port_out).encode_sets(sents_list,
+                                                                                                 max_sent_num)
 
 
-def get_stance_of_snopes_page(db: Dict, page: str):
-    return db[page]['stance']
+def get_stance_of_snopes_page(db: SnopesDocDB, page: str):
+    return db.get_doc_meta(page)['stance']
 
 
 def read_data_set_from_jsonl_with_url(data_set_path: str, db: str, url_dict_path: str, num_sentences=None):
     logger = LogHelper.get_logger("read_data_set_from_jsonl_with_url")
-    with open(db) as f:
-        db = json.load(f)
+    if type(db) is str:
+        db = SnopesDocDB(db)
 
     with open(url_dict_path) as f:
         url_dict = json.load(f)
@@ -1113,7 +888,7 @@ def read_data_set_from_jsonl_with_url(data_set_path: str, db: str, url_dict_path
         ids = []
         stances = []
         for line in tqdm(f):
-            json_obj = json.loads(line)
+            json_obj = json_loads(line)
             evidences_texts = []
             evidences_credibilities = []
             evidences_stances = []
@@ -1481,12 +1256,11 @@ def load_feature_by_data_set(data_set_path: str, feature_path: str, max_sent_num
     with open(os.path.join(feature_path, 'data_idx_map.p'), 'rb') as f:
         data_idx_map = pickle.load(f)
     jlr = JSONLineReader()
-    lines = jlr.read(data_set_path)
     feature_dim = features.shape[1]
     padding = np.zeros([feature_dim], np.float32)
     claim_features = []
     evidence_features = []
-    for line in lines:
+    for line in jlr.iterate(data_set_path, fields=['id', 'predicted_evidence']):
         _id = line['id']
         key = _concat_sent(CLAIM, _id)
         claim_features.append(features[data_idx_map[key]])
@@ -1504,102 +1278,71 @@ def load_feature_by_data_set(data_set_path: str, feature_path: str, max_sent_num
     return np.asarray(claim_features, np.float32), np.asarray(evidence_features, np.float32)
 
 
+_NUMERIC_TOKEN = re.compile(r'[+-]?((\d+(\.\d*)?)|(\.\d+))')
+_DIGIT = re.compile(r'\d')
+
+
 def is_token_numeric(token):
-    import re
-    return re.fullmatch(r'[+-]?((\d+(\.\d*)?)|(\.\d+))', token)
+    return _NUMERIC_TOKEN.fullmatch(token)
 
 
-def _interprete_num_result(has_num, has_identical_num, has_different_num):
-    if not has_num:
-        return [0, 0, 0]
-    result = [1, 0, 0]
-    if has_identical_num:
-        result[1] = 1
-    if has_different_num:
-        result[2] = 1
-    return result
+@lru_cache(maxsize=2 ** 20)
+def sentence_numbers(text: str):
+    """
+    Numbers of a sentence, the numeric tokens as floats. Sentences without any digit are not tokenized, and the
+    numbers of every distinct sentence are kept, so a sentence shared by many claims or data sets is scanned once.
+    :return: frozenset of floats
+    """
+    if not text or _DIGIT.search(text) is None:
+        return frozenset()
+    return frozenset(float(token) for token in tokenize(text) if is_token_numeric(token))
 
 
-def number_feature(data_set_path: str, db: str, max_sent_num: int, is_snopes=False):
+def number_features(data_set_paths: List[str], db, max_sent_num: int, is_snopes=False):
+    """
+    Numeric overlap features of several data sets, e.g. train, dev and test, with the db opened once. For every
+    predicted evidence: [has a number, has a number of the claim, has a number not in the claim]
+    :param data_set_paths: list of /path/to/data_set.jsonl
+    :param db: page db or /path/to/db
+    :return: list of int32 arrays [num_claims, max_sent_num, 3], aligned with data_set_paths
+    """
     from common.dataset.reader import JSONLineReader
     if not is_snopes:
         if type(db) is str:
+            from retrieval.fever_doc_db import FeverDocDB
             db = FeverDocDB(db)
-    else:
-        with open(db) as f:
-            db = json.load(f)
+    elif type(db) is str:
+        db = SnopesDocDB(db)
     jlr = JSONLineReader()
-    lines = jlr.read(data_set_path)
-    num_feat = np.zeros([len(lines), max_sent_num, 3], dtype=np.int32)
-    for i, line in enumerate(lines):
-        claim_text = line['claim']
-        claim_tokens = tokenize(claim_text)
-        all_nums = set()
-        for token in claim_tokens:
-            if is_token_numeric(token):
-                all_nums.add(float(token))
-        for j, evidence in enumerate(line['predicted_evidence']):
-            if j >= max_sent_num:
-                break
-            page, line_num = evidence[-2], evidence[-1]
-            all_evidence_nums = []
-            evidence_text = evidence_num_to_text(db, page, line_num, is_snopes=is_snopes)
-            evidence_tokens = tokenize(evidence_text)
-            for token in evidence_tokens:
-                if is_token_numeric(token):
-                    all_evidence_nums.append(float(token))
-            has_num = len(all_evidence_nums) > 0
-            has_identical_num = any(n in all_nums for n in all_evidence_nums)
-            has_different_num = any(n not in all_nums for n in all_evidence_nums)
-            num_feat[i][j][0], num_feat[i][j][1], num_feat[i][j][2] = _interprete_num_result(has_num,
-                                                                                             has_identical_num,
-                                                                                             has_different_num)
-    return num_feat
-
-
-def generate_concat_indices_for_inter_evidence(evidences_np, evidences_sizes_np, max_sent_size: int, max_sent_num: int):
-    batch_size = evidences_np.shape[0]
-    concat_indices = []
-    concat_sent_sizes = []
-    for i in range(batch_size):
-        concat_indices_per_claim = []
-        concat_sent_sizes_per_claim = []
-        for j in range(max_sent_num):
-            token_indices_per_sent = np.array([], dtype=np.int32)
-            padding_indices_per_sent = np.array([], dtype=np.int32)
-            for k in range(max_sent_num):
-                if j == k:
-                    continue
-                start = max_sent_size * k
-                token_indices = np.arange(start, start + evidences_sizes_np[i][k], dtype=np.int32)
-                padding_indices = np.arange(start + evidences_sizes_np[i][k], start + max_sent_size, dtype=np.int32)
-                token_indices_per_sent = np.concatenate((token_indices_per_sent, token_indices))
-                padding_indices_per_sent = np.concatenate((padding_indices_per_sent, padding_indices))
-            concat_indices_per_sent = np.concatenate((token_indices_per_sent, padding_indices_per_sent))
-            concat_indices_per_claim.append(concat_indices_per_sent)
-            concat_sent_size = 0 if evidences_sizes_np[i][j] == 0 else token_indices_per_sent.shape[0]
-            concat_sent_sizes_per_claim.append(concat_sent_size)
-        concat_indices.append(concat_indices_per_claim)
-        concat_sent_sizes.append(concat_sent_sizes_per_claim)
-    return np.asarray(concat_indices), np.asarray(concat_sent_sizes)
-
-
-def generate_concat_indices_for_claim(evidences_np, evidences_sizes_np, max_sent_size: int, max_sent_num: int):
-    batch_size = evidences_np.shape[0]
-    concat_indices = []
-    concat_sent_sizes = []
-    for i in range(batch_size):
-        concat_indices_per_claim = []
-        token_indices_per_claim = np.array([], dtype=np.int32)
-        padding_indices_per_claim = np.array([], dtype=np.int32)
-        for k in range(max_sent_num):
-            start = max_sent_size * k
-            token_indices = np.arange(start, start + evidences_sizes_np[i][k], dtype=np.int32)
-            padding_indices = np.arange(start + evidences_sizes_np[i][k], start + max_sent_size, dtype=np.int32)
-            token_indices_per_claim = np.concatenate((token_indices_per_claim, token_indices))
-            padding_indices_per_claim = np.concatenate((padding_indices_per_claim, padding_indices))
-            concat_indices_per_claim = np.concatenate((token_indices_per_claim, padding_indices_per_claim))
-        concat_sent_sizes_per_claim = token_indices_per_claim.shape[0]
-        concat_indices.append(concat_indices_per_claim)
-        concat_sent_sizes.append(concat_sent_sizes_per_claim)
-    return np.asarray(concat_indices), np.asarray(concat_sent_sizes)
+    evidence_nums = {}
+    all_feats = []
+    for data_set_path in data_set_paths:
+        claim_nums = []
+        # claim index, evidence index and numbers of every kept evidence
+        claim_ids, evidence_ids, nums = [], [], []
+        for line in jlr.iterate(data_set_path, fields=['claim', 'predicted_evidence']):
+            claim_nums.append(sentence_numbers(line['claim']))
+            for j, evidence in enumerate(line['predicted_evidence'][:max_sent_num]):
+                page, line_num = evidence[-2], evidence[-1]
+                key = (page, line_num)
+                if key not in evidence_nums or line_num <= -1:
+                    # a line of -1 is a random line of the page, so it is looked up every time
+                    evidence_nums[key] = sentence_numbers(evidence_num_to_text(db, page, line_num,
+                                                                               is_snopes=is_snopes))
+                claim_ids.append(len(claim_nums) - 1)
+                evidence_ids.append(j)
+                nums.append(evidence_nums[key])
+        has_num = np.fromiter((len(n) > 0 for n in nums), dtype=bool, count=len(nums))
+        has_identical_num = np.fromiter((not n.isdisjoint(claim_nums[i]) for i, n in zip(claim_ids, nums)),
+                                        dtype=bool, count=len(nums))
+        has_different_num = np.fromiter((not n.issubset(claim_nums[i]) for i, n in zip(claim_ids, nums)),
+                                        dtype=bool, count=len(nums))
+        feats = np.zeros([len(claim_nums), max_sent_num, 3], dtype=np.int32)
+        feats[np.asarray(claim_ids, np.int64), np.asarray(evidence_ids, np.int64)] = np.stack(
+            [has_num, has_identical_num, has_different_num], axis=1)
+        all_feats.append(feats)
+    return all_feats
+
+
+def number_feature(data_set_path: str, db: str, max_sent_num: int, is_snopes=False):
+    return number_features([data_set_path], db, max_sent_num, is_snopes)[0]
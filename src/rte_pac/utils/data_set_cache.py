@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from common.util.log_helper import LogHelper
+
+_FINGERPRINTS_FILE = 'fingerprints.json'
+_META_FILE = 'meta.json'
+# version of the code producing the cached data sets, part of every key. Increase it whenever the output of
+# embed_data_set in scripts/rte.py changes, e.g. through the padding, encoding or feature helpers it calls, so data sets
+# cached by an older version are not reused
+DATA_SET_CACHE_VERSION = 1
+
+
+def file_fingerprint(file_path: str, cache_folder: str = None):
+    """
+    SHA-1 of the content of a file or of all files of a folder. If cache_folder is given, the hashes are memoized there and only recomputed when
+    the size or the modification time of the file changes, so large files like the GloVe vectors are not re-read on
+    every run.
+    :param file_path: /path/to/file
+    :param cache_folder: /path/to/cache
+    :return: hex digest
+    """
+    abs_path = os.path.abspath(file_path)
+    if os.path.isdir(abs_path):
+        # e.g. a compiled Snopes page store
+        sha1 = hashlib.sha1()
+        for name in sorted(os.listdir(abs_path)):
+            sha1.update(name.encode('utf-8'))
+            sha1.update(file_fingerprint(os.path.join(abs_path, name), cache_folder).encode('utf-8'))
+        return sha1.hexdigest()
+    stat = os.stat(abs_path)
+    fingerprints = {}
+    fingerprints_path = None
+    if cache_folder is not None:
+        fingerprints_path = os.path.join(cache_folder, _FINGERPRINTS_FILE)
+        if os.path.exists(fingerprints_path):
+            with open(fingerprints_path) as f:
+                fingerprints = json.load(f)
+        if abs_path in fingerprints:
+            size, mtime, digest = fingerprints[abs_path]
+            if size == stat.st_size and mtime == stat.st_mtime:
+                return digest
+    sha1 = hashlib.sha1()
+    with open(abs_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 24), b''):
+            sha1.update(chunk)
+    digest = sha1.hexdigest()
+    if fingerprints_path is not None:
+        fingerprints[abs_path] = [stat.st_size, stat.st_mtime, digest]
+        with open(fingerprints_path + '.tmp', 'w') as f:
+            json.dump(fingerprints, f)
+        os.replace(fingerprints_path + '.tmp', fingerprints_path)
+    return digest
+
+
+def data_set_cache_key(params: dict):
+    """
+    Key of a processed data set, i.e. the SHA-1 of its parameters (input fingerprints, thresholds, flags) and of
+    DATA_SET_CACHE_VERSION
+    """
+    versioned_params = {'params': params, 'version': DATA_SET_CACHE_VERSION}
+    return hashlib.sha1(json.dumps(versioned_params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def save_data_set(cache_folder: str, key: str, data_set: dict, params: dict = None):
+    """
+    Save a processed data set, i.e. {'data': {name: array}, 'id': [...], 'label': [...]}, with one .npy file per
+    array of data_set['data']
+    :param cache_folder: /path/to/cache
+    :param key: key of the data set, see data_set_cache_key
+    :param data_set: processed data set
+    :param params: parameters of the data set, saved for reference
+    :return: the folder of the data set
+    """
+    folder = os.path.join(cache_folder, key)
+    os.makedirs(folder, exist_ok=True)
+    for name, array in data_set['data'].items():
+        np.save(os.path.join(folder, name + '.npy'), np.asarray(array))
+    meta = {k: v for k, v in data_set.items() if k != 'data'}
+    meta['arrays'] = list(data_set['data'].keys())
+    meta['params'] = params
+    # the meta file is written last, so an interrupted save is never picked up
+    with open(os.path.join(folder, _META_FILE), 'w') as f:
+        json.dump(meta, f, default=lambda o: o.tolist())
+    return folder
+
+
+def load_data_set(cache_folder: str, key: str, mmap_mode='r'):
+    """
+    Load a processed data set saved by save_data_set
+    :param cache_folder: /path/to/cache
+    :param key: key of the data set
+    :param mmap_mode: mmap_mode of np.load, memory-mapped read-only by default
+    :return: the processed data set or None if it is not in the cache
+    """
+    folder = os.path.join(cache_folder, key)
+    meta_path = os.path.join(folder, _META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    data = {name: np.load(os.path.join(folder, name + '.npy'), mmap_mode=mmap_mode) for name in meta.pop('arrays')}
+    meta.pop('params', None)
+    meta['data'] = data
+    return meta
+
+
+def cached_data_set(cache_folder: str, params: dict, build_fn):
+    """
+    Get a processed data set from the cache, or build it with build_fn and save it in the cache.
+    :param cache_folder: /path/to/cache. If None, the data set is always built
+    :param params: everything the data set depends on, see data_set_cache_key
+    :param build_fn: function without arguments returning the processed data set
+    :return: the processed data set
+    """
+    logger = LogHelper.get_logger("cached_data_set")
+    if cache_folder is None:
+        return build_fn()
+    os.makedirs(cache_folder, exist_ok=True)
+    key = data_set_cache_key(params)
+    data_set = load_data_set(cache_folder, key)
+    if data_set is not None:
+        logger.info("Loaded processed data set {} from the cache".format(key))
+        return data_set
+    data_set = build_fn()
+    save_data_set(cache_folder, key, data_set, params)
+    logger.info("Saved processed data set {} into the cache".format(key))
+    return data_set
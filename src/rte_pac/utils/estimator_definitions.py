@@ -17,6 +17,9 @@ def get_estimator(scorer_type, save_folder=None):
                    optimizer=Config.esim_hyper_param['optimizer'],
                    trainable=Config.esim_hyper_param['trainable'],
                    batch_size=Config.esim_hyper_param['batch_size'],
+                   bucket_batches=Config.esim_hyper_param.get('bucket_batches', False),
+                   predict_batch_size=Config.esim_hyper_param.get('predict_batch_size'),
+                   input_pipeline=Config.esim_hyper_param.get('input_pipeline', False),
                    dropout_rate=Config.esim_hyper_param['dropout'],
                    num_neurons=Config.esim_hyper_param['num_neurons'], pos_weight=pos_weight,
                    ckpt_path=path.join(save_folder, Config.name + '.ckpt'), name=Config.name,
@@ -34,6 +37,8 @@ def get_estimator(scorer_type, save_folder=None):
                    optimizer=Config.esim_hyper_param['optimizer'],
                    trainable=Config.esim_hyper_param['trainable'],
                    batch_size=Config.esim_hyper_param['batch_size'],
+                   bucket_batches=Config.esim_hyper_param.get('bucket_batches', False),
+                   predict_batch_size=Config.esim_hyper_param.get('predict_batch_size'),
                    dropout_rate=Config.esim_hyper_param['dropout'],
                    num_neurons=Config.esim_hyper_param['num_neurons'], pos_weight=pos_weight,
                    tensorboard_logdir=Config.tensorboard_folder,
@@ -52,6 +57,8 @@ def get_estimator(scorer_type, save_folder=None):
                    optimizer=Config.esim_hyper_param['optimizer'],
                    trainable=Config.esim_hyper_param['trainable'],
                    batch_size=Config.esim_hyper_param['batch_size'],
+                   bucket_batches=Config.esim_hyper_param.get('bucket_batches', False),
+                   predict_batch_size=Config.esim_hyper_param.get('predict_batch_size'),
                    dropout_rate=Config.esim_hyper_param['dropout'],
                    num_neurons=Config.esim_hyper_param['num_neurons'], pos_weight=pos_weight,
                    tensorboard_logdir=Config.tensorboard_folder,
@@ -70,6 +77,8 @@ def get_estimator(scorer_type, save_folder=None):
                    optimizer=Config.esim_hyper_param['optimizer'],
                    trainable=Config.esim_hyper_param['trainable'],
                    batch_size=Config.esim_hyper_param['batch_size'],
+                   bucket_batches=Config.esim_hyper_param.get('bucket_batches', False),
+                   predict_batch_size=Config.esim_hyper_param.get('predict_batch_size'),
                    dropout_rate=Config.esim_hyper_param['dropout'],
                    num_neurons=Config.esim_hyper_param['num_neurons'], pos_weight=pos_weight,
                    tensorboard_logdir=Config.tensorboard_folder,
@@ -88,6 +97,8 @@ def get_estimator(scorer_type, save_folder=None):
                    optimizer=Config.esim_hyper_param['optimizer'],
                    trainable=Config.esim_hyper_param['trainable'],
                    batch_size=Config.esim_hyper_param['batch_size'],
+                   bucket_batches=Config.esim_hyper_param.get('bucket_batches', False),
+                   predict_batch_size=Config.esim_hyper_param.get('predict_batch_size'),
                    dropout_rate=Config.esim_hyper_param['dropout'],
                    num_neurons=Config.esim_hyper_param['num_neurons'], pos_weight=pos_weight,
                    tensorboard_logdir=Config.tensorboard_folder,
@@ -106,6 +117,8 @@ def get_estimator(scorer_type, save_folder=None):
                    optimizer=Config.esim_hyper_param['optimizer'],
                    trainable=Config.esim_hyper_param['trainable'],
                    batch_size=Config.esim_hyper_param['batch_size'],
+                   bucket_batches=Config.esim_hyper_param.get('bucket_batches', False),
+                   predict_batch_size=Config.esim_hyper_param.get('predict_batch_size'),
                    dropout_rate=Config.esim_hyper_param['dropout'],
                    num_neurons=Config.esim_hyper_param['num_neurons'], pos_weight=pos_weight,
                    tensorboard_logdir=Config.tensorboard_folder,
@@ -124,6 +137,8 @@ def get_estimator(scorer_type, save_folder=None):
                    optimizer=Config.esim_hyper_param['optimizer'],
                    trainable=Config.esim_hyper_param['trainable'],
                    batch_size=Config.esim_hyper_param['batch_size'],
+                   bucket_batches=Config.esim_hyper_param.get('bucket_batches', False),
+                   predict_batch_size=Config.esim_hyper_param.get('predict_batch_size'),
                    dropout_rate=Config.esim_hyper_param['dropout'],
                    num_neurons=Config.esim_hyper_param['num_neurons'], pos_weight=pos_weight,
                    tensorboard_logdir=Config.tensorboard_folder,
@@ -618,7 +633,8 @@ def get_estimator(scorer_type, save_folder=None):
                            tensorboard_logdir=Config.tensorboard_folder,
                            pos_weight=pos_weight,
                            ckpt_path=path.join(save_folder, Config.name + '.ckpt'),
-                           max_gpu_memory=Config.max_gpu_memory)
+                           max_gpu_memory=Config.max_gpu_memory,
+                           precomputed_embeddings=Config.use_hyper_parameter.get('precomputed_embeddings', False))
     if scorer_type == 'use_attention' and Config.use_hyper_parameter['do_finetune']:
         from os import path
         from rte_pac.deep_models.USE_Attention_finetune import USEAttention, ATTENTION_FUNCTIONS
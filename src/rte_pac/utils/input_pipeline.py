@@ -0,0 +1,86 @@
+import numpy as np
+import tensorflow as tf
+
+
+class InputPipeline(object):
+    """
+    Input pipeline of the estimators built on tf.data. Batches are gathered by a Python generator which tf.data runs
+    ahead on a background thread and buffers, so gathering a batch overlaps with sess.run on the previous one.
+    The inputs of the graph are placeholders defaulting to the next batch of the pipeline, so they can still be fed
+    through feed_dict as before.
+    """
+
+    def __init__(self, specs, buffer_size=2):
+        """
+        :param specs: list of (name, dtype, shape) of the inputs, in the order of the batch tuples
+        :param buffer_size: number of batches gathered ahead
+        """
+        self._specs = specs
+        self._batches = None
+        dtypes = tuple(dtype for _, dtype, _ in specs)
+        shapes = tuple(tf.TensorShape(shape) for _, _, shape in specs)
+        dataset = tf.data.Dataset.from_generator(self._generate, dtypes, shapes).prefetch(buffer_size)
+        self._iterator = dataset.make_initializable_iterator()
+        next_batch = self._iterator.get_next()
+        self.inputs = [tf.placeholder_with_default(tensor, shape=shape, name=name)
+                       for tensor, (name, _, shape) in zip(next_batch, specs)]
+
+    def _generate(self):
+        for batch in self._batches():
+            batch = tuple(batch)
+            # inputs missing at the end of the batch, e.g. the labels at prediction time, get a zero row per sample
+            num_samples = len(batch[0])
+            missing = tuple(np.zeros([num_samples] + [0 if d is None else d for d in shape[1:]], dtype.as_numpy_dtype)
+                            for _, dtype, shape in self._specs[len(batch):])
+            yield batch + missing
+
+    def run(self, sess, fetches, batches, feed_dict=None):
+        """
+        Run fetches on every batch
+        :param sess: session of the graph of the pipeline
+        :param fetches: fetches of sess.run
+        :param batches: function without arguments returning an iterable of batch tuples
+        :param feed_dict: extra feed_dict of every sess.run, e.g. the training flag
+        :return: generator of the results of sess.run
+        """
+        self._batches = batches
+        sess.run(self._iterator.initializer)
+        while True:
+            try:
+                result = sess.run(fetches, feed_dict=feed_dict)
+            except tf.errors.OutOfRangeError:
+                break
+            yield result
+
+
+def input_placeholders(specs, use_input_pipeline=False):
+    """
+    Create the inputs of an estimator graph
+    :param specs: list of (name, dtype, shape) of the inputs
+    :param use_input_pipeline: back the inputs with an InputPipeline
+    :return: list of inputs, InputPipeline or None
+    """
+    if use_input_pipeline:
+        pipeline = InputPipeline(specs)
+        return pipeline.inputs, pipeline
+    return [tf.placeholder(dtype=dtype, shape=shape, name=name) for name, dtype, shape in specs], None
+
+
+def run_batches(sess, fetches, inputs, batches, pipeline=None, feed_dict=None):
+    """
+    Run fetches on every batch, through the input pipeline if there is one, otherwise by feeding the batches
+    :param inputs: inputs of the graph, in the order of the batch tuples
+    :param batches: function without arguments returning an iterable of batch tuples
+    :param pipeline: InputPipeline or None
+    :param feed_dict: extra feed_dict of every sess.run
+    :return: generator of the results of sess.run
+    """
+    if pipeline is not None:
+        for result in pipeline.run(sess, fetches, batches, feed_dict):
+            yield result
+        return
+    for batch in batches():
+        batch_feed_dict = dict(zip(inputs, batch))
+        if feed_dict:
+            batch_feed_dict.update(feed_dict)
+        yield sess.run(fetches, feed_dict=batch_feed_dict)
@@ -0,0 +1,104 @@
+import numpy as np
+
+from rte_pac.utils.token_ids import RaggedSentences, RaggedDocuments, lengths_2_offsets
+
+
+def as_ragged_sentences(sents, dtype=None):
+    """
+    Convert a list of sentences (lists of ids, tokens or vectors) into a RaggedSentences. RaggedSentences are returned
+    as they are.
+    """
+    if isinstance(sents, RaggedSentences):
+        return sents
+    lengths = np.fromiter((len(sent) for sent in sents), dtype=np.int64, count=len(sents))
+    values = [value for sent in sents for value in sent]
+    if len(values) == 0:
+        values = np.zeros(0, dtype=dtype if dtype is not None else np.int32)
+    else:
+        values = np.asarray(values, dtype=dtype)
+    return RaggedSentences(values, lengths_2_offsets(lengths))
+
+
+def as_ragged_documents(docs, dtype=None):
+    """
+    Convert a list of documents (lists of sentences) into a RaggedDocuments. RaggedDocuments are returned as they are.
+    """
+    if isinstance(docs, RaggedDocuments):
+        return docs
+    lengths = np.fromiter((len(sents) for sents in docs), dtype=np.int64, count=len(docs))
+    sentences = as_ragged_sentences([sent for sents in docs for sent in sents], dtype)
+    return RaggedDocuments(sentences, lengths_2_offsets(lengths))
+
+
+def _scatter(sentences: RaggedSentences, starts, lengths, rows, out, max_num_words):
+    """
+    Copy the first max_num_words tokens of the sentences starting at starts into out[rows[i], :lengths[i]]
+    :param rows: index into out (a tuple of index arrays for multi-dimensional rows) of every sentence
+    :return: clipped sentence sizes
+    """
+    clipped = np.minimum(lengths, max_num_words)
+    # position of every kept token within its sentence
+    sent_of_token = np.repeat(np.arange(len(clipped)), clipped)
+    positions = np.arange(int(clipped.sum())) - np.repeat(lengths_2_offsets(clipped)[:-1], clipped)
+    values = sentences.values[starts[sent_of_token] + positions]
+    if sentences.table is not None:
+        values = sentences.table[values]
+    if not isinstance(rows, tuple):
+        rows = (rows,)
+    out[tuple(r[sent_of_token] for r in rows) + (positions,)] = values
+    return clipped.astype(np.int32)
+
+
+def _zeros(sentences: RaggedSentences, shape, dtype):
+    source = sentences.table if sentences.table is not None else sentences.values
+    return np.zeros(tuple(shape) + source.shape[1:], dtype=dtype if dtype is not None else source.dtype)
+
+
+def pad_sentences(sents, max_num_words=None, dtype=None):
+    """
+    Pad a set of sentences into a [num_sents, max_num_words, ...] array, truncating longer sentences.
+    :param sents: RaggedSentences or list of sentences
+    :param max_num_words: defaults to the length of the longest sentence
+    :param dtype: dtype of the output, defaults to the dtype of the values
+    :return: padded array, clipped sentence sizes
+    """
+    sentences = as_ragged_sentences(sents)
+    lengths = np.diff(sentences.offsets)
+    if max_num_words is None:
+        max_num_words = lengths.max()
+    out = _zeros(sentences, [len(sentences), max_num_words], dtype)
+    sizes = _scatter(sentences, sentences.offsets[:-1], lengths, np.arange(len(sentences)), out, max_num_words)
+    return out, sizes
+
+
+def pad_documents(docs, max_num_sents=None, max_num_words=None, dtype=None):
+    """
+    Pad a set of documents into a [num_docs, max_num_sents, max_num_words, ...] array, truncating longer documents
+    and longer sentences.
+    :param docs: RaggedDocuments or list of documents
+    :param max_num_sents: defaults to the number of sentences of the longest document
+    :param max_num_words: defaults to the length of the longest sentence, including the truncated sentences
+    :param dtype: dtype of the output, defaults to the dtype of the values
+    :return: padded array, numbers of sentences (not clipped), clipped sentence sizes [num_docs, max_num_sents]
+    """
+    documents = as_ragged_documents(docs)
+    sentences = documents.sentences
+    doc_sizes = np.diff(documents.offsets)
+    if max_num_sents is None:
+        max_num_sents = doc_sizes.max()
+    if max_num_words is None:
+        all_offsets = sentences.offsets[documents.offsets[0]:documents.offsets[-1] + 1]
+        max_num_words = np.diff(all_offsets).max()
+    out = _zeros(sentences, [len(documents), max_num_sents, max_num_words], dtype)
+    sent_sizes = np.zeros([len(documents), max_num_sents], dtype=np.int32)
+    # the first max_num_sents sentences of every document
+    clipped_doc_sizes = np.minimum(doc_sizes, max_num_sents)
+    doc_of_sent = np.repeat(np.arange(len(documents)), clipped_doc_sizes)
+    sent_positions = np.arange(len(doc_of_sent)) - np.repeat(lengths_2_offsets(clipped_doc_sizes)[:-1],
+                                                              clipped_doc_sizes)
+    sent_index = documents.offsets[:-1][doc_of_sent] + sent_positions
+    starts = sentences.offsets[sent_index]
+    lengths = sentences.offsets[sent_index + 1] - starts
+    sent_sizes[doc_of_sent, sent_positions] = _scatter(sentences, starts, lengths, (doc_of_sent, sent_positions),
+                                                       out, max_num_words)
+    return out, doc_sizes, sent_sizes
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common.util.log_helper import LogHelper
+
+_META_FILE = 'meta.json'
+_KEYS_FILE = 'keys.txt'
+
+
+def _embeddings_file(dtype):
+    return 'embeddings.f{}'.format(np.dtype(dtype).itemsize * 8)
+
+
+def sentence_key(sent: str):
+    return hashlib.sha1(sent.encode('utf-8')).hexdigest()
+
+
+class SentenceEmbeddingStore(object):
+    """
+    Embeddings of sentences keyed by the SHA-1 of the sentence, in a float16 (or dtype) table. With a folder the table
+    is an append-only file which is memory-mapped, the i-th line of keys.txt is the key of the i-th row. The embeddings
+    are written before their keys, so rows of an interrupted append are overwritten by the next one.
+    One folder holds the embeddings of one model and pooling strategy, and is written by one process at a time.
+    """
+
+    def __init__(self, folder: str = None, dtype=np.float16):
+        """
+        :param folder: /path/to/store or None to keep the embeddings in memory only
+        :param dtype: dtype of a new table, an existing one keeps the dtype it was created with
+        """
+        self.folder = folder
+        self.dtype = np.dtype(dtype)
+        self.rows = {}
+        self.shape = None
+        self.table = None
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+            if os.path.exists(os.path.join(folder, _META_FILE)):
+                self._load()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _row_bytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def _map(self, num_rows):
+        if num_rows == 0:
+            self.table = np.zeros((0,) + self.shape, self.dtype)
+        else:
+            self.table = np.memmap(os.path.join(self.folder, _embeddings_file(self.dtype)), dtype=self.dtype, mode='r',
+                                   shape=(num_rows,) + self.shape)
+
+    def _load(self):
+        with open(os.path.join(self.folder, _META_FILE)) as f:
+            meta = json.load(f)
+        self.shape = tuple(meta['shape'])
+        self.dtype = np.dtype(meta.get('dtype', 'float16'))
+        keys = []
+        keys_path = os.path.join(self.folder, _KEYS_FILE)
+        if os.path.exists(keys_path):
+            with open(keys_path) as f:
+                keys = [key for key in f.read().split('\n') if len(key) == 40]
+        embeddings_path = os.path.join(self.folder, _embeddings_file(self.dtype))
+        num_rows = 0
+        if os.path.exists(embeddings_path):
+            num_rows = min(len(keys), os.path.getsize(embeddings_path) // self._row_bytes())
+        if num_rows < len(keys):
+            # keys without complete embeddings, left by an interrupted append
+            keys = keys[:num_rows]
+            with open(keys_path, 'w') as f:
+                f.write(''.join(key + '\n' for key in keys))
+        self.rows = {key: i for i, key in enumerate(keys)}
+        self._map(num_rows)
+
+    def append(self, keys, embeddings):
+        """
+        Add the embeddings of new sentences
+        :param keys: list of sentence keys, see sentence_key
+        :param embeddings: array [len(keys), ...]
+        """
+        embeddings = np.asarray(embeddings, self.dtype)
+        if self.shape is None:
+            self.shape = tuple(embeddings.shape[1:])
+            if self.folder is not None:
+                with open(os.path.join(self.folder, _META_FILE), 'w') as f:
+                    json.dump({'shape': list(self.shape), 'dtype': self.dtype.name}, f)
+        assert tuple(embeddings.shape[1:]) == self.shape, \
+            "Embeddings of shape {} cannot be stored with embeddings of shape {}".format(embeddings.shape[1:],
+                                                                                          self.shape)
+        num_rows = len(self.rows)
+        if self.folder is None:
+            self.table = embeddings if self.table is None else np.concatenate((self.table, embeddings))
+        else:
+            embeddings_path = os.path.join(self.folder, _embeddings_file(self.dtype))
+            with open(embeddings_path, 'r+b' if os.path.exists(embeddings_path) else 'wb') as f:
+                f.seek(num_rows * self._row_bytes())
+                f.write(embeddings.tobytes())
+                f.truncate()
+            with open(os.path.join(self.folder, _KEYS_FILE), 'a') as f:
+                f.write(''.join(key + '\n' for key in keys))
+            self._map(num_rows + len(keys))
+        for i, key in enumerate(keys):
+            self.rows[key] = num_rows + i
+
+
+class SentenceEncoder(object):
+    """
+    Encodes sentences with a sentence encoder (e.g. BERT or the Universal Sentence Encoder), every distinct sentence
+    only once: the sentences missing in the store are encoded in batches of batch_size, num_workers batches at a time,
+    and the arrays of the data sets are gathered from the store.
+    """
+
+    def __init__(self, encode_fn, cache_folder: str = None, batch_size: int = 256, num_workers: int = 4,
+                 dtype=np.float16):
+        """
+        :param encode_fn: function list of sentences -> array [n_sentences, ...]
+        :param cache_folder: folder of the SentenceEmbeddingStore, None to keep the embeddings in memory only
+        :param batch_size: number of sentences per request
+        :param num_workers: number of requests in flight
+        :param dtype: dtype of the stored embeddings
+        """
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.store = SentenceEmbeddingStore(cache_folder, dtype)
+        self.encode_fn = encode_fn
+
+    def close(self):
+        """
+        Release the resources of encode_fn (e.g. a tensorflow session) if it has a close method, the store is kept
+        """
+        if hasattr(self.encode_fn, 'close'):
+            self.encode_fn.close()
+
+    def encode_missing(self, sents):
+        """
+        Encode the sentences which are not in the store yet
+        :return: list of the keys of sents
+        """
+        logger = LogHelper.get_logger("SentenceEncoder")
+        keys = [sentence_key(sent) for sent in sents]
+        missing = {}
+        for key, sent in zip(keys, sents):
+            if key not in self.store.rows and key not in missing:
+                missing[key] = sent
+        if missing:
+            logger.debug("Encoding {} new sentences of {}".format(len(missing), len(sents)))
+            missing = list(missing.items())
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                encoded = executor.map(lambda batch: self.encode_fn([sent for _, sent in batch]), batches)
+                for batch, embeddings in zip(batches, encoded):
+                    self.store.append([key for key, _ in batch], embeddings)
+        return keys
+
+    def _gather(self, rows, shape):
+        rows = np.asarray(rows, np.int64).reshape(shape)
+        embedding_shape = self.store.shape if self.store.shape is not None else ()
+        if len(self.store) == 0:
+            return np.zeros(shape + embedding_shape, np.float32)
+        embeddings = np.asarray(self.store.table[np.maximum(rows, 0)], np.float32)
+        embeddings[rows < 0] = 0
+        return embeddings
+
+    def encode(self, sents):
+        """
+        :param sents: list of sentences
+        :return: array [n_sentences, ...] of the embeddings
+        """
+        keys = self.encode_missing(sents)
+        return self._gather([self.store.rows[key] for key in keys], (len(keys),))
+
+    def encode_sets(self, sents_list, max_num=None):
+        """
+        :param sents_list: list of lists of sentences
+        :param max_num: number of sentences per list, the lists are cut or padded with zeros
+        :return: array [n_lists, max_num, ...] of the embeddings, list of arrays if max_num is None
+        """
+        keys = self.encode_missing([sent for sents in sents_list for sent in sents])
+        if max_num is None:
+            embeddings = []
+            start = 0
+            for sents in sents_list:
+                rows = [self.store.rows[key] for key in keys[start:start + len(sents)]]
+                embeddings.append(self._gather(rows, (len(rows),)))
+                start += len(sents)
+            return embeddings
+        rows = np.full([len(sents_list), max_num], -1, np.int64)
+        start = 0
+        for i, sents in enumerate(sents_list):
+            num = min(len(sents), max_num)
+            rows[i, :num] = [self.store.rows[key] for key in keys[start:start + num]]
+            start += len(sents)
+        return self._gather(rows, rows.shape)
@@ -55,52 +55,17 @@ def get_token_set(heads, bodies):
 
 
 def loadGloVe(filename, heads, bodies):
+    """
+    Load the GloVe vectors of the tokens appearing in the given claims and evidences
+    :param filename: /path/to/glove.txt(.gz)
+    :param heads: claims
+    :param bodies: evidences
+    :return: vocab, embedding matrix. The first 2 rows are [PAD] and UNK
+    """
     logger = LogHelper.get_logger("text_processing")
-    is_gz = os.path.splitext(filename)[1] == '.gz'
-
-    # Getting embedding dimension
-    def _get_dim(_file):
-        line = _file.readline()
-        return len(line.strip().split(' ')) - 1
-
-    if is_gz:
-        with gzip.open(filename, 'rt') as file0:
-            emb_dim = _get_dim(file0)
-    else:
-        with open(filename, 'r', encoding='utf-8') as file0:
-            emb_dim = _get_dim(file0)
-
     dataset_token_set = get_token_set(heads, bodies)
     logger.info("Finished tokenization")
-    # First row of embedding matrix is 0 for zero padding
-    vocab = ['[PAD]']
-    embd = [[0.0] * emb_dim]
-    vocab.append('UNK')
-    embd.append([1.0] * emb_dim)
-
-    def _read_glove_file(_vocab, _embd, _token_set, _file):
-        for line in _file:
-            items = line.replace('\r', '').replace('\n', '').split(' ')
-            if len(items) < 10:
-                print(items)
-                continue
-            word = items[0]
-            if word in _token_set:
-                _vocab.append(word)
-                vect = [float(i) for i in items[1:]]
-                _embd.append(vect)
-        return _vocab, _embd
-
-    # Reading embedding matrix
-    if is_gz:
-        with gzip.open(filename, 'rt') as file:
-            vocab, embd = _read_glove_file(
-                vocab, embd, dataset_token_set, file)
-    else:
-        with open(filename, 'r', encoding='utf-8') as file:
-            vocab, embd = _read_glove_file(
-                vocab, embd, dataset_token_set, file)
-    logger.info('Loaded GloVe!')
+    vocab, embd = load_whole_glove(filename, token_set=dataset_token_set)
     return vocab, embd
 
 
@@ -493,49 +458,77 @@ def load_sents_representations(parent_path, output_filename='sent_embeddings.p')
     return output_dict, y
 
 
-def load_whole_glove(glove_file):
-    logger = LogHelper.get_logger("load_whole_glove")
+def glove_cache_paths(glove_file):
+    """
+    Paths of the binary cache of a GloVe text file, i.e. glove.6B.300d.npy and glove.6B.300d.vocab.p for
+    glove.6B.300d.txt.gz
+    """
+    prefix = glove_file
+    if prefix.endswith('.gz'):
+        prefix = prefix[:-len('.gz')]
+    if prefix.endswith('.txt'):
+        prefix = prefix[:-len('.txt')]
+    return prefix + '.npy', prefix + '.vocab.p'
+
+
+def convert_glove_to_npy(glove_file):
+    """
+    One time conversion of a GloVe text file into a float32 .npy matrix and a pickled vocab list.
+    As for the text loaders, the first row of the matrix is the [PAD] vector (all 0) and the second one is UNK (all 1).
+    :param glove_file: /path/to/glove.txt(.gz)
+    :return: paths of the matrix and of the vocab
+    """
+    logger = LogHelper.get_logger("convert_glove_to_npy")
+    embed_path, vocab_path = glove_cache_paths(glove_file)
     is_gz = os.path.splitext(glove_file)[1] == '.gz'
-
-    # Getting embedding dimension
-    def _get_dim(_file):
-        line = _file.readline()
-        return len(line.strip().split(' ')) - 1
-
-    if is_gz:
-        with gzip.open(glove_file, 'rt') as file0:
-            emb_dim = _get_dim(file0)
-    else:
-        with open(glove_file, 'r', encoding='utf-8') as file0:
-            emb_dim = _get_dim(file0)
-
-    # First row of embedding matrix is 0 for zero padding
-    vocab = ['[PAD]']
-    embed = [[0.0] * emb_dim]
-    vocab.append('UNK')
-    embed.append([1.0] * emb_dim)
-
-    def _read_glove_file(_vocab, _embed, _file):
-        for line in _file:
+    vocab = ['[PAD]', 'UNK']
+    vectors = []
+    with (gzip.open(glove_file, 'rt') if is_gz else open(glove_file, 'r', encoding='utf-8')) as file:
+        for line in file:
             items = line.replace('\r', '').replace('\n', '').split(' ')
             if len(items) < 10:
                 logger.debug("exceptional line: {}".format(line))
                 continue
-            word = items[0]
-            _vocab.append(word)
-            vec = [float(i) for i in items[1:]]
-            _embed.append(vec)
-        return _vocab, _embed
-
-    # Reading embedding matrix
-    if is_gz:
-        with gzip.open(glove_file, 'rt') as file:
-            vocab, embed = _read_glove_file(vocab, embed, file)
-    else:
-        with open(glove_file, 'r', encoding='utf-8') as file:
-            vocab, embed = _read_glove_file(vocab, embed, file)
+            vocab.append(items[0])
+            vectors.append(np.asarray(items[1:], dtype=np.float32))
+    emb_dim = len(vectors[0])
+    embed = np.lib.format.open_memmap(embed_path, mode='w+', dtype=np.float32, shape=(len(vocab), emb_dim))
+    embed[0] = 0.0
+    embed[1] = 1.0
+    for i, vec in enumerate(vectors):
+        embed[i + 2] = vec
+    embed.flush()
+    del embed
+    # the vocab is written last, so an interrupted conversion is never picked up as a valid cache
+    with open(vocab_path, 'wb') as f:
+        pickle.dump(vocab, f, protocol=pickle.HIGHEST_PROTOCOL)
+    logger.info("Converted {} to {} and {}".format(glove_file, embed_path, vocab_path))
+    return embed_path, vocab_path
+
+
+def load_whole_glove(glove_file, token_set=None):
+    """
+    Load GloVe from its binary cache, converting the text file on first use.
+    :param glove_file: /path/to/glove.txt(.gz)
+    :param token_set: if given, only the rows of these tokens (plus [PAD] and UNK) are kept
+    :return: vocab, embedding matrix. Read-only memory-mapped if token_set is None, in memory otherwise
+    """
+    logger = LogHelper.get_logger("load_whole_glove")
+    embed_path, vocab_path = glove_cache_paths(glove_file)
+    if not os.path.exists(vocab_path) or (
+            os.path.exists(glove_file) and os.path.getmtime(vocab_path) < os.path.getmtime(glove_file)):
+        convert_glove_to_npy(glove_file)
+    with open(vocab_path, 'rb') as f:
+        vocab = pickle.load(f)
+    embed = np.load(embed_path, mmap_mode='r')
+    if token_set is not None:
+        rows = [0, 1] + [i for i in range(2, len(vocab)) if vocab[i] in token_set]
+        vocab = [vocab[i] for i in rows]
+        embed = embed[rows]
     logger.info('Loaded GloVe!')
     return vocab, embed
+
+
 # if __name__=="__main__":
 #
 #     text ="I don\'t think this is right..."
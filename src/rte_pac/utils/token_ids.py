@@ -0,0 +1,201 @@
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+from rte_pac.utils.text_processing import tokenize
+
+_unknown_vocab = 'UNK'
+
+
+@lru_cache(maxsize=2 ** 18)
+def tokenize_lower(sent):
+    """
+    Tokenize a sentence into lowercased, interned tokens. Results are memoized for the most recent sentences, since the
+    same evidence sentences are retrieved for many claims.
+    :param sent: sentence
+    :return: tuple of tokens
+    """
+    return tuple(sys.intern(token.lower()) for token in tokenize(sent))
+
+
+def clear_token_cache():
+    tokenize_lower.cache_clear()
+
+
+class RaggedSentences(object):
+    """
+    Sentences of word ids in CSR layout: the ids of sentence i are values[offsets[i]:offsets[i + 1]].
+    Behaves like a list of int32 arrays, so it can be passed wherever a list of lists of ids is expected.
+    If table is given, values index its rows and sentence i is table[values[offsets[i]:offsets[i + 1]]], e.g. the
+    word embeddings of the sentence.
+    """
+
+    def __init__(self, values, offsets, table=None):
+        self.values = values
+        self.offsets = offsets
+        self.table = table
+
+    @property
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            assert step == 1, "RaggedSentences only supports contiguous slices"
+            return RaggedSentences(self.values, self.offsets[start:stop + 1], self.table)
+        if i < 0:
+            i += len(self)
+        return self._sentence(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._sentence(i)
+
+    def _sentence(self, i):
+        values = self.values[self.offsets[i]:self.offsets[i + 1]]
+        if self.table is not None:
+            return self.table[values]
+        return values
+
+
+class RaggedDocuments(object):
+    """
+    Documents of sentences of word ids: the sentences of document i are sentences[offsets[i]:offsets[i + 1]].
+    Behaves like a list of lists of int32 arrays.
+    """
+
+    def __init__(self, sentences: RaggedSentences, offsets):
+        self.sentences = sentences
+        self.offsets = offsets
+
+    @property
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            assert step == 1, "RaggedDocuments only supports contiguous slices"
+            return RaggedDocuments(self.sentences, self.offsets[start:stop + 1])
+        if i < 0:
+            i += len(self)
+        return self.sentences[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.sentences[self.offsets[i]:self.offsets[i + 1]]
+
+
+def lengths_2_offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _tokens_2_codes(texts):
+    """
+    Tokenize a corpus and number its distinct tokens in order of first occurrence
+    :return: list of distinct tokens, code of every token of the corpus, number of tokens of every sentence
+    """
+    sents_tokens = [tokenize_lower(sent) for sent in texts]
+    lengths = np.fromiter((len(tokens) for tokens in sents_tokens), dtype=np.int64, count=len(sents_tokens))
+    type_index = {}
+    codes = np.fromiter((type_index.setdefault(token, len(type_index)) for tokens in sents_tokens for token in tokens),
+                        dtype=np.int64, count=int(lengths.sum()))
+    return list(type_index), codes, lengths
+
+
+def encode_sentences(texts, vocab_dict, unk_words=True, vocab_limit=None, embed=None):
+    """
+    Tokenize a corpus and map it to word ids in one pass. Each distinct token is looked up in vocab_dict only once.
+    Out of vocabulary tokens are handled, by priority:
+    - embed is not None: the token is added to vocab_dict and embed gets a new random row for it
+    - vocab_limit is not None: the token is added to vocab_dict while it has less than vocab_limit entries. As in the
+      original per-token loop, the first occurrence of a newly added token is skipped. Tokens beyond the limit are UNK
+    - unk_words: the token is mapped to UNK, otherwise it is dropped
+    :param texts: list of sentences
+    :param vocab_dict: token -> id, updated in place when new tokens are added
+    :param unk_words: map out of vocabulary tokens to UNK instead of dropping them
+    :param vocab_limit: maximum size of vocab_dict
+    :param embed: embedding matrix to extend with new tokens
+    :return: RaggedSentences, embed, number of out of vocabulary tokens
+    """
+    types, codes, lengths = _tokens_2_codes(texts)
+    num_tokens = len(codes)
+    type_ids = np.fromiter((vocab_dict.get(token, -1) for token in types), dtype=np.int64, count=len(types))
+    oov_types = np.flatnonzero(type_ids < 0)
+    oov_mask = type_ids[codes] < 0
+    out_of_vocab_counts = int(oov_mask.sum())
+    keep = None
+    if len(oov_types) > 0:
+        if embed is not None:
+            embed = np.asarray(embed, dtype=np.float32)
+            new_ids = np.arange(len(embed), len(embed) + len(oov_types))
+            for t, new_id in zip(oov_types, new_ids):
+                vocab_dict[types[t]] = int(new_id)
+            type_ids[oov_types] = new_ids
+            random_embed = np.random.uniform(-0.1, 0.1, (len(oov_types), embed.shape[1])).astype(np.float32)
+            embed = np.concatenate([embed, random_embed])
+        elif vocab_limit is not None:
+            num_new = max(min(vocab_limit - len(vocab_dict), len(oov_types)), 0)
+            added = oov_types[:num_new]
+            for t in added:
+                vocab_dict[types[t]] = len(vocab_dict)
+                type_ids[t] = vocab_dict[types[t]]
+            type_ids[oov_types[num_new:]] = vocab_dict[_unknown_vocab]
+            # the types are numbered in order of first occurrence, so np.unique finds the first occurrence of each
+            _, first_occurrences = np.unique(codes, return_index=True)
+            keep = np.ones(num_tokens, dtype=bool)
+            keep[first_occurrences[added]] = False
+            out_of_vocab_counts = int(np.isin(codes, oov_types[num_new:]).sum())
+        elif unk_words:
+            type_ids[oov_types] = vocab_dict[_unknown_vocab]
+        else:
+            keep = ~oov_mask
+    values = type_ids[codes].astype(np.int32)
+    if keep is not None:
+        sent_index = np.repeat(np.arange(len(lengths)), lengths)
+        values = values[keep]
+        lengths = np.bincount(sent_index[keep], minlength=len(lengths))
+    return RaggedSentences(values, lengths_2_offsets(lengths)), embed, out_of_vocab_counts
+
+
+def encode_documents(texts, vocab_dict, unk_words=True, vocab_limit=None, embed=None):
+    """
+    Same as encode_sentences for a list of documents, each of which is a list of sentences
+    :return: RaggedDocuments, embed, number of out of vocabulary tokens
+    """
+    doc_lengths = np.fromiter((len(sents) for sents in texts), dtype=np.int64, count=len(texts))
+    flat_sents = [sent for sents in texts for sent in sents]
+    sentences, embed, out_of_vocab_counts = encode_sentences(flat_sents, vocab_dict, unk_words, vocab_limit, embed)
+    return RaggedDocuments(sentences, lengths_2_offsets(doc_lengths)), embed, out_of_vocab_counts
+
+
+def embed_sentences(texts, embedding_fn):
+    """
+    Tokenize a corpus and embed it, calling embedding_fn once per distinct token
+    :param texts: list of sentences
+    :param embedding_fn: lowercased token -> vector
+    :return: RaggedSentences whose table holds the vectors of the distinct tokens
+    """
+    types, codes, lengths = _tokens_2_codes(texts)
+    table = np.asarray([embedding_fn(token) for token in types], dtype=np.float32)
+    return RaggedSentences(codes, lengths_2_offsets(lengths), table)
+
+
+def embed_documents(texts, embedding_fn):
+    """
+    Same as embed_sentences for a list of documents, each of which is a list of sentences
+    :return: RaggedDocuments
+    """
+    doc_lengths = np.fromiter((len(sents) for sents in texts), dtype=np.int64, count=len(texts))
+    flat_sents = [sent for sents in texts for sent in sents]
+    return RaggedDocuments(embed_sentences(flat_sents, embedding_fn), lengths_2_offsets(doc_lengths))
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+
+from rte_pac.utils.sentence_embedding import SentenceEncoder
+
+USE_MODULE_URL = "https://tfhub.dev/google/universal-sentence-encoder/2"
+
+
+class USEModule(object):
+    """
+    Frozen Universal Sentence Encoder in a graph and session of its own, the graph is built at the first call. The
+    session holds its share of the GPU memory until close is called.
+    """
+
+    def __init__(self, module_url: str = USE_MODULE_URL, max_gpu_memory: float = 0.5):
+        self.module_url = module_url
+        self.max_gpu_memory = max_gpu_memory
+        self._session = None
+        self._sents = None
+        self._embeddings = None
+
+    def _build(self):
+        import tensorflow as tf
+        import tensorflow_hub as hub
+
+        graph = tf.Graph()
+        with graph.as_default():
+            embed = hub.Module(self.module_url, trainable=False)
+            self._sents = tf.placeholder(tf.string, shape=[None], name="sents")
+            self._embeddings = embed(self._sents)
+            init = [tf.global_variables_initializer(), tf.tables_initializer()]
+        # grow on demand instead of reserving the whole fraction next to the session of the model
+        gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=self.max_gpu_memory, allow_growth=True)
+        self._session = tf.Session(graph=graph, config=tf.ConfigProto(gpu_options=gpu_options))
+        self._session.run(init)
+
+    def __call__(self, sents):
+        """
+        :param sents: list of sentences
+        :return: array [n_sentences, 512] of the embeddings
+        """
+        if self._session is None:
+            self._build()
+        return self._session.run(self._embeddings, feed_dict={self._sents: sents})
+
+    def close(self):
+        """
+        Close the session, a later call builds the graph again
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+def _module_cache_folder(cache_folder, module_url):
+    # e.g. universal-sentence-encoder-2, so the embeddings of different versions are never mixed
+    return os.path.join(cache_folder, '-'.join(module_url.rstrip('/').split('/')[-2:]))
+
+
+def get_use_encoder(cache_folder: str = None, module_url: str = USE_MODULE_URL, batch_size: int = 1024,
+                    max_gpu_memory: float = 0.5):
+    """
+    Encoder of sentences with the frozen Universal Sentence Encoder, every distinct sentence is encoded once and its
+    float32 embedding is kept in the store under cache_folder, see SentenceEncoder for encode/encode_sets. Close the
+    encoder once the data sets are encoded, so its session does not hold GPU memory the model needs.
+    :param cache_folder: /path/to/cache, one sub-folder per module, None to keep the embeddings in memory only
+    :param module_url: tensorflow hub module of the encoder
+    :param batch_size: number of sentences per session run
+    """
+    if cache_folder is not None:
+        cache_folder = _module_cache_folder(cache_folder, module_url)
+    # a single session encodes the batches one after the other
+    return SentenceEncoder(USEModule(module_url, max_gpu_memory), cache_folder=cache_folder, batch_size=batch_size,
+                           num_workers=1, dtype=np.float32)
@@ -42,27 +42,22 @@ def generate_submission(_predictions, _ids, test_set_path, submission_path):
     :param submission_path:
     :return:
     """
-    from common.dataset.reader import JSONLineReader
+    from common.dataset.reader import JSONLineReader, JSONLineWriter
     from tqdm import tqdm
-    import json
     from rte_pac.utils.data_reader import prediction_2_label
-    _predictions_with_id = list(zip(_ids, _predictions))
+    _predictions_by_id = {}
+    for _pid, _plabel in zip(_ids, _predictions):
+        _predictions_by_id.setdefault(_pid, _plabel)
     jlr = JSONLineReader()
-    json_lines = jlr.read(test_set_path)
+    json_lines = jlr.iterate(test_set_path, fields=['id', 'predicted_evidence'])
     os.makedirs(os.path.dirname(os.path.abspath(submission_path)), exist_ok=True)
-    with open(submission_path, 'w') as f:
+    with JSONLineWriter(submission_path, append=False) as writer:
         for line in tqdm(json_lines):
             for i, evidence in enumerate(line['predicted_evidence']):
                 line['predicted_evidence'][i][0] = normalize(evidence[0])
             _id = line['id']
-            _pred_label = prediction_2_label(2)
-            for _pid, _plabel in _predictions_with_id:
-                if _pid == _id:
-                    _pred_label = prediction_2_label(_plabel)
-                    break
-            obj = {"id": _id, "predicted_evidence": line['predicted_evidence'], "predicted_label": _pred_label}
-            f.write(json.dumps(obj))
-            f.write('\n')
+            _pred_label = prediction_2_label(_predictions_by_id.get(_id, 2))
+            writer.write({"id": _id, "predicted_evidence": line['predicted_evidence'], "predicted_label": _pred_label})
 
 
 def dump_source_features_embeddings(dump_file_path,
@@ -3,16 +3,18 @@ import os
 import argparse
 import numpy as np
 import tensorflow as tf
-from tqdm import tqdm
 import random
 
 from retrieval.score.score import fever_score
 from retrieval.sentences.deep_models.BiLSTM_RANKING import BiLSTM_RANKING
 from retrieval.sentences.deep_models.Decomposable_Atten import Decomposable_Atten
 from retrieval.sentences.deep_models.ESIM import ESIM
+from retrieval.sentences.deep_models.ranking import rank_claims
 from retrieval.sentences.deep_models.USE_RANKING import USERANKING
+from retrieval.snopes_doc_db import SnopesDocDB
+from retrieval.tfidf_sentence_index import load_or_build_tfidf_sentence_index
+from retrieval.evidence_index import evidence_index
 from common.dataset.reader import JSONLineReader
-from drqascripts.retriever.build_tfidf_lines import OnlineTfidfDocRanker
 
 def write_predictions(final_predictions, write_path):
     with open(write_path, "w+") as f:
@@ -22,7 +24,8 @@ def write_predictions(final_predictions, write_path):
 def post_processing(clf, X, indexes, k=50):
     """
     predict scores for each claim and sentences in the predicted pages,
-    get the order of score in descending format, and reorder (doc_id,sent_id) pair with the order,and extract first 5 most similar sentences
+    get the order of score in descending format, and reorder (doc_id,sent_id) pair with the order,and extract first 5 most similar sentences.
+    The pairs of all claims are scored in one pass, see rank_claims
     :param clf:
     :param X:
     :param indexes:C
@@ -30,17 +33,7 @@ def post_processing(clf, X, indexes, k=50):
     :return:
     """
 
-    predictions = []
-    all_scores = []
-    for idx, line_input in enumerate(X):
-        scores = clf.predict(line_input)
-        scores = np.asarray(np.reshape(scores, newshape=(-1,)))
-        orders = np.argsort(scores, axis=-1)[::-1]
-        scores = scores[orders]
-        sents_indexes = np.asarray(indexes[idx])
-        predictions.append(sents_indexes[orders][:k])
-        all_scores.append(scores[:k])
-    return predictions, all_scores
+    return rank_claims(clf, X, indexes, k)
 
 
 def post_processing_baseline(X, indexes, k=50):
@@ -58,16 +51,7 @@ def post_processing_baseline(X, indexes, k=50):
 
 
 def get_whole_evidence(evidence_set, db):
-    pos_sents = []
-    for evidence in evidence_set:
-        page = evidence[0]
-        doc_lines = db[page]['lines']
-        # doc_lines = db[page]
-        for i in range(len(doc_lines)):
-            if i == evidence[1]:
-                pos_sents.append(doc_lines[i])
-    pos_sent = ' '.join(pos_sents)
-    return pos_sent
+    return evidence_index(db).get_whole_evidence([(evidence[0], evidence[1]) for evidence in evidence_set])
     
     
 def prediction_processing(dataset_path, predictions, db_filename):
@@ -80,12 +64,11 @@ def prediction_processing(dataset_path, predictions, db_filename):
 
     final_predictions = []
     jsr = JSONLineReader()
-    with open(db_filename) as f: 
-        db = json.load(f)
+    db = SnopesDocDB(db_filename)
         
     out_error_ana = []   
     with open(dataset_path, "r") as f:
-        lines = jsr.process(f)
+        lines = jsr.iterate_fp(f)
 
         cnt = 0
         for line in lines:
@@ -118,25 +101,18 @@ def prediction_processing(dataset_path, predictions, db_filename):
     return final_predictions, out_error_ana
 
 
-def post_processing_tfidf(X, indexes, k=50):
-  
-    predictions = []
-    all_scores = []
-    args.tokenizer = 'simple'
-    args.ngram = 2
-    args.max_sent = k
-    args.hash_size = int(np.math.pow(2, 24))
-    for idx, line_input in tqdm(enumerate(X)):
-  
-        sentences = [line_tmp[1] for line_tmp in line_input]
-        claim = line_input[0][0]
-        tfidf = OnlineTfidfDocRanker(args, sentences, None)
-        line_ids,scores = tfidf.closest_docs(claim, args.max_sent)
-        sents_indexes = np.asarray(indexes[idx])
-  
-        predictions.append(sents_indexes[line_ids][:k])
-        all_scores.append(scores[:k])
-    return predictions, all_scores
+def post_processing_tfidf(X, indexes, tfidf_index, k=50):
+    """
+    rank the candidate sentences of each claim by their tf-idf similarity to the claim, all claims are scored in one
+    pass against the corpus-level index (see TfidfSentenceIndex)
+    :param X:
+    :param indexes:
+    :param tfidf_index:
+    :param k:
+    :return:
+    """
+    claims = [line_input[0][0] for line_input in X]
+    return tfidf_index.closest_sentences(claims, indexes, k)
 
 def pipeline(model="bilstm_ranking"):
     """
@@ -195,7 +171,8 @@ def pipeline(model="bilstm_ranking"):
         num_negatives = 1
         data = Data(path, new_train_path, dev_path, test_path, fasttext_path, num_negatives=num_negatives, 
             h_max_length=h_max_length, s_max_length=s_max_length, random_seed=140, db_filepath=db_filename)
-        predictions, _ = post_processing_tfidf(data.X_test, data.test_location_indexes)
+        tfidf_index = load_or_build_tfidf_sentence_index(data.db, db_filename)
+        predictions, _ = post_processing_tfidf(data.X_test, data.test_location_indexes, tfidf_index)
 
     elif model == "bilstm_ranking":
         s_max_length = 60
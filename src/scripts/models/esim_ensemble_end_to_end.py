@@ -1,5 +1,4 @@
 import argparse
-import json
 import os
 import pickle
 
@@ -12,7 +11,7 @@ from athene.rte.utils.data_reader import prediction_2_label, embed_data_set_with
 from athene.rte.utils.estimator_definitions import get_estimator
 from athene.rte.utils.score import print_metrics
 from athene.rte.utils.text_processing import load_whole_glove, vocab_map
-from common.dataset.reader import JSONLineReader
+from common.dataset.reader import JSONLineReader, JSONLineWriter
 from common.util.log_helper import LogHelper
 
 
@@ -46,16 +45,14 @@ def generate_submission(_predictions, test_set_path, submission_path):
     :return:
     """
     jlr = JSONLineReader()
-    json_lines = jlr.read(test_set_path)
+    json_lines = jlr.iterate(test_set_path, fields=['id', 'predicted_evidence'])
     os.makedirs(os.path.dirname(os.path.abspath(submission_path)), exist_ok=True)
-    with open(submission_path, 'w') as f:
+    with JSONLineWriter(submission_path, append=False) as writer:
         for _prediction, line in tqdm(zip(_predictions, json_lines)):
             for i, evidence in enumerate(line['predicted_evidence']):
                 line['predicted_evidence'][i][0] = normalize(evidence[0])
-            obj = {"id": line['id'], "predicted_evidence": line['predicted_evidence'],
-                   "predicted_label": prediction_2_label(_prediction)}
-            f.write(json.dumps(obj))
-            f.write('\n')
+            writer.write({"id": line['id'], "predicted_evidence": line['predicted_evidence'],
+                          "predicted_label": prediction_2_label(_prediction)})
 
 
 if __name__ == '__main__':
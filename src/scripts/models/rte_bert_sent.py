@@ -35,6 +35,7 @@ def main(mode: RTERunPhase, config=None, estimator=None):
     else:
         is_snopes = False
     logger.debug("is_snopes: " + str(is_snopes))
+    bert_cache_folder = Config.bert_cache_folder if hasattr(Config, 'bert_cache_folder') else None
     logger.info("scorer type: " + Config.estimator_name)
     logger.info("random seed: " + str(Config.seed))
     logger.info("BERT sentence embedding arguments: " + str(Config.bert_sent_hyper_parameter))
@@ -57,22 +58,26 @@ def main(mode: RTERunPhase, config=None, estimator=None):
             X_valid['b_sizes'] = get_num_sents_of_bodies(X_valid['b'])
             b_train = X_train['b']
             b_encoded_train = encode_multi_sentence_set_with_bert(b_train, Config.max_sentences, port=Config.bert_port,
-                                                                  port_out=Config.bert_port_out)
+                                                                  port_out=Config.bert_port_out,
+                                                                  cache_folder=bert_cache_folder)
             X_train['b'] = b_encoded_train
             logger.debug("b_encoded_train.shape: " + str(b_encoded_train.shape))
             h_train = X_train['h']
             h_encoded_train = encode_single_sentence_set_with_bert(h_train, port=Config.bert_port,
-                                                                   port_out=Config.bert_port_out)
+                                                                   port_out=Config.bert_port_out,
+                                                                   cache_folder=bert_cache_folder)
             X_train['h'] = h_encoded_train
             logger.debug("h_encoded_train.shape: " + str(h_encoded_train.shape))
             b_valid = X_valid['b']
             b_encoded_valid = encode_multi_sentence_set_with_bert(b_valid, Config.max_sentences, port=Config.bert_port,
-                                                                  port_out=Config.bert_port_out)
+                                                                  port_out=Config.bert_port_out,
+                                                                  cache_folder=bert_cache_folder)
             X_valid['b'] = b_encoded_valid
             logger.debug("b_encoded_valid.shape: " + str(b_encoded_valid.shape))
             h_valid = X_valid['h']
             h_encoded_valid = encode_single_sentence_set_with_bert(h_valid, port=Config.bert_port,
-                                                                   port_out=Config.bert_port_out)
+                                                                   port_out=Config.bert_port_out,
+                                                                   cache_folder=bert_cache_folder)
             X_valid['h'] = h_encoded_valid
             logger.debug("h_encoded_valid.shape: " + str(h_encoded_valid.shape))
             if hasattr(Config, 'training_dump'):
@@ -99,12 +104,14 @@ def main(mode: RTERunPhase, config=None, estimator=None):
         X_test['b_sizes'] = get_num_sents_of_bodies(X_test['b'])
         b_test = X_test['b']
         b_encoded_test = encode_multi_sentence_set_with_bert(b_test, Config.max_sentences, port=Config.bert_port,
-                                                             port_out=Config.bert_port_out)
+                                                             port_out=Config.bert_port_out,
+                                                             cache_folder=bert_cache_folder)
         X_test['b'] = b_encoded_test
         logger.debug("b_encoded_test.shape: " + str(b_encoded_test.shape))
         h_test = X_test['h']
         h_encoded_test = encode_single_sentence_set_with_bert(h_test, port=Config.bert_port,
-                                                              port_out=Config.bert_port_out)
+                                                              port_out=Config.bert_port_out,
+                                                              cache_folder=bert_cache_folder)
         X_test['h'] = h_encoded_test
         logger.debug("h_encoded_test.shape: " + str(h_encoded_test.shape))
         if 'CUDA_VISIBLE_DEVICES' not in os.environ or not str(os.environ['CUDA_VISIBLE_DEVICES']).strip():
@@ -26,6 +26,7 @@ def main(mode: RTERunPhase, config=None, estimator=None):
     else:
         is_snopes = False
     logger.debug("is_snopes: " + str(is_snopes))
+    bert_cache_folder = Config.bert_cache_folder if hasattr(Config, 'bert_cache_folder') else None
     if mode == RTERunPhase.train:
         # training mode
         training_set = embed_data_set_with_bert(Config.training_set_file, Config.db_path,
@@ -33,7 +34,8 @@ def main(mode: RTERunPhase, config=None, estimator=None):
                                                 threshold_b_sent_size=Config.max_sentence_size,
                                                 is_snopes=is_snopes,
                                                 port=Config.bert_port,
-                                                port_out=Config.bert_port_out)
+                                                port_out=Config.bert_port_out,
+                                                cache_folder=bert_cache_folder)
         h_sent_sizes = training_set['data']['h_sent_sizes']
         h_sizes = np.ones(len(h_sent_sizes), np.int32)
         training_set['data']['h_sent_sizes'] = np.expand_dims(h_sent_sizes, 1)
@@ -44,7 +46,8 @@ def main(mode: RTERunPhase, config=None, estimator=None):
                                              threshold_b_sent_size=Config.max_sentence_size,
                                              is_snopes=is_snopes,
                                              port=Config.bert_port,
-                                             port_out=Config.bert_port_out)
+                                             port_out=Config.bert_port_out,
+                                             cache_folder=bert_cache_folder)
         h_sent_sizes = valid_set['data']['h_sent_sizes']
         h_sizes = np.ones(len(h_sent_sizes), np.int32)
         valid_set['data']['h_sent_sizes'] = np.expand_dims(h_sent_sizes, 1)
@@ -75,7 +78,8 @@ def main(mode: RTERunPhase, config=None, estimator=None):
                                             threshold_b_sent_size=Config.max_sentence_size,
                                             is_snopes=is_snopes,
                                             port=Config.bert_port,
-                                            port_out=Config.bert_port_out)
+                                            port_out=Config.bert_port_out,
+                                            cache_folder=bert_cache_folder)
         h_sent_sizes = test_set['data']['h_sent_sizes']
         h_sizes = np.ones(len(h_sent_sizes), np.int32)
         test_set['data']['h_sent_sizes'] = np.expand_dims(h_sent_sizes, 1)
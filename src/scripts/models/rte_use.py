@@ -8,6 +8,7 @@ import numpy as np
 from rte_pac.utils.data_reader import read_data_set_from_jsonl
 from rte_pac.utils.estimator_definitions import get_estimator
 from rte_pac.utils.score import print_metrics
+from rte_pac.utils.use_encoding import get_use_encoder
 from utils.config import Config
 from common.util.log_helper import LogHelper
 from scripts import RTERunPhase, save_model, load_model, generate_submission
@@ -23,6 +24,30 @@ def get_num_sents_of_bodies(bodies_list):
     return np.asarray([len(bodies) for bodies in bodies_list], np.int)
 
 
+def embed_data_sets_with_use(Xs, estimator, logger):
+    """
+    Replace the claims and evidences of the data sets by their cached USE embeddings if the estimator takes
+    precomputed embeddings. The encoder is closed afterwards, so its session frees the GPU for the estimator.
+    :param Xs: list of data sets
+    :return: list of the data sets
+    """
+    if not getattr(estimator, 'precomputed_embeddings', False):
+        return Xs
+    use_cache_folder = Config.use_cache_folder if hasattr(Config, 'use_cache_folder') else None
+    encoder = get_use_encoder(use_cache_folder, max_gpu_memory=Config.max_gpu_memory)
+    embedded = []
+    try:
+        for X in Xs:
+            X = dict(X)
+            X['h'] = encoder.encode(list(X['h']))
+            X['b'] = encoder.encode_sets([list(sents) for sents in X['b']], Config.max_sentences)
+            logger.debug("embedded b.shape: " + str(X['b'].shape))
+            embedded.append(X)
+    finally:
+        encoder.close()
+    return embedded
+
+
 def main(mode: RTERunPhase, config=None, estimator=None):
     LogHelper.setup()
     logger = LogHelper.get_logger(os.path.splitext(os.path.basename(__file__))[0] + "_" + str(mode))
@@ -77,6 +102,7 @@ def main(mode: RTERunPhase, config=None, estimator=None):
         if 'CUDA_VISIBLE_DEVICES' not in os.environ or not str(os.environ['CUDA_VISIBLE_DEVICES']).strip():
             os.environ['CUDA_VISIBLE_DEVICES'] = str(
                 GPUtil.getFirstAvailable(maxLoad=1.0, maxMemory=1.0 - Config.max_gpu_memory)[0])
+        X_train, X_valid = embed_data_sets_with_use([X_train, X_valid], estimator, logger)
         estimator.fit(X_train, Y_labels_train, X_valid, Y_labels_valid)
         save_model(estimator, Config.model_folder, Config.pickle_name, logger)
     else:
@@ -103,7 +129,8 @@ def main(mode: RTERunPhase, config=None, estimator=None):
         if 'CUDA_VISIBLE_DEVICES' not in os.environ or not str(os.environ['CUDA_VISIBLE_DEVICES']).strip():
             os.environ['CUDA_VISIBLE_DEVICES'] = str(
                 GPUtil.getFirstAvailable(maxLoad=1.0, maxMemory=1.0 - Config.max_gpu_memory)[0])
-        predictions = estimator.predict(X_test, restore_param_required)
+        X_test_input, = embed_data_sets_with_use([X_test], estimator, logger)
+        predictions = estimator.predict(X_test_input, restore_param_required)
         generate_submission(predictions, X_test['id'], Config.test_set_file, Config.submission_file)
         if Y_labels_test:
             print_metrics(Y_labels_test, predictions, logger)
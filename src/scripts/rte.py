@@ -1,12 +1,12 @@
 import argparse
 import os
-import pickle
 
 import GPUtil
 import numpy as np
 
 from rte_pac.utils.data_reader import embed_data_set_with_glove_2, load_feature_by_data_set, \
-    number_feature, generate_concat_indices_for_inter_evidence, generate_concat_indices_for_claim
+    number_features, generate_concat_indices_for_inter_evidence, generate_concat_indices_for_claim
+from rte_pac.utils.data_set_cache import cached_data_set, file_fingerprint
 from rte_pac.utils.estimator_definitions import get_estimator
 from rte_pac.utils.score import print_metrics
 from rte_pac.utils.text_processing import load_whole_glove, vocab_map
@@ -25,6 +25,94 @@ from scripts.models.rte_mtl import main as main_mtl
 from scripts.models.rte_use import main as main_use
 
 
+def embed_data_set(data_set_file: str, vocab, embeddings, is_snopes: bool, use_extra_features: bool,
+                   use_numeric_feature: bool, use_inter_evidence_comparison: bool,
+                   use_claim_evidences_comparison: bool, number_feature_fn=None):
+    """
+    Embed a data set with GloVe and add the auxiliary inputs required by the estimator
+    :param number_feature_fn: function data set file -> numeric features, see split_number_features
+    """
+    data_set, _, _, _, _ = embed_data_set_with_glove_2(data_set_file, Config.db_path, vocab_dict=vocab,
+                                                       glove_embeddings=embeddings,
+                                                       threshold_b_sent_num=Config.max_sentences,
+                                                       threshold_b_sent_size=Config.max_sentence_size,
+                                                       threshold_h_sent_size=Config.max_claim_size,
+                                                       is_snopes=is_snopes)
+    h_sent_sizes = data_set['data']['h_sent_sizes']
+    h_sizes = np.ones(len(h_sent_sizes), np.int32)
+    data_set['data']['h_sent_sizes'] = np.expand_dims(h_sent_sizes, 1)
+    data_set['data']['h_sizes'] = h_sizes
+    data_set['data']['h_np'] = np.expand_dims(data_set['data']['h_np'], 1)
+    if use_extra_features:
+        assert hasattr(Config, 'feature_path'), "Config should has feature_path if Config.use_feature is True"
+        claim_features, evidence_features = load_feature_by_data_set(data_set_file, Config.feature_path,
+                                                                     Config.max_sentences)
+        data_set['data']['h_feats'] = claim_features
+        data_set['data']['b_feats'] = evidence_features
+    if use_numeric_feature:
+        if number_feature_fn is None:
+            number_feature_fn = split_number_features([data_set_file], is_snopes)
+        data_set['data']['num_feat'] = number_feature_fn(data_set_file)
+    if use_inter_evidence_comparison:
+        concat_sent_indices, concat_sent_sizes = generate_concat_indices_for_inter_evidence(
+            data_set['data']['b_np'],
+            data_set['data']['b_sent_sizes'],
+            Config.max_sentence_size, Config.max_sentences)
+        data_set['data']['b_concat_indices'] = concat_sent_indices
+        data_set['data']['b_concat_sizes'] = concat_sent_sizes
+    if use_claim_evidences_comparison:
+        all_evidences_indices, all_evidences_sizes = generate_concat_indices_for_claim(
+            data_set['data']['b_np'], data_set['data']['b_sent_sizes'], Config.max_sentence_size,
+            Config.max_sentences)
+        data_set['data']['b_concat_indices_for_h'] = all_evidences_indices
+        data_set['data']['b_concat_sizes_for_h'] = all_evidences_sizes
+    return data_set
+
+
+def split_number_features(data_set_files, is_snopes: bool):
+    """
+    Numeric features of the data sets of a run, e.g. train and dev. At the first call they are computed for all
+    data_set_files in one scan, with the page db opened once, so a data set found in the data set cache costs nothing.
+    :return: function data set file -> numeric features
+    """
+    feats = {}
+
+    def number_feature_fn(data_set_file):
+        if not feats:
+            feats.update(zip(data_set_files, number_features(data_set_files, Config.db_path, Config.max_sentences,
+                                                             is_snopes)))
+        return feats[data_set_file]
+
+    return number_feature_fn
+
+
+def data_set_cache_params(data_set_file: str, cache_folder: str, is_snopes: bool, use_extra_features: bool,
+                          use_numeric_feature: bool, use_inter_evidence_comparison: bool,
+                          use_claim_evidences_comparison: bool):
+    """
+    Everything the output of embed_data_set depends on, used as the key of the data set cache
+    """
+    if cache_folder is None:
+        return None
+    os.makedirs(cache_folder, exist_ok=True)
+    params = {
+        'data_set': file_fingerprint(data_set_file, cache_folder),
+        'db': file_fingerprint(Config.db_path, cache_folder),
+        'glove': file_fingerprint(Config.glove_path, cache_folder),
+        'max_sentences': Config.max_sentences,
+        'max_sentence_size': Config.max_sentence_size,
+        'max_claim_size': Config.max_claim_size,
+        'is_snopes': is_snopes,
+        'use_numeric_feature': use_numeric_feature,
+        'use_inter_evidence_comparison': use_inter_evidence_comparison,
+        'use_claim_evidences_comparison': use_claim_evidences_comparison
+    }
+    if use_extra_features:
+        params['features'] = [file_fingerprint(os.path.join(Config.feature_path, name), cache_folder)
+                              for name in ['feature.p', 'data_idx_map.p']]
+    return params
+
+
 def main(mode: RTERunPhase, config=None, estimator=None):
     LogHelper.setup()
     logger = LogHelper.get_logger(os.path.splitext(os.path.basename(__file__))[0] + "_" + str(mode))
@@ -67,90 +155,33 @@ def main(mode: RTERunPhase, config=None, estimator=None):
     logger.info("use_extra_features: " + str(use_extra_features))
     logger.info("use_numeric_feature: " + str(use_numeric_feature))
     logger.info("use_claim_evidences_comparison: " + str(use_claim_evidences_comparison))
+    cache_folder = Config.data_set_cache_folder if hasattr(Config, 'data_set_cache_folder') else None
+    flags = {
+        'is_snopes': is_snopes,
+        'use_extra_features': use_extra_features,
+        'use_numeric_feature': use_numeric_feature,
+        'use_inter_evidence_comparison': use_inter_evidence_comparison,
+        'use_claim_evidences_comparison': use_claim_evidences_comparison
+    }
+    vocab, embeddings = load_whole_glove(Config.glove_path)
+    vocab = vocab_map(vocab)
     if mode == RTERunPhase.train:
         # # training mode
-        if hasattr(Config, 'training_dump') and os.path.exists(Config.training_dump):
-            with open(Config.training_dump, 'rb') as f:
-                (X_dict, y_train) = pickle.load(f)
-        else:
-            training_set, vocab, embeddings, _, _ = embed_data_set_with_glove_2(Config.training_set_file,
-                                                                                Config.db_path,
-                                                                                glove_path=Config.glove_path,
-                                                                                threshold_b_sent_num=Config.max_sentences,
-                                                                                threshold_b_sent_size=Config.max_sentence_size,
-                                                                                threshold_h_sent_size=Config.max_claim_size,
-                                                                                is_snopes=is_snopes)
-            h_sent_sizes = training_set['data']['h_sent_sizes']
-            h_sizes = np.ones(len(h_sent_sizes), np.int32)
-            training_set['data']['h_sent_sizes'] = np.expand_dims(h_sent_sizes, 1)
-            training_set['data']['h_sizes'] = h_sizes
-            training_set['data']['h_np'] = np.expand_dims(training_set['data']['h_np'], 1)
-
-            valid_set, _, _, _, _ = embed_data_set_with_glove_2(Config.dev_set_file, Config.db_path,
-                                                                vocab_dict=vocab, glove_embeddings=embeddings,
-                                                                threshold_b_sent_num=Config.max_sentences,
-                                                                threshold_b_sent_size=Config.max_sentence_size,
-                                                                threshold_h_sent_size=Config.max_claim_size,
-                                                                is_snopes=is_snopes)
-            h_sent_sizes = valid_set['data']['h_sent_sizes']
-            h_sizes = np.ones(len(h_sent_sizes), np.int32)
-            valid_set['data']['h_sent_sizes'] = np.expand_dims(h_sent_sizes, 1)
-            valid_set['data']['h_sizes'] = h_sizes
-            valid_set['data']['h_np'] = np.expand_dims(valid_set['data']['h_np'], 1)
-            if use_extra_features:
-                assert hasattr(Config, 'feature_path'), "Config should has feature_path if Config.use_feature is True"
-                training_claim_features, training_evidence_features = load_feature_by_data_set(Config.training_set_file,
-                                                                                               Config.feature_path,
-                                                                                               Config.max_sentences)
-                valid_claim_features, valid_evidence_features = load_feature_by_data_set(Config.dev_set_file,
-                                                                                         Config.feature_path,
-                                                                                         Config.max_sentences)
-                training_set['data']['h_feats'] = training_claim_features
-                training_set['data']['b_feats'] = training_evidence_features
-                valid_set['data']['h_feats'] = valid_claim_features
-                valid_set['data']['b_feats'] = valid_evidence_features
-            if use_numeric_feature:
-                training_num_feat = number_feature(Config.training_set_file, Config.db_path, Config.max_sentences,
-                                                   is_snopes)
-                valid_num_feat = number_feature(Config.dev_set_file, Config.db_path, Config.max_sentences, is_snopes)
-                training_set['data']['num_feat'] = training_num_feat
-                valid_set['data']['num_feat'] = valid_num_feat
-            if use_inter_evidence_comparison:
-                training_concat_sent_indices, training_concat_sent_sizes = generate_concat_indices_for_inter_evidence(
-                    training_set['data']['b_np'],
-                    training_set['data']['b_sent_sizes'],
-                    Config.max_sentence_size, Config.max_sentences)
-                training_set['data']['b_concat_indices'] = training_concat_sent_indices
-                training_set['data']['b_concat_sizes'] = training_concat_sent_sizes
-                valid_concat_sent_indices, valid_concat_sent_sizes = generate_concat_indices_for_inter_evidence(
-                    valid_set['data']['b_np'],
-                    valid_set['data'][
-                        'b_sent_sizes'],
-                    Config.max_sentence_size,
-                    Config.max_sentences)
-                valid_set['data']['b_concat_indices'] = valid_concat_sent_indices
-                valid_set['data']['b_concat_sizes'] = valid_concat_sent_sizes
-            if use_claim_evidences_comparison:
-                training_all_evidences_indices, training_all_evidences_sizes = generate_concat_indices_for_claim(
-                    training_set['data']['b_np'], training_set['data']['b_sent_sizes'], Config.max_sentence_size,
-                    Config.max_sentences)
-                training_set['data']['b_concat_indices_for_h'] = training_all_evidences_indices
-                training_set['data']['b_concat_sizes_for_h'] = training_all_evidences_sizes
-                valid_all_evidences_indices, valid_all_evidences_sizes = generate_concat_indices_for_claim(
-                    valid_set['data']['b_np'], valid_set['data']['b_sent_sizes'], Config.max_sentence_size,
-                    Config.max_sentences)
-                valid_set['data']['b_concat_indices_for_h'] = valid_all_evidences_indices
-                valid_set['data']['b_concat_sizes_for_h'] = valid_all_evidences_sizes
-            X_dict = {
-                'X_train': training_set['data'],
-                'X_valid': valid_set['data'],
-                'y_valid': valid_set['label'],
-                'embedding': embeddings
-            }
-            y_train = training_set['label']
-            if hasattr(Config, 'training_dump'):
-                with open(Config.training_dump, 'wb') as f:
-                    pickle.dump((X_dict, y_train), f, protocol=pickle.HIGHEST_PROTOCOL)
+        number_feature_fn = split_number_features([Config.training_set_file, Config.dev_set_file], is_snopes)
+        training_set = cached_data_set(cache_folder, data_set_cache_params(Config.training_set_file, cache_folder,
+                                                                           **flags),
+                                       lambda: embed_data_set(Config.training_set_file, vocab, embeddings, **flags,
+                                                              number_feature_fn=number_feature_fn))
+        valid_set = cached_data_set(cache_folder, data_set_cache_params(Config.dev_set_file, cache_folder, **flags),
+                                    lambda: embed_data_set(Config.dev_set_file, vocab, embeddings, **flags,
+                                                           number_feature_fn=number_feature_fn))
+        X_dict = {
+            'X_train': training_set['data'],
+            'X_valid': valid_set['data'],
+            'y_valid': valid_set['label'],
+            'embedding': embeddings
+        }
+        y_train = training_set['label']
         if estimator is None:
             estimator = get_estimator(Config.estimator_name, Config.ckpt_folder)
         if 'CUDA_VISIBLE_DEVICES' not in os.environ or not str(os.environ['CUDA_VISIBLE_DEVICES']).strip():
@@ -165,47 +196,12 @@ def main(mode: RTERunPhase, config=None, estimator=None):
             estimator = load_model(Config.model_folder, Config.pickle_name)
             if estimator is None:
                 estimator = get_estimator(Config.estimator_name, Config.ckpt_folder)
-        vocab, embeddings = load_whole_glove(Config.glove_path)
-        vocab = vocab_map(vocab)
-        test_set, _, _, _, _ = embed_data_set_with_glove_2(Config.test_set_file, Config.db_path, vocab_dict=vocab,
-                                                           glove_embeddings=embeddings,
-                                                           threshold_b_sent_num=Config.max_sentences,
-                                                           threshold_b_sent_size=Config.max_sentence_size,
-                                                           threshold_h_sent_size=Config.max_claim_size,
-                                                           is_snopes=is_snopes)
-        h_sent_sizes = test_set['data']['h_sent_sizes']
-        h_sizes = np.ones(len(h_sent_sizes), np.int32)
-        test_set['data']['h_sent_sizes'] = np.expand_dims(h_sent_sizes, 1)
-        test_set['data']['h_sizes'] = h_sizes
-        test_set['data']['h_np'] = np.expand_dims(test_set['data']['h_np'], 1)
-        if use_extra_features:
-            assert hasattr(Config, 'feature_path'), "Config should has feature_path if Config.use_feature is True"
-            test_claim_features, test_evidence_features = load_feature_by_data_set(Config.test_set_file,
-                                                                                   Config.feature_path,
-                                                                                   Config.max_sentences)
-            test_set['data']['h_feats'] = test_claim_features
-            test_set['data']['b_feats'] = test_evidence_features
-        if use_numeric_feature:
-            test_num_feat = number_feature(Config.test_set_file, Config.db_path, Config.max_sentences, is_snopes)
-            test_set['data']['num_feat'] = test_num_feat
+        test_set = cached_data_set(cache_folder, data_set_cache_params(Config.test_set_file, cache_folder, **flags),
+                                   lambda: embed_data_set(Config.test_set_file, vocab, embeddings, **flags))
         x_dict = {
             'X_test': test_set['data'],
             'embedding': embeddings
         }
-        if use_inter_evidence_comparison:
-            test_concat_sent_indices, test_concat_sent_sizes = generate_concat_indices_for_inter_evidence(
-                test_set['data']['b_np'],
-                test_set['data']['b_sent_sizes'],
-                Config.max_sentence_size,
-                Config.max_sentences)
-            test_set['data']['b_concat_indices'] = test_concat_sent_indices
-            test_set['data']['b_concat_sizes'] = test_concat_sent_sizes
-        if use_claim_evidences_comparison:
-            test_all_evidences_indices, test_all_evidences_sizes = generate_concat_indices_for_claim(
-                test_set['data']['b_np'], test_set['data']['b_sent_sizes'], Config.max_sentence_size,
-                Config.max_sentences)
-            test_set['data']['b_concat_indices_for_h'] = test_all_evidences_indices
-            test_set['data']['b_concat_sizes_for_h'] = test_all_evidences_sizes
         if 'CUDA_VISIBLE_DEVICES' not in os.environ or not str(os.environ['CUDA_VISIBLE_DEVICES']).strip():
             os.environ['CUDA_VISIBLE_DEVICES'] = str(
                 GPUtil.getFirstAvailable(maxLoad=1.0, maxMemory=1.0 - Config.max_gpu_memory)[0])
@@ -56,6 +56,7 @@ class Config:
     document_add_claim = True
     submission_folder = path.join(BASE_DIR, "data/submission")
     submission_file = path.join(submission_folder, SUBMISSION_FILE_NAME)
+    data_set_cache_folder = path.join(BASE_DIR, "data/cache")
     estimator_name = "esim"
     pickle_name = estimator_name + ".p"
     han_hyper_param = {
@@ -90,7 +91,8 @@ class Config:
         'activation': 'relu',
         'initializer': 'he',
         'attention_function': 'weight_matrix_3',
-        'do_finetune': False
+        'do_finetune': False,
+        'precomputed_embeddings': False
     }
     bert_sent_hyper_parameter = {
         'num_neurons': [300, 200, 100],
@@ -137,7 +139,10 @@ class Config:
         'optimizer': 'adam',
         'num_epoch': 50,
         'activation': 'relu',
-        'initializer': 'he'
+        'initializer': 'he',
+        'bucket_batches': False,
+        'input_pipeline': False,
+        'predict_batch_size': None
     }
     esim_mtl_hyper_param = {
         'num_neurons_esim': [220, 160],
@@ -248,6 +253,10 @@ class Config:
     tensorboard_folder = None
     bert_port = 5555
     bert_port_out = 5556
+    # BERT embeddings of the sentences, one sub-folder per pooling strategy. Clear it when the BERT model changes
+    bert_cache_folder = path.join(BASE_DIR, "data/cache/bert")
+    # Universal Sentence Encoder embeddings of the sentences, one sub-folder per module
+    use_cache_folder = path.join(BASE_DIR, "data/cache/use")
     max_gpu_memory = 0.5
     os.makedirs(model_folder, exist_ok=True)
     os.makedirs(ckpt_folder, exist_ok=True)